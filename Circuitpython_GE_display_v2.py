@@ -1,18 +1,15 @@
 # Adafruit Huzzah consumes 156uA in deep sleep mode
 # Consumes 
 import gc
-import time, rtc, adafruit_ntp, alarm
+import time, alarm
 import ssl
-import json
-import wifi
-import socketpool
-import board
-import displayio, busio
-import terminalio
 import adafruit_requests
-import adafruit_il0373
-from   adafruit_display_text import label
-from   adafruit_display_shapes.rect import Rect
+import ge_config
+import ge_network
+import ge_render
+import ge_sleep
+import ge_time
+import ge_wifi
 
 WIDTH  = 296
 HEIGHT = 128
@@ -27,106 +24,35 @@ BACKGROUND_COLOR = WHITE
 
 VERDANA_BOLD = "/fonts/Verdana-Bold-18.bdf"
 
-def create_text_group(x, y, font, text, scale, colour):
-    text_group = displayio.Group(scale=scale, x=x, y=y)
-    text_area = label.Label(font, text=text, color=colour)
-    text_group.append(text_area)
-    return text_group
-
-displayio.release_displays()
-
-spi = busio.SPI(board.IO5, board.IO18)  # Uses SCK and MOSI
-epd_cs = board.IO15
-epd_dc = board.IO33
-
-display_bus = displayio.FourWire(spi, command=epd_dc, chip_select=epd_cs, baudrate=1000000)
-time.sleep(1)
-
-display = adafruit_il0373.IL0373(
-    display_bus,
-    width=WIDTH,
-    height=HEIGHT,
-    rotation=270,
-    black_bits_inverted=False,
-    color_bits_inverted=False,
-    grayscale=True,
-    refresh_time=1,
-)
-
-background_bitmap = displayio.Bitmap(WIDTH, HEIGHT, 1)
-
-try:
-    from secrets import secrets
-except ImportError:
-    print("WiFi secrets are kept in secrets.py, please add them there!")
-    raise
+secrets = ge_config.load_secrets()
 
 # Github developer token required.
 # Ensure these are uncommented and in secrets.py or .env
 # "Github_username": "Your Github Username",
 # "Github_token": "Your long API token",
 
-# Initialize WiFi Pool (There can be only 1 pool & top of script)
-pool = socketpool.SocketPool(wifi.radio)
-
 # Time between API refreshes
 # 900 = 15 mins, 1800 = 30 mins, 3600 = 1 hour
 sleep_time = 300
 
-try:
-    from secrets import secrets
-except ImportError:
-    print("Secrets File Import Error")
-    raise
-
-if sleep_time < 60:
-    sleep_time_conversion = "seconds"
-    sleep_int = sleep_time
-elif 60 <= sleep_time < 3600:
-    sleep_int = sleep_time / 60
-    sleep_time_conversion = "minutes"
-elif 3600 <= sleep_time < 86400:
-    sleep_int = sleep_time / 60 / 60
-    sleep_time_conversion = "hours"
-else:
-    sleep_int = sleep_time / 60 / 60 / 24
-    sleep_time_conversion = "days"
-    
 #---    
 print("Starting...");
-payload = {
-    "inverter_serials": [
-        secrets["InverterSerial"]
-    ],
-    "setting_id": 17
-}
+# The request body, sent as JSON by adafruit_requests (json=)
+payload    = {"inverter_serials": [secrets["InverterSerial"]], "setting_id": 17}
+GE_headers = ge_config.headers(secrets, close=True)
 
-GE_headers = {
-  'Authorization': 'Bearer ' + secrets["API_Key"],
-  'Content-Type': 'application/json',
-  'Accept': 'application/json',
-  'Connection': 'close'
-}
+# Through the aggregator if secrets["Aggregator"] is set (ge_config.api_base)
+GE_API     = ge_config.api_base(secrets)
+GE_SOURCE  = GE_API + secrets["InverterSerial"] + "/system-data/latest"
 
-GE_SOURCE  = "https://api.givenergy.cloud/v1/inverter/" + secrets["InverterSerial"] + "/system-data/latest"
-
-def wifi_connect():
-  # Connect to Wi-Fi
-  print("\n===============================")
-  print("Connecting to WiFi...")
-  while not wifi.radio.ipv4_address:
-      try:
-          wifi.radio.connect(secrets["ssid"], secrets["password"])
-      except ConnectionError as e:
-          print("Connection Error:", e)
-          print("Retrying in 10 seconds")
-      time.sleep(10)
-      gc.collect()
-      
-wifi_connect()
+# Connect to Wi-Fi, straight to the access point and address of the last wake if it can (ge_wifi)
+wifi_rejoin = ge_wifi.Rejoin(alarm.sleep_memory)
+ge_network.connect(secrets, wifi_rejoin)
+gc.collect()
 
 print("Connected!")
-pool = socketpool.SocketPool(wifi.radio)
+# Initialize WiFi Pool (There can be only 1 pool)
+pool = ge_network.socket_pool()
 requests = adafruit_requests.Session(pool, ssl.create_default_context())
 
 now_local = time.localtime()
@@ -142,15 +68,18 @@ def _format_datetime(datetime):
     )
 
 # https://en.wikipedia.org/wiki/List_of_tz_database_time_zones
-# Europe/London
-ntp = adafruit_ntp.NTP(pool, tz_offset=1)
-    
-try:
-    rtc.RTC().datetime = ntp.datetime
-    timenow = time.localtime()
-    timestr = _format_datetime(timenow)
-except:
-    print("NTP Error detected")
+# Europe/London, GMT/BST worked out locally; the RTC is kept across deep sleep
+# and only resynced from NTP once a day
+clock = ge_time.Clock(alarm.sleep_memory)
+if clock.needs_sync():
+    try:
+        ge_time.sync_ntp(clock, pool)
+    except OSError:
+        print("NTP Error detected")
+now = clock.now()
+if now is not None:
+    timestr = _format_datetime(ge_time.local_time(now))
+else:
     timestr = "Time Error"
     
 print(timestr)
@@ -167,7 +96,7 @@ try:
     #print (response.status_code, response.reason, response.headers)
     #print (response.json())
     parsed_system_data = response.json()
-    url = 'https://api.givenergy.cloud/v1/inverter/CE2029G093/meter-data/latest'
+    url = GE_API + secrets["InverterSerial"] + '/meter-data/latest'
     print ("Making connection request for Meter Data...")
     response = requests.get(url=url, headers=GE_headers, json=payload)
     parsed_meter_data = response.json()
@@ -218,10 +147,18 @@ if debug_response:
     print("Import Today       = ", ImportToday, "kWh")
     print("Battery Throughput = ", batteryThroughputToday, "kWh")
     print("\nFinished!")
-    print("Next Update in %s %s" % (int(sleep_int), sleep_time_conversion))
+    print("Next Update in %s" % ge_config.sleep_text(sleep_time))
     gc.collect() # Run a garbage collection
 
 #---
+# The display stack is only imported now there is something to draw, and the
+# panel only set up for the refresh (ge_render)
+import displayio
+import terminalio
+from   adafruit_display_shapes.rect import Rect
+from   ge_dashboard import create_text_group
+
+background_bitmap = displayio.Bitmap(WIDTH, HEIGHT, 1)
 tile_grid  = displayio.Group()
 palette    = displayio.Palette(1)
 palette[0] = BACKGROUND_COLOR
@@ -270,17 +207,12 @@ time_group = create_text_group(20, 120, font, "Updated: " + timestr, 1, BLACK)
 tile_grid.append(time_group)
 
 # Display the formed display
-display.show(tile_grid)
-display.refresh()
+ge_render.refresh(tile_grid)
 print("Finished...")
 
 #---
-#time.sleep(sleep_time)
-# Create an alarm that will trigger N-secs from now.
-time_alarm = alarm.time.TimeAlarm(monotonic_time=time.monotonic() + 300)
-# Exit the program, and then deep sleep until the alarm wakes
 print ("N-Secs in deep sleep")
-alarm.exit_and_deep_sleep_until_alarms(time_alarm)
+ge_sleep.deep_sleep(sleep_time, clock)
 # Does not return, we never get here.
     
 
@@ -3,288 +3,183 @@
 import os
 print(os.uname().version) #e.g.'8.1.0 on 2023-05-28'
 
-import gc
-import time, rtc, adafruit_ntp, alarm
-import ssl
-import json
-import wifi
-import socketpool
-import board
-import displayio, busio
-import terminalio
-import adafruit_requests
-import adafruit_il0373
-from   adafruit_display_text import label
-from   adafruit_display_shapes.rect import Rect
-
-WIDTH  = 296
-HEIGHT = 128
-
-BLACK     = 0x000000
-DARKGREY  = 0x666666
-LIGHTGREY = 0x999999
-WHITE     = 0xFFFFFF
-
-FOREGROUND_COLOR = BLACK
-BACKGROUND_COLOR = WHITE
-
-VERDANA_BOLD = "/fonts/Verdana-Bold-18.bdf"
-
-def create_text_group(x, y, font, text, scale, colour):
-    text_group = displayio.Group(scale=scale, x=x, y=y)
-    text_area = label.Label(font, text=text, color=colour)
-    text_group.append(text_area)
-    return text_group
-
-displayio.release_displays()
-
-spi = busio.SPI(board.IO5, board.IO18)  # Uses SCK and MOSI
-epd_cs = board.IO15
-epd_dc = board.IO33
-
-display_bus = displayio.FourWire(spi, command=epd_dc, chip_select=epd_cs, baudrate=1000000)
-time.sleep(1)
-
-display = adafruit_il0373.IL0373(
-    display_bus,
-    width=WIDTH,
-    height=HEIGHT,
-    rotation=270,
-    black_bits_inverted=False,
-    color_bits_inverted=False,
-    grayscale=True,
-    refresh_time=1,
-)
-
-background_bitmap = displayio.Bitmap(WIDTH, HEIGHT, 1)
-
-sleep_time = 600 # seconds
+# Only what every wake needs is imported up front. The display stack is
+# imported and the panel set up by the layout and refresh (ge_render), NTP
+# when a sync is due (ge_time), TLS and the HTTP client when the API is
+# asked (ge_network) and the Modbus reader when the inverter is, so a wake
+# that finds nothing new, or no WiFi, doesn't pay for them
+import alarm
+import ge_config
+import ge_data
+import ge_frame
+import ge_heap
+import ge_history
+import ge_network
+import ge_render
+import ge_retry
+import ge_schedule
+import ge_site
+import ge_sleep
+import ge_state
+import ge_time
+import ge_timing
+import ge_wifi
+
+ASSET_PACK = "ge_assets.bin"  # Verdana Bold cut down and the battery drawn, by host/build_assets.py
+
+sleep_time = 600 # seconds, used when there is no data to schedule from
+scheduler  = ge_schedule.Scheduler(min_sleep=300, max_sleep=3600, battery_capacity=8.0)
+full_refresh_every = 12 # wakes; an unchanged frame is still redrawn this often to clear ghosting
+# Bytes each phase may take from the heap before it is flagged (ge_heap)
+heap_budgets = {"connect": 8 * 1024, "fetch": 24 * 1024, "layout": 48 * 1024, "refresh": 8 * 1024}
 time_str = ""
 
-try:
-    from secrets import secrets
-except ImportError:
-    print("Secrets File Import Error")
-    raise
+secrets = ge_config.load_secrets()
+
+# The inverters on the site (ge_config.serials), their readings added up for the display (ge_site),
+# through the aggregator if secrets["Aggregator"] is set (ge_config.api_base)
+AGGREGATOR = secrets.get("Aggregator")
+# secrets["InverterHost"] reads the inverter over Modbus TCP on the LAN in place of the cloud API (ge_modbus);
+# secrets["InverterPort"] if it isn't 502. One inverter only
+INVERTER_HOST = secrets.get("InverterHost")
+site = ge_site.Site(ge_config.serials(secrets),  # 8.0 kWh battery each, 0.768 was a measured value
+                    api=ge_config.api_base(secrets),
+                    record=bool(AGGREGATOR))  # the aggregator sends each inverter as one ge_record
+scheduler.battery_capacity = site.battery_capacity
+# Sockets open to the API at once, the socket pool on the board is small. Two, so an
+# inverter's system-data and meter-data are read side by side rather than pipelined
+# one behind the other on a single socket (which is no faster than back to back)
+max_connections = 2
 
-if sleep_time < 60:
-    sleep_time_conversion = "seconds"
-    sleep_int = sleep_time
-elif 60 <= sleep_time < 3600:
-    sleep_int = sleep_time / 60
-    sleep_time_conversion = "minutes"
-elif 3600 <= sleep_time < 86400:
-    sleep_int = sleep_time / 60 / 60
-    sleep_time_conversion = "hours"
-else:
-    sleep_int = sleep_time / 60 / 60 / 24
-    sleep_time_conversion = "days"
-    
 #---    
 print("Starting...");
-payload = {
-    "inverter_serials": [
-        secrets["InverterSerial"]
-    ],
-    "setting_id": 17
-}
-
-GE_headers = {
-  'Authorization': 'Bearer ' + secrets["API_Key"],
-  'Content-Type': 'application/json',
-  'Accept': 'application/json',
-  'Connection': 'close'
-}
+payload    = ge_config.payload(site.serials)
+GE_headers = ge_config.headers(secrets)
 
-GE_STATUS    = "https://api.givenergy.cloud/v1/inverter/" + secrets["InverterSerial"] + "/system-data/latest"
-GE_METER     = 'https://api.givenergy.cloud/v1/inverter/CE2029G093/meter-data/latest'
-Time_Address = 'https://worldtimeapi.org/api/timezone/'
-Timezone     = "Europe/London"
-  
-def wifi_connect():
-  # Connect to Wi-Fi
-  print("\n===============================")
-  print("Connecting to WiFi...")
-  while not wifi.radio.ipv4_address:
-      try:
-          wifi.radio.connect(secrets["ssid"], secrets["password"])
-      except ConnectionError as e:
-          print("Connection Error:", e)
-          print("Retrying in 10 seconds")
-      time.sleep(1)
-      print("Connected")
-      gc.collect()
-      
 def get_time():
-  global Time_Address, Timezone, time_str
-  Time_url     = Time_Address + Timezone
-  print(f"Getting time from : {Time_url}")
-  response = requests.get(Time_url)
-  time_json = response.json()
-  #print(time_json)
-  #{'timezone': 'Europe/London', 'utc_datetime': '2023-05-29T18:10:53.453748+00:00',
-  #'raw_offset': 0, 'client_ip': '51.198.204.217',
-  #'dst_from': '2023-03-26T01:00:00+00:00',
-  #'unixtime': 1685383853, 'utc_offset': '+01:00',
-  #'datetime': '2023-05-29T19:10:53.453748+01:00',
-  #'week_number': 22, 'abbreviation': 'BST',
-  #'day_of_year': 149, 'day_of_week': 1, 'dst': True, 'dst_offset': 3600, 'dst_until': '2023-10-29T01:00:00+00:00'}
-  unixtime   = time_json["unixtime"]
-  dst_offset = time_json["dst_offset"]
-  location_time = unixtime + dst_offset
-  current_time = time.localtime(location_time)
-  #print(f"Current time: {current_time}")
-  time_str = f"{current_time.tm_mday:02d}/{current_time.tm_mon:02d}/{current_time.tm_year:02d} {current_time.tm_hour:02d}:{current_time.tm_min:02d}"
-
-wifi_connect()
-socket = socketpool.SocketPool(wifi.radio)
-requests = adafruit_requests.Session(socket, ssl.create_default_context())
+  # Europe/London time from the RTC carried across deep sleep, NTP only once a day
+  global time_str
+  if clock.needs_sync():
+      print("Getting time from NTP")
+      try:
+          ge_time.sync_ntp(clock, socket)
+      except OSError as e:
+          print("NTP Error:", e)
+  now = clock.now()
+  time_str = ge_time.format_local(now) if now is not None else "Time Error"
+
+def deep_sleep():
+  ge_sleep.deep_sleep(sleep_time, clock, timer, heap)
+
+# Time each phase of the wake; "boot" is the imports and setup above
+timer = ge_timing.PhaseTimer(alarm.sleep_memory)
+# and what each takes from the heap, collecting after the phases where that has paid off
+heap = ge_heap.HeapBudget(alarm.sleep_memory, heap_budgets)
+timer.start("wifi")
+heap.enter("connect")
+# Straight to the access point and address of the last wake if it can (ge_wifi)
+wifi_rejoin = ge_wifi.Rejoin(alarm.sleep_memory)
+ge_network.connect(secrets, wifi_rejoin)
+clock = ge_time.Clock(alarm.sleep_memory)
+# Addresses of the API hosts are kept across wakes, so most wakes skip the DNS lookups (ge_dns)
+socket = ge_network.socket_pool(alarm.sleep_memory, clock)
+timer.stop()
+heap.leave()
+
+def fetch_readings():
+  # -> (system_data, meter_data), None for a reading that failed
+  if INVERTER_HOST:
+      return ge_data.read_inverter(inverter, timer)
+  ge_session = ge_network.session(socket, max_connections)
+  sample = ge_data.fetch_site(site, ge_session, GE_headers, payload, timer)
+  ge_session.close()
+  return sample
 
+print("\nAttempting to obtain GivEnergy stats!")  # --------------------------------
+# System Data and Meter Data for every inverter are requested together over at most
+# max_connections keep-alive connections, a failure only loses its own reading
+if INVERTER_HOST:
+    # Straight from the inverter, no cloud (ge_modbus)
+    import ge_modbus
+    print("Inverter: %s (Modbus TCP)" % INVERTER_HOST)
+    inverter = ge_modbus.LocalInverter(socket, INVERTER_HOST, secrets.get("InverterPort", ge_modbus.PORT), clock=clock)
+else:
+    for url in site.urls()[0]:
+        print("API URL: ", url)
+print("===============================")
+# A failed fetch is tried again after a jittered backoff; after several failed wakes in a row
+# the breaker opens, one try per wake and longer sleeps until the API answers again (ge_retry)
+breaker = ge_retry.Breaker(alarm.sleep_memory)
+heap.enter("fetch")
+parsed_system_data, parsed_meter_data = breaker.run(fetch_readings)
+heap.leave()
+
+# The last sample is kept in sleep memory; if the inverter hasn't posted a new one
+# there is nothing new to show, so skip the parse, layout and refresh (unless the panel
+# is marked stale from failed wakes, and the marker has to go)
+readings = ge_state.Readings(alarm.sleep_memory)
+history  = ge_history.History(alarm.sleep_memory)  # the last 48 hours of samples
+previous = readings.load()
+stale    = parsed_system_data is None or parsed_meter_data is None
+if stale:
+    # Nothing new after the retries: show the last good sample, marked as stale
+    sleep_time = breaker.sleep_time(sleep_time, scheduler.max_sleep)
+    if previous is None:
+        print("No data, none stored - next try in %d seconds" % sleep_time)
+        deep_sleep()
+    parsed_system_data, parsed_meter_data = previous
+    print("No data, showing the sample of %s - next try in %d seconds"
+          % (ge_time.format_local(parsed_system_data['data']['time']), sleep_time))
+else:
+    # Sleep until what is on screen is likely to be out of date
+    now = clock.now()
+    sleep_time = scheduler.next_sleep(parsed_system_data, previous[0] if previous else None,
+                                      ge_time.local_time(now) if now is not None else None)
+    print("Next wake in %d seconds" % sleep_time)
+# (a local read is stamped with the time it was made, so its values are compared instead)
+if not stale and not breaker.recovered and readings.unchanged(parsed_system_data, parsed_meter_data,
+                                                              by_value=bool(INVERTER_HOST)):
+    print("No new data since", parsed_system_data['data']['time'], "- back to sleep")
+    deep_sleep()
+
+timer.start("time")
 get_time()
+timer.stop()
 print(time_str)
+if stale:
+    time_str = ge_time.format_local(parsed_system_data['data']['time'])  # the time of the sample shown
 
-print("\nAttempting to obtain GivEnergy stats!")  # --------------------------------
-try:
-    print ("Making connection request for Battery System Data...")
-    response = requests.get(url=GE_STATUS, headers=GE_headers, json=payload, timeout=5)
-    # Print Request 
-    print("API URL: ", GE_STATUS)
-    print("===============================")    #print (response.status_code, response.reason, response.headers)
-    #print (response.json())
-    parsed_system_data = response.json()
-    GE_METER = 'https://api.givenergy.cloud/v1/inverter/CE2029G093/meter-data/latest'
-    print ("Making connection request for Meter Data...")
-    response = requests.get(url=GE_METER, headers=GE_headers, json=payload)
-    # Print Request 
-    print("API URL: ", GE_METER)
-    print("===============================")
-    parsed_meter_data = response.json()
-    #print (response.json())
-    response.close()
-except ConnectionError as e:
-    print("Connection Error:", e)
-    print("Retrying in 10 seconds")
-    response.close()
 debug_response = True  # Set true to see full response
 if debug_response:
-    data = parsed_system_data
-    #print(data)
-    #{'data': {'time': '2023-05-28T10:16:27Z',
-    #'battery': {'temperature': 21, 'percent': 100, 'power': 0},
-    #'solar': {'power': 2975,
-    #'arrays': [{'array': 1, 'current': 12.2, 'power': 2975, 'voltage': 242},
-    #{'array': 2, 'current': 0, 'power': 0, 'voltage': 0}]},
-    #'grid': {'current': 0, 'frequency': 50.04, 'power': 2577, 'voltage': 244.9},
-    #'inverter': {'output_voltage': 243.5, 'power': 0, 'output_frequency': 50.03, 'eps_power': 0, 'temperature': 40.3},
-    #'consumption': 398}}
-    StateOfCharge    = data['data']['battery']['percent']
-    BatteryRemaining = "{:.1f}".format(StateOfCharge / 100 * 8.0)  # 0.768 was a measured value
-    GenerationToday  = "{:.1f}".format(data['data']['solar']['power']/ 1000)
-    ConsumptionToday = str("{:.1f}".format(data['data']['consumption'] / 1000))
-    print ("Consumption Today       = ", ConsumptionToday, "kWh")
-    print ("Battery Remaining       = ", BatteryRemaining, "kWh")
-    print ("Generation Today        = ", GenerationToday, "kWh")
-    print ("State of Charge         = ", StateOfCharge, "%")
-            
-    data = parsed_meter_data
-    #print(data)
-    #{'data': {'time': '2023-05-28T10:05:29Z',
-    #'today': {'battery': {'discharge': 1.9, 'charge': 4.8},
-    #'grid': {'import': 0, 'export': 0.1},#
-    #'solar': 6.6, 'consumption': 6.5},
-    #'total': {'battery': {'discharge': 3827.8, 'charge': 3827.8},
-    #          'grid': {'import': 4572.6, 'export': 1724.5},
-    #          'solar': 9324.6, 'consumption': 11448.3}}}
-    BatteryDischargeToday  = data['data']['today']['battery']['discharge']
-    BatteryChargeToday     = data['data']['today']['battery']['charge']
-    BatteryThroughputToday = BatteryDischargeToday + BatteryChargeToday
-        
-    GridExportToday        = data['data']['today']['grid']['export']
-    GridImportToday        = data['data']['today']['grid']['import']
-    #str("{:.1f}".format(data['data']['today']['grid']['import']
-    
-    SolarProductionToday   = data['data']['today']['solar']
-    SolarConsumptionToday  = data['data']['today']['consumption']
-    
-    print("Battery Discharge Today = ", BatteryDischargeToday, "kWh")
-    print("Battery Charge Today    = ", BatteryChargeToday, "kWh")
-    print("Battery Throughput      = ", BatteryThroughputToday, "kWh")
-    print("Grid Export Today       = ", GridExportToday, "kWh")
-    print("Grid Import Today       = ", GridImportToday, "kWh")
-    print("Solar Production Today  = ", SolarProductionToday, "kWh")
-    print("Solar Consumption Today = ", SolarConsumptionToday, "kWh")
-    print("===============================")
+    ge_data.print_readings(parsed_system_data, parsed_meter_data, site.battery_capacity)
     print("\nFinished!")
-    print("Next Update in %s %s" % (int(sleep_int), sleep_time_conversion))
-    gc.collect() # Run a garbage collection
+    print("Next Update in %s" % ge_config.sleep_text(sleep_time))
 
 #---
-tile_grid  = displayio.Group()
-palette    = displayio.Palette(1)
-palette[0] = BACKGROUND_COLOR
-font       = terminalio.FONT
-
-t = displayio.TileGrid(background_bitmap, pixel_shader=palette)
-tile_grid.append(t)
-
-soc_background_rect = Rect(193, 2, 101, 61, fill=WHITE, outline=0x0, stroke=0)
-tile_grid.append(soc_background_rect)
-
-tput_background_rect = Rect(193, 65, 101, 61, fill=WHITE, outline=0x0, stroke=0)
-tile_grid.append(tput_background_rect)
-
-soc_text_group = create_text_group(16, 10, font, "SoC:" + str(StateOfCharge) + "%", 2, BLACK)
-tile_grid.append(soc_text_group)
-
-BatteryRemaining = create_text_group(67, 25, font, str(BatteryRemaining) + "kWh Remaining", 1, WHITE)
-tile_grid.append(BatteryRemaining)
-
-battput_text_group = create_text_group(135, 10, font, "TPut:" + str(BatteryThroughputToday) + "kWh", 2, BLACK)
-tile_grid.append(battput_text_group)
-
-solarproductiontoday = create_text_group(10, 40, font, "Solar Production = " + str(SolarProductionToday) + "kWh", 1, BLACK)
-tile_grid.append(solarproductiontoday)
-
-solarconsumptiontoday = create_text_group(5, 52, font, "Solar Consumption = " + str(SolarConsumptionToday) + "kWh", 1, BLACK)
-tile_grid.append(solarconsumptiontoday)
-
-chargetoday_text_group = create_text_group(35, 64, font, "Charge Today = " + str(BatteryChargeToday) + "kWh", 1, BLACK)
-tile_grid.append(chargetoday_text_group)
-
-dischargetoday_text_group = create_text_group(17, 74, font, "Discharge Today = " + str(BatteryDischargeToday) + "kWh", 1, BLACK)
-tile_grid.append(dischargetoday_text_group)
-
-exporttoday_text_group = create_text_group(35, 86, font, "Export Today = " + str(GridExportToday) + "kWh", 1, BLACK)
-tile_grid.append(exporttoday_text_group)
-
-importtoday_text_group = create_text_group(35, 98, font, "Import Today = " + str("{:.1f}".format(GridImportToday)) + "kWh", 1, BLACK)
-tile_grid.append(importtoday_text_group)
-
-# Draw Battery outline
-bat_outline = Rect(220, 40, 44, 84, fill=WHITE, outline=BLACK, stroke=2)
-tile_grid.append(bat_outline)
-cap_outline = Rect(232, 35, 15, 5, fill=BLACK, outline=BLACK, stroke=2)
-tile_grid.append(cap_outline)
-
-# Fill battery to show charge
-BatteryHeight = 80 - 2 - 2 # less top and bottom
-BatteryWidth  = 40 - 2 - 2 # less left and right
-BatteryCharge = int(BatteryHeight * StateOfCharge / 100)
-if (BatteryCharge == 0):
-    BatteryCharge = 1
-bat_charge = Rect(224, 44 + BatteryHeight - BatteryCharge, BatteryWidth, BatteryCharge, fill=BLACK, outline=0, stroke=0)
-tile_grid.append(bat_charge)
-
-time_group = create_text_group(20, 120, font, "Updated: " + time_str, 1, BLACK)
-tile_grid.append(time_group)
-
-# Display the formed display
-display.show(tile_grid)
-display.refresh()
+timer.start("layout")
+heap.enter("layout")
+dashboard = ge_render.dashboard(site.battery_capacity, ASSET_PACK)
+dashboard.update(parsed_system_data, parsed_meter_data, time_str, stale)
+# The trends as they stood, from the ring; a sample that starts a new interval is then
+# drawn on its own, only its column (the dashboard is built afresh every wake)
+dashboard.set_history(history.latest(dashboard.soc_trend.columns))
+if not stale and history.append(parsed_system_data):
+    dashboard.add_sample(history.newest())
+
+# Display the formed display, unless it is what the panel already shows
+# (the update time is left out, it changes every wake, but not the stale marker)
+frame_guard = ge_frame.FrameGuard(alarm.sleep_memory, full_refresh_every)
+frame_hash  = ge_frame.fingerprint(dashboard.group, skip=() if stale else (dashboard.time_group,))
+if frame_guard.needs_refresh(frame_hash):
+    timer.start("refresh")
+    heap.enter("refresh")
+    ge_render.refresh(dashboard.group)  # the panel is only set up now
+    frame_guard.refreshed(frame_hash)
+else:
+    print("Frame unchanged, refresh skipped")
+    frame_guard.skipped(frame_hash)
+if not stale:
+    readings.save(parsed_system_data, parsed_meter_data)
 print("Finished...")
 
-# Create an alarm that will trigger N-secs from now.
-time_alarm = alarm.time.TimeAlarm(monotonic_time=time.monotonic() + sleep_time)
-# Exit the program, and then deep sleep until the alarm wakes
-alarm.exit_and_deep_sleep_until_alarms(time_alarm)
-# Does not return, we never get here
\ No newline at end of file
+deep_sleep()
\ No newline at end of file
@@ -0,0 +1,122 @@
+# Asset pack: a font cut down to the glyphs the dashboard prints, and the
+# static graphics drawn ahead of time, in one small file.
+#
+# Parsing a whole BDF font at boot takes too long, so host/build_assets.py
+# keeps only the characters the labels can show and writes their bitmaps
+# 1 bit a pixel, ready to read straight into displayio Bitmaps. It also
+# renders the battery outline, which was two Rects built every wake.
+#
+#   header   "GEAP", version, section count
+#   section  kind ("FONT" or "IMG "), name (8 bytes), bytes that follow
+#   FONT     bounding box (w, h, x offset, y offset), glyph count, then for
+#            each glyph: codepoint, w, h, dx, dy, shift_x and its rows
+#   IMG      w, h and its rows
+#
+# Rows are MSB first, padded to a whole byte. bitmaptools.readinto reads
+# them where the build has it, otherwise they are unpacked a pixel at a time.
+
+import struct
+
+import displayio
+
+try:
+    import bitmaptools
+except ImportError:
+    bitmaptools = None
+
+try:
+    from collections import namedtuple
+except ImportError:
+    from ucollections import namedtuple
+
+MAGIC   = b"GEAP"
+VERSION = 1
+
+HEADER  = "<4sBB"
+SECTION = "<4s8sI"
+FONT    = "<BBbbH"
+GLYPH   = "<HBBbbB"
+IMAGE   = "<HH"
+
+# As adafruit_bitmap_font's, which adafruit_display_text expects
+Glyph = namedtuple("Glyph", ["bitmap", "tile_index", "width", "height", "dx", "dy", "shift_x", "shift_y"])
+
+
+def _read(f, fmt):
+    return struct.unpack(fmt, f.read(struct.calcsize(fmt)))
+
+
+def _bitmap(f, width, height):
+    # The next width x height rows of the file as a two-colour Bitmap
+    bitmap = displayio.Bitmap(max(width, 1), max(height, 1), 2)
+    if not width or not height:
+        return bitmap
+    if bitmaptools is not None:
+        bitmaptools.readinto(bitmap, f, 1, 1, False)
+        return bitmap
+    stride = (width + 7) // 8
+    for y in range(height):
+        row = f.read(stride)
+        for x in range(width):
+            if row[x >> 3] & (0x80 >> (x & 7)):
+                bitmap[x, y] = 1
+    return bitmap
+
+
+class PackFont:
+    # Enough of adafruit_bitmap_font's font for adafruit_display_text
+    def __init__(self, box, glyphs):
+        self._box    = box
+        self._glyphs = glyphs
+
+    def get_bounding_box(self):
+        return self._box
+
+    def get_glyph(self, codepoint):
+        return self._glyphs.get(codepoint)
+
+    def load_glyphs(self, code_points):
+        pass  # all of them were loaded with the pack
+
+
+class Pack:
+    def __init__(self):
+        self.fonts  = {}
+        self.images = {}
+
+    def font(self, name):
+        return self.fonts.get(name)
+
+    def image(self, name):
+        # -> the image's Bitmap, 1 where it is drawn, or None
+        return self.images.get(name)
+
+    def read(self, f):
+        magic, version, sections = _read(f, HEADER)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a version %d asset pack" % VERSION)
+        for _ in range(sections):
+            kind, name, length = _read(f, SECTION)
+            name = name.rstrip(b"\0").decode()
+            if kind == b"FONT":
+                width, height, x_offset, y_offset, count = _read(f, FONT)
+                glyphs = {}
+                for _ in range(count):
+                    codepoint, w, h, dx, dy, shift_x = _read(f, GLYPH)
+                    glyphs[codepoint] = Glyph(_bitmap(f, w, h), 0, w, h, dx, dy, shift_x, 0)
+                self.fonts[name] = PackFont((width, height, x_offset, y_offset), glyphs)
+            elif kind == b"IMG ":
+                w, h = _read(f, IMAGE)
+                self.images[name] = _bitmap(f, w, h)
+            else:
+                f.read(length)  # from a newer build, not used here
+        return self
+
+
+def load(path):
+    # The pack at path, or None if there isn't one (the dashboard then uses terminalio.FONT and Rects)
+    try:
+        with open(path, "rb") as f:
+            return Pack().read(f)
+    except OSError:
+        return None
@@ -0,0 +1,59 @@
+# Settings the scripts share: secrets, where the API is and what goes with
+# each request, and how a sleep interval reads on the console.
+#
+#   secrets = ge_config.load_secrets()
+#   site    = ge_site.Site(ge_config.serials(secrets), api=ge_config.api_base(secrets))
+#   ge_config.headers(secrets), ge_config.payload(site.serials)
+#   ge_config.sleep_text(600)      "10 minutes"
+#
+# The request body is written out here rather than with json.dumps, so
+# json is only imported for the rare escaped string (ge_extract).
+
+API = "https://api.givenergy.cloud"
+
+
+def load_secrets():
+    try:
+        from secrets import secrets
+    except ImportError:
+        print("WiFi secrets are kept in secrets.py, please add them there!")
+        raise
+    return secrets
+
+
+def serials(secrets):
+    # The inverters on the site: secrets["InverterSerials"] lists them all, else it is the one InverterSerial
+    return list(secrets.get("InverterSerials") or [secrets["InverterSerial"]])
+
+
+def api_base(secrets):
+    # secrets["Aggregator"], e.g. "http://192.168.1.20:8081", fetches through host/ge_aggregator.py on the LAN
+    # (plain HTTP, the cloud asked once per inverter update for all the displays); without it the cloud is asked
+    return (secrets.get("Aggregator") or API) + "/v1/inverter/"
+
+
+def headers(secrets, close=False):
+    # No API key when going through the aggregator: it asks the cloud with its own, and the
+    # LAN leg is plain HTTP
+    headers = {
+        "Content-Type": "application/json",
+        "Accept":       "application/json",
+    }
+    if not secrets.get("Aggregator"):
+        headers["Authorization"] = "Bearer " + secrets["API_Key"]
+    if close:
+        headers["Connection"] = "close"
+    return headers
+
+
+def payload(serials, setting_id=17):
+    # The JSON body sent with each request
+    return '{"inverter_serials": [%s], "setting_id": %d}' % (", ".join('"%s"' % s for s in serials), setting_id)
+
+
+def sleep_text(seconds):
+    # e.g. "10 minutes", in the largest unit it comes to at least one of
+    for unit, size in (("days", 86400), ("hours", 3600), ("minutes", 60)):
+        if seconds >= size:
+            return "%d %s" % (seconds // size, unit)
+    return "%d seconds" % seconds
@@ -0,0 +1,198 @@
+# The battery dashboard, built once and updated in place.
+#
+# Rebuilding the Groups, Labels and Rects for every update churns the heap,
+# and over days in the continuous loop fragments it until allocations fail.
+# Dashboard allocates the whole tree once; update() only sets label text
+# (and only where it has changed) and the battery gauge level.
+#
+# The gauge fill is a TileGrid one tile wide and a row of pixels high per
+# tile, over a two-tile bitmap (white row, black row). Setting the level
+# flips tile indices, so it allocates nothing.
+#
+# The SoC and solar trends, left of the battery, are ge_sparkline.Sparklines
+# filled from ge_history samples, a column per sample. They are hidden
+# until they have a sample, so a script that keeps no history shows no
+# empty boxes.
+#
+# Given a ge_assets pack, the large labels use its "large" font at scale 1
+# in place of terminalio.FONT at scale 2, and the battery outline is its
+# pre-rendered "battery" image rather than two Rects.
+#
+# A stale sample (the last good one, shown when the fetch failed) says so
+# on the time line in place of the update time.
+
+import displayio
+import terminalio
+from   adafruit_display_text import label
+from   adafruit_display_shapes.rect import Rect
+
+import ge_sparkline
+
+WIDTH  = 296
+HEIGHT = 128
+
+BLACK     = 0x000000
+DARKGREY  = 0x666666
+LIGHTGREY = 0x999999
+WHITE     = 0xFFFFFF
+
+FOREGROUND_COLOR = BLACK
+BACKGROUND_COLOR = WHITE
+
+# Battery outline and its terminal cap, (x, y, width, height)
+BATTERY        = (220, 40, 44, 84)
+BATTERY_CAP    = (232, 35, 15, 5)
+BATTERY_STROKE = 2
+
+# Battery gauge, inside the outline
+GAUGE_X      = 224
+GAUGE_Y      = 44
+GAUGE_WIDTH  = 40 - 2 - 2  # less left and right
+GAUGE_HEIGHT = 80 - 2 - 2  # less top and bottom
+
+# Trends, between the text and the battery
+TREND_X      = 170
+TREND_WIDTH  = 46  # samples shown, about 8 hours at a 10 minute wake
+TREND_HEIGHT = 36
+SOLAR_PEAK   = 5000  # W at the top of the solar trend
+
+
+def create_text_group(x, y, font, text, scale, colour):
+    text_group = displayio.Group(scale=scale, x=x, y=y)
+    text_area = label.Label(font, text=text, color=colour)
+    text_group.append(text_area)
+    return text_group
+
+
+def kwh(value):
+    return "{:.1f}".format(value)
+
+
+def label_texts(system_data, meter_data, time_str, battery_capacity=8.0, stale=False):
+    # -> (SoC percent, ((label name, text), ...)) for a system-data/meter-data sample;
+    # time_str is when it was sampled if stale, else the time of the update
+    system = system_data['data']
+    today  = meter_data['data']['today']
+    soc    = system['battery']['percent']
+    return soc, (
+        ("soc",               "SoC:" + str(soc) + "%"),
+        ("remaining",         kwh(soc / 100 * battery_capacity) + "kWh Remaining"),
+        ("throughput",        "TPut:" + kwh(today['battery']['charge'] + today['battery']['discharge']) + "kWh"),
+        ("solar_production",  "Solar Production = " + kwh(today['solar']) + "kWh"),
+        ("solar_consumption", "Solar Consumption = " + kwh(today['consumption']) + "kWh"),
+        ("charge",            "Charge Today = " + kwh(today['battery']['charge']) + "kWh"),
+        ("discharge",         "Discharge Today = " + kwh(today['battery']['discharge']) + "kWh"),
+        ("export",            "Export Today = " + kwh(today['grid']['export']) + "kWh"),
+        ("import",            "Import Today = " + kwh(today['grid']['import']) + "kWh"),
+        ("time",              ("No data since " if stale else "Updated: ") + time_str),
+    )
+
+
+class Dashboard:
+    def __init__(self, battery_capacity=8.0, font=terminalio.FONT, solar_peak=SOLAR_PEAK, assets=None):
+        self.battery_capacity = battery_capacity  # kWh
+        large_font = assets.font("large") if assets is not None else None
+        battery    = assets.image("battery") if assets is not None else None
+        large_font, large_scale = (large_font, 1) if large_font is not None else (font, 2)
+        self.group = displayio.Group()
+        self._text = {}
+        self.level = -1
+
+        background_bitmap = displayio.Bitmap(WIDTH, HEIGHT, 1)
+        palette    = displayio.Palette(1)
+        palette[0] = BACKGROUND_COLOR
+        self.group.append(displayio.TileGrid(background_bitmap, pixel_shader=palette))
+
+        self.group.append(Rect(193, 2, 101, 61, fill=WHITE, outline=0x0, stroke=0))
+        self.group.append(Rect(193, 65, 101, 61, fill=WHITE, outline=0x0, stroke=0))
+
+        self._add("soc",               16, 10,  large_font, large_scale, BLACK)
+        self._add("remaining",         67, 25,  font, 1, WHITE)
+        self._add("throughput",        135, 10, large_font, large_scale, BLACK)
+        self._add("solar_production",  10, 40,  font, 1, BLACK)
+        self._add("solar_consumption", 5, 52,   font, 1, BLACK)
+        self._add("charge",            35, 64,  font, 1, BLACK)
+        self._add("discharge",         17, 74,  font, 1, BLACK)
+        self._add("export",            35, 86,  font, 1, BLACK)
+        self._add("import",            35, 98,  font, 1, BLACK)
+
+        # Draw Battery outline
+        if battery is not None:
+            battery_palette    = displayio.Palette(2)
+            battery_palette[0] = WHITE
+            battery_palette[1] = BLACK
+            self.group.append(displayio.TileGrid(battery, pixel_shader=battery_palette,
+                                                 x=BATTERY[0], y=BATTERY_CAP[1]))
+        else:
+            self.group.append(Rect(*BATTERY, fill=WHITE, outline=BLACK, stroke=BATTERY_STROKE))
+            self.group.append(Rect(*BATTERY_CAP, fill=BLACK, outline=BLACK, stroke=BATTERY_STROKE))
+
+        # Fill battery to show charge
+        rows = displayio.Bitmap(GAUGE_WIDTH, 2, 2)
+        for x in range(GAUGE_WIDTH):
+            rows[x, 1] = 1
+        gauge_palette    = displayio.Palette(2)
+        gauge_palette[0] = WHITE
+        gauge_palette[1] = BLACK
+        self.bat_charge = displayio.TileGrid(rows, pixel_shader=gauge_palette, width=1, height=GAUGE_HEIGHT,
+                                             tile_width=GAUGE_WIDTH, tile_height=1, default_tile=0,
+                                             x=GAUGE_X, y=GAUGE_Y)
+        self.group.append(self.bat_charge)
+
+        self.soc_trend   = ge_sparkline.Sparkline(TREND_WIDTH, TREND_HEIGHT, 0, 100, x=TREND_X, y=40)
+        self.solar_trend = ge_sparkline.Sparkline(TREND_WIDTH, TREND_HEIGHT, 0, solar_peak, x=TREND_X, y=82)
+        self.soc_trend.hidden   = True  # until there are samples
+        self.solar_trend.hidden = True
+        self.group.append(self.soc_trend)
+        self.group.append(self.solar_trend)
+
+        self.time_group = self._add("time", 20, 120, font, 1, BLACK)
+
+    def _add(self, name, x, y, font, scale, colour):
+        text_group = create_text_group(x, y, font, "", scale, colour)
+        self._text[name] = text_group[0]
+        self.group.append(text_group)
+        return text_group
+
+    def set_text(self, name, text):
+        # Returns True if the label changed
+        text_area = self._text[name]
+        if text_area.text == text:
+            return False
+        text_area.text = text
+        return True
+
+    def set_level(self, percent):
+        charge = int(GAUGE_HEIGHT * percent / 100)
+        if charge == 0:
+            charge = 1
+        if charge == self.level:
+            return False
+        for row in range(GAUGE_HEIGHT):
+            self.bat_charge[0, row] = 1 if row >= GAUGE_HEIGHT - charge else 0
+        self.level = charge
+        return True
+
+    def set_history(self, samples):
+        # Redraw the trends from ge_history samples, oldest first
+        samples = list(samples)
+        self.soc_trend.clear()
+        self.solar_trend.clear()
+        self.soc_trend.extend(sample[1] for sample in samples)
+        self.solar_trend.extend(sample[3] for sample in samples)
+        self.soc_trend.hidden = self.solar_trend.hidden = not samples
+
+    def add_sample(self, sample):
+        # One more ge_history sample on the trends, only its column is drawn
+        self.soc_trend.push(sample[1])
+        self.solar_trend.push(sample[3])
+        self.soc_trend.hidden = self.solar_trend.hidden = False
+
+    def update(self, system_data, meter_data, time_str, stale=False):
+        # Show a system-data/meter-data sample; returns True if anything changed
+        soc, texts = label_texts(system_data, meter_data, time_str, self.battery_capacity, stale)
+        changed = self.set_level(soc)
+        for name, text in texts:
+            if self.set_text(name, text):
+                changed = True
+        return changed
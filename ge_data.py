@@ -0,0 +1,107 @@
+# Getting the readings, from the API (or the aggregator) or straight from
+# the inverter, and printing them on the console.
+#
+#   system_data, meter_data = ge_data.fetch_site(site, session, headers, payload, timer)
+#   system_data, meter_data = ge_data.read_inverter(inverter, timer)
+#   ge_data.print_readings(system_data, meter_data, battery_capacity)
+#   ge_data.print_summary(system_data, meter_data, battery_capacity)
+#
+# Both give None for a reading that failed. timer, a ge_timing.PhaseTimer,
+# is given the time spent on each endpoint and on parsing.
+#
+# print_readings is the display scripts' printout, print_summary the
+# shorter one the continuous scripts (access, v1) have always printed.
+
+
+def fetch_site(site, session, headers, payload, timer=None):
+    # System Data and Meter Data for every inverter of site (ge_site) are requested together,
+    # a failure only loses its own reading; only the fields shown are kept (ge_extract)
+    site.fetch(session, headers, payload)
+    for serial, system_result, meter_result in site.results:
+        if timer is not None:
+            timer.add("system", system_result.elapsed_ms - system_result.parse_ms)
+            timer.add("meter", meter_result.elapsed_ms - meter_result.parse_ms)
+            timer.add("parse", system_result.parse_ms + meter_result.parse_ms)
+        if not system_result.ok:
+            print("System Data Error:", serial, system_result.error)
+        if not meter_result.ok:
+            print("Meter Data Error:", serial, meter_result.error)
+    return site.totals()
+
+
+def read_inverter(inverter, timer=None):
+    # One sample from a ge_modbus.LocalInverter
+    try:
+        sample = inverter.read()
+    except (OSError, RuntimeError) as e:
+        print("Inverter Error:", e)
+        sample = None, None
+    if timer is not None:
+        timer.add("system", inverter.elapsed_ms)
+    return sample
+
+
+def print_readings(system_data, meter_data, battery_capacity):
+    data = system_data
+    #{'data': {'time': '2023-05-28T10:16:27Z',
+    #'battery': {'temperature': 21, 'percent': 100, 'power': 0},
+    #'solar': {'power': 2975,
+    #'arrays': [{'array': 1, 'current': 12.2, 'power': 2975, 'voltage': 242},
+    #{'array': 2, 'current': 0, 'power': 0, 'voltage': 0}]},
+    #'grid': {'current': 0, 'frequency': 50.04, 'power': 2577, 'voltage': 244.9},
+    #'inverter': {'output_voltage': 243.5, 'power': 0, 'output_frequency': 50.03, 'eps_power': 0, 'temperature': 40.3},
+    #'consumption': 398}}
+    StateOfCharge    = data['data']['battery']['percent']
+    BatteryRemaining = "{:.1f}".format(StateOfCharge / 100 * battery_capacity)
+    GenerationToday  = "{:.1f}".format(data['data']['solar']['power'] / 1000)
+    ConsumptionToday = "{:.1f}".format(data['data']['consumption'] / 1000)
+    print("Consumption Today       = ", ConsumptionToday, "kWh")
+    print("Battery Remaining       = ", BatteryRemaining, "kWh")
+    print("Generation Today        = ", GenerationToday, "kWh")
+    print("State of Charge         = ", StateOfCharge, "%")
+
+    data = meter_data
+    #{'data': {'time': '2023-05-28T10:05:29Z',
+    #'today': {'battery': {'discharge': 1.9, 'charge': 4.8},
+    #'grid': {'import': 0, 'export': 0.1},#
+    #'solar': 6.6, 'consumption': 6.5},
+    #'total': {'battery': {'discharge': 3827.8, 'charge': 3827.8},
+    #          'grid': {'import': 4572.6, 'export': 1724.5},
+    #          'solar': 9324.6, 'consumption': 11448.3}}}
+    today = data['data']['today']
+    BatteryDischargeToday  = "{:.1f}".format(today['battery']['discharge'])
+    BatteryChargeToday     = "{:.1f}".format(today['battery']['charge'])
+    BatteryThroughputToday = "{:.1f}".format(today['battery']['discharge'] + today['battery']['charge'])
+    GridExportToday        = "{:.1f}".format(today['grid']['export'])
+    GridImportToday        = "{:.1f}".format(today['grid']['import'])
+    SolarProductionToday   = "{:.1f}".format(today['solar'])
+    SolarConsumptionToday  = "{:.1f}".format(today['consumption'])
+    print("Battery Discharge Today = ", BatteryDischargeToday, "kWh")
+    print("Battery Charge Today    = ", BatteryChargeToday, "kWh")
+    print("Battery Throughput      = ", BatteryThroughputToday, "kWh")
+    print("Grid Export Today       = ", GridExportToday, "kWh")
+    print("Grid Import Today       = ", GridImportToday, "kWh")
+    print("Solar Production Today  = ", SolarProductionToday, "kWh")
+    print("Solar Consumption Today = ", SolarConsumptionToday, "kWh")
+    print("===============================")
+
+
+def print_summary(system_data, meter_data, battery_capacity):
+    data = system_data['data']
+    stateOfCharge    = data['battery']['percent']
+    batteryRemaining = "{:.1f}".format(stateOfCharge / 100 * battery_capacity)
+    GenerationToday  = "{:.1f}".format(data['solar']['power'] / 1000)
+    ConsumptionToday = "{:.1f}".format(data['consumption'] / 1000)
+    print("Consumption Today  = ", ConsumptionToday, "kWh")
+    print("Battery Remaining  = ", batteryRemaining, "kWh")
+    print("Generation Today   = ", GenerationToday, "kWh")
+    print("State of Charge    = ", stateOfCharge, "%")
+
+    battery = meter_data['data']['today']['battery']
+    grid    = meter_data['data']['today']['grid']
+    print("Charge Today       = ", "{:.1f}".format(battery['charge']), "kWh")
+    print("Discharge Today    = ", "{:.1f}".format(battery['discharge']), "kWh")
+    print("Export Today       = ", "{:.1f}".format(grid['export']), "kWh")
+    print("Import Today       = ", "{:.1f}".format(grid['import']), "kWh")
+    print("Battery Discharge  = ", "{:.1f}".format(battery['discharge']), "kWh")
+    print("Battery Throughput = ", "{:.1f}".format(battery['charge'] + battery['discharge']), "kWh")
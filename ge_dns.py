@@ -0,0 +1,106 @@
+# DNS answers kept in sleep memory, so a wake can connect without a lookup.
+#
+# CachedPool sits in front of a socketpool.SocketPool. getaddrinfo() answers
+# from the cache while the entry is younger than ttl and asks the resolver
+# otherwise. Only the address is cached: ge_fetch still sends the host name
+# for SNI and in the Host header, and if a connect to a cached address fails
+# it calls forget() and connects again after a fresh lookup. An address the
+# resolver gave this wake is no staler for a second lookup, so forget()
+# only asks for the retry when the address came from the cache.
+#
+# CircuitPython's getaddrinfo() doesn't say what TTL the record had, so the
+# cache uses a fixed one. Expiry goes by the Clock's UTC time (ge_time); when
+# the time isn't known every entry counts as expired.
+
+import ge_state
+
+SLOTS = 4
+TTL   = 6 * 60 * 60  # seconds
+
+
+def _key(host, port):
+    # 32-bit FNV-1a of host:port
+    h = 0x811C9DC5
+    for b in ("%s:%d" % (host, port)).encode():
+        h = ((h ^ b) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+def _packed(address):
+    # '1.2.3.4' -> 4 bytes, None if it isn't an IPv4 address
+    parts = address.split(".")
+    if len(parts) != 4:
+        return None
+    try:
+        return bytes([int(p) for p in parts])
+    except ValueError:
+        return None
+
+
+def _dotted(packed):
+    return ".".join(str(b) for b in packed)
+
+
+class CachedPool:
+    def __init__(self, pool, memory, clock, ttl=TTL):
+        self._pool   = pool
+        self._block  = ge_state.Block(memory, ge_state.DNS_OFFSET, 0xA6, "I4sHI" * SLOTS)  # host:port key, address, port, expiry
+        self._clock  = clock
+        self.ttl     = ttl
+        self.hits    = 0
+        self.lookups = 0
+        self._cached = set()  # keys answered from sleep memory this wake
+        self.AF_INET     = pool.AF_INET
+        self.SOCK_STREAM = pool.SOCK_STREAM
+        self.SOCK_DGRAM  = pool.SOCK_DGRAM
+
+    def socket(self, *args, **kwargs):
+        return self._pool.socket(*args, **kwargs)
+
+    def _entries(self):
+        values = self._block.load()
+        if values is None:
+            return [[0, bytes(4), 0, 0] for _ in range(SLOTS)]
+        return [list(values[i:i + 4]) for i in range(0, 4 * SLOTS, 4)]
+
+    def _save(self, entries):
+        values = []
+        for entry in entries:
+            values.extend(entry)
+        self._block.save(*values)
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = _key(host, port)
+        now = self._clock.now()
+        entries = self._entries()
+        if now is not None:
+            for entry_key, address, address_port, expires in entries:
+                if entry_key == key and now < expires:
+                    self.hits += 1
+                    self._cached.add(key)
+                    return [(self.AF_INET, type or self.SOCK_STREAM, proto, "", (_dotted(address), address_port))]
+        infos = self._pool.getaddrinfo(host, port, family, type, proto, flags)
+        self.lookups += 1
+        self._cached.discard(key)
+        address = _packed(infos[0][-1][0])
+        if now is not None and address is not None:
+            # Reuse this host's slot, else an expired one, else the one expiring soonest
+            slot = min(entries, key=lambda e: (e[0] != key, e[3] > now, e[3]))
+            slot[:] = [key, address, infos[0][-1][1], now + self.ttl]
+            self._save(entries)
+        return infos
+
+    def forget(self, host, port):
+        # Drops the entry for host and port; True if the address given was a cached one,
+        # so a fresh lookup could help (not if the resolver gave it this wake)
+        key = _key(host, port)
+        entries = self._entries()
+        for entry in entries:
+            if entry[0] == key and entry[3]:
+                entry[:] = [0, bytes(4), 0, 0]
+                self._save(entries)
+                break
+        if key in self._cached:
+            self._cached.discard(key)
+            return True
+        return False
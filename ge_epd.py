@@ -0,0 +1,315 @@
+# Partial updates of the IL0373: only the windows of the panel that changed.
+#
+# A refresh through displayio sends the whole 296x128 frame, both grey
+# planes (9472 bytes at 1 MHz), and runs the full grayscale waveform, even
+# when only the time line and a kWh figure changed. Regions keeps, in sleep
+# memory, the bounding box and ge_frame hash of each top-level element of
+# the dashboard as last sent to the panel. The next wake compares them: the
+# old and new boxes of each element that changed are the dirty rectangles,
+# joined where they overlap (and down to max_windows).
+#
+#   regions = ge_epd.Regions(alarm.sleep_memory, full_every=6)
+#   rects = regions.plan(dashboard.group, 296, 128)
+#   if rects:
+#       ge_epd.PartialIL0373(bus, 296, 128, rotation=270).update(dashboard.group, rects)
+#   else:
+#       display.refresh()           a full refresh is due
+#   regions.sent(dashboard.group, 296, 128, partial=bool(rects))
+#
+# PartialIL0373 composes each window itself (displayio can't be asked for
+# its pixels) and sends it with the controller's partial window commands,
+# black and white with the OTP waveform: the dashboard draws in black and
+# white only. Windows are widened to whole bytes along the panel's source
+# lines. plan() asks for a full refresh every full_every partial updates,
+# to clear the ghosting they leave, and when there is nothing stored, the
+# elements don't match what was stored, nothing changed (the frame guard
+# forcing a refresh) or the windows would cover more than max_fraction of
+# the panel.
+#
+# There is no busy pin on the FeatherWing, so each window's refresh is
+# waited out for refresh_time; at most max_windows (2) are sent, as each
+# one is a refresh of its own.
+#
+# None of this has run on the panel, and no script uses it yet: it is
+# tried against the shim only (host/shim/adafruit_il0373.py, which carries
+# out the window commands). Before it goes into v5 it needs checking on the
+# board: update() sets the black and white panel setting (PSR_BW) and never
+# puts the driver's grayscale one back for the next full refresh, and sends
+# only the new data (DTM2), not the old (DTM1) the waveform may compare it
+# with. PARTIAL_TIME is a typical length for the black and white waveform,
+# not one timed on this panel, and composing the windows in Python hasn't
+# been timed either.
+
+import time
+
+import ge_frame
+import ge_state
+
+FULL_EVERY   = 6     # partial updates between full refreshes
+MAX_WINDOWS  = 2     # windows per update, each is a refresh (and a wait) of its own
+MAX_FRACTION = 0.5   # of the panel, more than this in windows and a full refresh is sent
+GAP          = 0     # pixels, rectangles closer than this are joined too (0: only those that overlap)
+MAX_ELEMENTS = 24    # top-level elements Regions can keep
+
+PARTIAL_TIME = 0.5   # seconds, the black and white partial waveform
+POWER_ON     = 0.1   # seconds for the booster to come up
+
+# IL0373 commands
+PSR   = 0x00  # panel setting
+POF   = 0x02  # power off
+PON   = 0x04  # power on
+DRF   = 0x12  # display refresh
+DTM2  = 0x13  # new data
+PTL   = 0x90  # partial window
+PTIN  = 0x91  # partial in
+PTOUT = 0x92  # partial out
+
+PSR_BW = 0x1F  # LUT from OTP, black and white, scan up and right, booster on, no reset
+
+
+def _union(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def _area(r):
+    return (r[2] - r[0]) * (r[3] - r[1])
+
+
+def _box(item, ox, oy, scale):
+    # (x0, y0, x1, y1) the item covers in display pixels, None if it shows nothing
+    if item.hidden:
+        return None
+    left = ox + item.x * scale
+    top  = oy + item.y * scale
+    if hasattr(item, "append"):  # a Group, and a Label is one
+        box = None
+        for layer in item:
+            box = _union(box, _box(layer, left, top, scale * item.scale))
+        return box
+    return left, top, left + item.width * item.tile_width * scale, top + item.height * item.tile_height * scale
+
+
+def elements(group):
+    # [(box, hash)] for each top-level element of group
+    return [(_box(item, 0, 0, 1), ge_frame.fingerprint((item,))) for item in group]
+
+
+def merge(rects, gap=GAP, max_windows=MAX_WINDOWS):
+    # Joins rectangles that overlap or lie within gap of each other, then the pairs
+    # that add the least area until there are no more than max_windows
+    rects = list(rects)
+    joined = True
+    while joined:
+        joined = False
+        for i in range(len(rects)):
+            a = rects[i]
+            for j in range(i + 1, len(rects)):
+                b = rects[j]
+                if a[0] - gap < b[2] and b[0] - gap < a[2] and a[1] - gap < b[3] and b[1] - gap < a[3]:
+                    rects[i] = _union(a, b)
+                    del rects[j]
+                    joined = True
+                    break
+            if joined:
+                break
+    while len(rects) > max_windows:
+        best = None
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                grown = _area(_union(rects[i], rects[j])) - _area(rects[i]) - _area(rects[j])
+                if best is None or grown < best[0]:
+                    best = (grown, i, j)
+        _, i, j = best
+        rects[i] = _union(rects[i], rects[j])
+        del rects[j]
+    return rects
+
+
+class Regions:
+    def __init__(self, memory, full_every=FULL_EVERY, max_fraction=MAX_FRACTION, max_windows=MAX_WINDOWS):
+        # partial updates since the last full refresh, element count, then per element its box and hash
+        self._block       = ge_state.Block(memory, ge_state.REGIONS_OFFSET, 0xAA, "HB" + "HHHHI" * MAX_ELEMENTS)
+        self.full_every   = full_every
+        self.max_fraction = max_fraction
+        self.max_windows  = max_windows
+        self.reason       = ""  # why plan() asked for a full refresh
+
+    def plan(self, group, width, height):
+        # -> the dirty rectangles to send as partial windows, or None for a full refresh
+        stored  = self._block.load()
+        current = elements(group)
+        if stored is None:
+            self.reason = "nothing stored"
+            return None
+        if stored[0] + 1 > self.full_every:
+            self.reason = "%d partial updates since the last full refresh" % stored[0]
+            return None
+        if stored[1] != len(current):
+            self.reason = "the elements have changed"
+            return None
+        rects = []
+        for i, (box, h) in enumerate(current):
+            x0, y0, x1, y1, stored_hash = stored[2 + 5 * i:7 + 5 * i]
+            old = (x0, y0, x1, y1) if x1 > x0 else None
+            if stored_hash != h or old != self._clip(box, width, height):
+                rect = self._clip(_union(box, old), width, height)
+                if rect is not None:
+                    rects.append(rect)
+        if not rects:
+            self.reason = "nothing changed"
+            return None
+        rects = merge(rects, max_windows=self.max_windows)
+        if sum(_area(r) for r in rects) > self.max_fraction * width * height:
+            self.reason = "the windows would cover most of the panel"
+            return None
+        return rects
+
+    def _clip(self, box, width, height):
+        if box is None:
+            return None
+        x0, y0, x1, y1 = max(box[0], 0), max(box[1], 0), min(box[2], width), min(box[3], height)
+        return (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
+
+    def sent(self, group, width, height, partial):
+        # What is on the panel now, after a partial update or a full refresh
+        current = elements(group)
+        if len(current) > MAX_ELEMENTS:
+            self._block.clear()  # too many to keep, every refresh will be a full one
+            return
+        stored = self._block.load()
+        values = [min(stored[0] + 1, 0xFFFF) if partial and stored else 0, len(current)]
+        for box, h in current:
+            values += list(self._clip(box, width, height) or (0, 0, 0, 0)) + [h]
+        values += [0, 0, 0, 0, 0] * (MAX_ELEMENTS - len(current))
+        self._block.save(*values)
+
+
+def _white(colour):
+    r, g, b = colour >> 16 & 0xFF, colour >> 8 & 0xFF, colour & 0xFF
+    return 1 if r * 299 + g * 587 + b * 114 >= 128000 else 0
+
+
+def _draw(item, buf, win, ox, oy, scale):
+    # Draws what of item falls in win (x0, y0, x1, y1) into buf, a byte a pixel, 1 white
+    if item.hidden:
+        return
+    left = ox + item.x * scale
+    top  = oy + item.y * scale
+    if hasattr(item, "append"):
+        for layer in item:
+            _draw(layer, buf, win, left, top, scale * item.scale)
+        return
+    x0, y0, x1, y1 = win
+    tw, th = item.tile_width, item.tile_height
+    sx0, sx1 = max(x0, left), min(x1, left + item.width * tw * scale)
+    sy0, sy1 = max(y0, top), min(y1, top + item.height * th * scale)
+    if sx0 >= sx1 or sy0 >= sy1:
+        return
+    bitmap, palette = item.bitmap, item.pixel_shader
+    per_row = bitmap.width // tw
+    whites = [None if palette.is_transparent(i) else _white(palette[i]) for i in range(len(palette))]
+    width = x1 - x0
+    for y in range(sy0, sy1):
+        ty, py = divmod((y - top) // scale, th)
+        row = (y - y0) * width - x0
+        for x in range(sx0, sx1):
+            tx, px = divmod((x - left) // scale, tw)
+            tile = item[tx, ty]
+            white = whites[bitmap[tile % per_row * tw + px, tile // per_row * th + py]]
+            if white is not None:
+                buf[row + x] = white
+
+
+def compose_window(group, win):
+    # The pixels of group in win, a byte each (1 white, 0 black), row by row
+    buf = bytearray(b"\x01") * _area(win)
+    _draw(group, buf, win, 0, 0, 1)
+    return buf
+
+
+class PartialIL0373:
+    # Partial window updates over the display's FourWire bus
+    def __init__(self, bus, width, height, rotation=0, refresh_time=PARTIAL_TIME):
+        self.bus          = bus
+        self.width        = width   # as displayio sees it, after rotation
+        self.height       = height
+        self.rotation     = rotation
+        self.refresh_time = refresh_time
+        self.native       = (height, width) if rotation % 180 else (width, height)  # source x gate lines
+        self.bytes_sent   = 0
+        self.windows      = []  # (native window, display window) of the last update
+
+    def _to_native(self, x, y):
+        # Display pixel -> panel pixel, as displayio rotates
+        if self.rotation == 90:
+            return self.height - 1 - y, x
+        if self.rotation == 180:
+            return self.width - 1 - x, self.height - 1 - y
+        if self.rotation == 270:
+            return y, self.width - 1 - x
+        return x, y
+
+    def _to_display(self, nx, ny):
+        if self.rotation == 90:
+            return ny, self.height - 1 - nx
+        if self.rotation == 180:
+            return self.width - 1 - nx, self.height - 1 - ny
+        if self.rotation == 270:
+            return self.width - 1 - ny, nx
+        return nx, ny
+
+    def _corners(self, to, r):
+        # The box covering both corner pixels of r under to()
+        ax, ay = to(r[0], r[1])
+        bx, by = to(r[2] - 1, r[3] - 1)
+        return min(ax, bx), min(ay, by), max(ax, bx) + 1, max(ay, by) + 1
+
+    def window(self, rect):
+        # -> (native window, display window) for rect, widened to whole bytes along the source lines
+        nx0, ny0, nx1, ny1 = self._corners(self._to_native, rect)
+        native = (nx0 & ~7, ny0, min((nx1 + 7) & ~7, self.native[0]), ny1)
+        return native, self._corners(self._to_display, native)
+
+    def _send(self, command, data=b""):
+        self.bus.send(command, data)
+        self.bytes_sent += 1 + len(data)
+
+    def _pack(self, group, native, win):
+        # The window's pixels in the panel's order: gate line by gate line, 8 source pixels a byte, MSB first
+        pixels = compose_window(group, win)
+        nx0, ny0, nx1, ny1 = native
+        x0, y0, x1, _ = win
+        width = x1 - x0
+        out = bytearray((nx1 - nx0) // 8 * (ny1 - ny0))
+        i = 0
+        for ny in range(ny0, ny1):
+            for nx in range(nx0, nx1, 8):
+                byte = 0
+                for bit in range(8):
+                    x, y = self._to_display(nx + bit, ny)
+                    byte = byte << 1 | pixels[(y - y0) * width + x - x0]
+                out[i] = byte
+                i += 1
+        return out
+
+    def update(self, group, rects):
+        # Sends rects (display pixels) of group as partial windows; -> bytes sent
+        self.bytes_sent = 0
+        self.windows    = [self.window(r) for r in rects]
+        self._send(PSR, bytes((PSR_BW,)))
+        self._send(PON)
+        time.sleep(POWER_ON)
+        self._send(PTIN)
+        for native, win in self.windows:
+            nx0, ny0, nx1, ny1 = native
+            self._send(PTL, bytes((nx0, (nx1 - 1) | 0x07, ny0 >> 8, ny0 & 0xFF, (ny1 - 1) >> 8, (ny1 - 1) & 0xFF, 0x01)))
+            self._send(DTM2, self._pack(group, native, win))
+            self._send(DRF)
+            time.sleep(self.refresh_time)
+        self._send(PTOUT)
+        self._send(POF)
+        return self.bytes_sent
@@ -0,0 +1,212 @@
+# Streaming JSON field extractor.
+#
+# response.json() builds the whole payload as a dict tree (solar arrays,
+# inverter block, lifetime totals...) only for the scripts to read a dozen
+# leaves out of it. Extractor is fed the body a chunk at a time as it comes
+# off the socket, follows the key path, and keeps only the values at the
+# requested paths. Subtrees that can't contain a wanted path are skipped
+# without being decoded.
+#
+#   ex = Extractor(SYSTEM_DATA_FIELDS)
+#   ex.feed(chunk) ... ex.close()
+#   ex.data['data']['battery']['percent']
+#
+# ex.data has the same shape as the full payload, pruned to the wanted leaves,
+# so existing data['data'][...] lookups keep working.
+
+SYSTEM_DATA_FIELDS = (
+    "data.time",
+    "data.battery.percent",
+    "data.battery.power",
+    "data.solar.power",
+    "data.grid.power",
+    "data.consumption",
+)
+
+METER_DATA_FIELDS = (
+    "data.time",
+    "data.today.battery.charge",
+    "data.today.battery.discharge",
+    "data.today.grid.import",
+    "data.today.grid.export",
+    "data.today.solar",
+    "data.today.consumption",
+)
+
+_WHITESPACE = b" \t\r\n"
+_SCALAR_END = b" \t\r\n,}]"
+
+# Lexer modes
+_IDLE   = 0
+_STRING = 1
+_SCALAR = 2
+_SKIP   = 3  # inside a container nobody wants, only brackets and strings matter
+
+
+def _string(raw):
+    # json is only imported for a string with an escape in it
+    if b"\\" not in raw:
+        return raw.decode()
+    import json
+    return json.loads('"' + raw.decode() + '"')
+
+
+def _scalar(raw):
+    if raw == b"true":
+        return True
+    if raw == b"false":
+        return False
+    if raw == b"null":
+        return None
+    text = raw.decode()
+    for c in ".eE":
+        if c in text:
+            return float(text)
+    return int(text)
+
+
+_compiled = {}
+
+
+def _compile(fields):
+    # (wanted paths, every container path leading to one), built once per field list
+    compiled = _compiled.get(fields)
+    if compiled is None:
+        paths = set()
+        prefixes = set()
+        for field in fields:
+            path = tuple(field.split("."))
+            paths.add(path)
+            for i in range(len(path)):
+                prefixes.add(path[:i])
+        compiled = _compiled[fields] = (paths, prefixes)
+    return compiled
+
+
+class Extractor:
+    def __init__(self, fields):
+        self.fields, self._prefixes = _compile(tuple(fields))
+        self.data  = {}
+        self.found = 0
+        self._stack      = []     # (bracket, path) of each open container
+        self._key        = None   # key for the next value in the current object
+        self._expect_key = False
+        self._mode       = _IDLE
+        self._buf        = bytearray()
+        self._capture    = False  # keep the bytes of the current string/scalar
+        self._target     = None   # path the current string/scalar will be stored at
+        self._escape     = False
+        self._depth      = 0      # nesting while in _SKIP
+        self._skip_str   = False
+
+    def _value_path(self):
+        if not self._stack:
+            return ()
+        bracket, path = self._stack[-1]
+        if bracket == 0x7B:
+            return path + (self._key,)
+        return path + (None,)
+
+    def _store(self, path, value):
+        node = self.data
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        if path[-1] not in node:
+            self.found += 1  # distinct paths, a repeated key counts once
+        node[path[-1]] = value
+
+    def _end_string(self):
+        if not (self._expect_key or self._capture):
+            return  # nothing was kept, the buffer is still empty
+        raw = bytes(self._buf)
+        self._buf = bytearray()
+        if self._expect_key:
+            self._key = _string(raw)
+            self._expect_key = False
+        elif self._capture:
+            self._store(self._target, _string(raw))
+
+    def _end_scalar(self):
+        if self._capture:
+            self._store(self._target, _scalar(bytes(self._buf)))
+            self._buf = bytearray()
+
+    def feed(self, chunk, start=0, end=None):
+        # chunk[start:end] is the next part of the body, read where it lies
+        i = start
+        size = len(chunk) if end is None else end
+        while i < size:
+            c = chunk[i]
+            mode = self._mode
+            if mode == _SKIP:
+                if self._skip_str:
+                    if self._escape:
+                        self._escape = False
+                    elif c == 0x5C:  # backslash
+                        self._escape = True
+                    elif c == 0x22:  # quote
+                        self._skip_str = False
+                elif c == 0x22:
+                    self._skip_str = True
+                elif c == 0x7B or c == 0x5B:  # { [
+                    self._depth += 1
+                elif c == 0x7D or c == 0x5D:  # } ]
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._mode = _IDLE
+            elif mode == _STRING:
+                if self._escape:
+                    self._escape = False
+                    if self._capture or self._expect_key:
+                        self._buf.append(c)
+                elif c == 0x22:
+                    self._mode = _IDLE
+                    self._end_string()
+                else:
+                    if c == 0x5C:
+                        self._escape = True
+                    if self._capture or self._expect_key:
+                        self._buf.append(c)
+            elif mode == _SCALAR:
+                if c in _SCALAR_END:
+                    self._mode = _IDLE
+                    self._end_scalar()
+                    continue  # the delimiter still needs handling
+                if self._capture:
+                    self._buf.append(c)
+            elif c in _WHITESPACE or c == 0x3A:  # :
+                pass
+            elif c == 0x2C:  # ,
+                if self._stack and self._stack[-1][0] == 0x7B:
+                    self._expect_key = True
+            elif c == 0x7D or c == 0x5D:
+                self._stack.pop()
+                self._expect_key = False
+            elif c == 0x22:
+                self._mode = _STRING
+                if not self._expect_key:
+                    self._target = self._value_path()
+                    self._capture = self._target in self.fields
+            elif c == 0x7B or c == 0x5B:
+                path = self._value_path()
+                if path in self._prefixes:
+                    self._stack.append((c, path))
+                    self._expect_key = c == 0x7B
+                else:
+                    self._mode = _SKIP
+                    self._depth = 1
+                    self._skip_str = False
+            else:
+                self._mode = _SCALAR
+                self._target = self._value_path()
+                self._capture = self._target in self.fields
+                if self._capture:
+                    self._buf.append(c)
+            i += 1
+
+    def close(self):
+        # A bare scalar at the end of the body has no delimiter after it
+        if self._mode == _SCALAR:
+            self._mode = _IDLE
+            self._end_scalar()
+        return self.data
@@ -0,0 +1,580 @@
+# Concurrent fetch stage for the GivEnergy cloud API.
+#
+# system-data and meter-data used to be requested back to back, each waiting
+# for its own round trip. Here both GETs are issued together under asyncio and
+# the results gathered; a request that fails only fails its own slot.
+#
+# Sockets come from a socketpool on the device, or from CPython's socket module
+# on a host, so the same code runs against the cloud and a local stand-in
+# (see host/ge_standin.py).
+#
+# The connect (and TLS handshake) is blocking in the native socket stack, so
+# it is the waiting for and reading of each response that overlaps.
+#
+# Session keeps the sockets open between calls instead; see below.
+#
+# Each Connection reads through one preallocated buffer: recv_into() fills
+# it, the status line and headers are parsed where they lie (only the status
+# and the three headers that frame the body are looked at), and body bytes
+# are handed to the sink (the ge_extract parser) as sink(buffer, start, end),
+# so reading a response into the extractor allocates nothing per recv, per
+# line or per block. A sink must copy what it wants to keep; gathering the
+# whole body (no sink) copies each block out through a memoryview slice.
+# Coroutines are only made to wait: a line or block that is already in, or
+# a recv that needn't wait, is handled without one.
+
+import errno
+import time
+import asyncio
+
+import ge_extract
+
+HTTP_PORT  = 80
+HTTPS_PORT = 443
+
+RX_SIZE = 512  # bytes of receive buffer per connection, pulled from the socket per recv
+
+
+def split_url(url):
+    # "https://host[:port]/path" -> (tls, host, port, path)
+    proto, _, rest = url.partition("://")
+    host, _, path = rest.partition("/")
+    tls  = proto == "https"
+    port = HTTPS_PORT if tls else HTTP_PORT
+    if ":" in host:
+        host, port = host.split(":")
+        port = int(port)
+    return tls, host, port, "/" + path
+
+
+try:
+    bytearray.find
+
+    def _find(buf, sub, start, end):
+        return buf.find(sub, start, end)
+except AttributeError:  # not every port gives bytearray the bytes methods
+    def _find(buf, sub, start, end):
+        for i in range(start, end - len(sub) + 1):
+            for j in range(len(sub)):
+                if buf[i + j] != sub[j]:
+                    break
+            else:
+                return i
+        return -1
+
+
+def _find_crlf(buf, start, end):
+    return _find(buf, b"\r\n", start, end)
+
+
+def _lower_is(buf, start, end, word):
+    # buf[start:end] is word (given in lower case), whatever its case
+    if end - start != len(word):
+        return False
+    for i in range(end - start):
+        if buf[start + i] | 0x20 != word[i]:
+            return False
+    return True
+
+
+def _skip_spaces(buf, start, end):
+    while start < end and (buf[start] == 0x20 or buf[start] == 0x09):
+        start += 1
+    return start
+
+
+def _number(buf, start, end, base=10):
+    # The number at buf[start:], up to the first byte that isn't one of its digits
+    value = 0
+    for i in range(start, end):
+        c = buf[i] | 0x20
+        if 0x30 <= c <= 0x39:
+            digit = c - 0x30
+        elif base == 16 and 0x61 <= c <= 0x66:
+            digit = c - 0x57
+        else:
+            break
+        value = value * base + digit
+    return value
+
+
+def _would_block(e):
+    # CircuitPython raises OSError(EAGAIN), CPython's ssl raises SSLWantRead/Write
+    return e.errno == errno.EAGAIN or type(e).__name__ in ("SSLWantReadError", "SSLWantWriteError")
+
+
+def _ms_since(start_ns):
+    return (time.monotonic_ns() - start_ns) // 1000000
+
+
+def _writer(buf, rx):
+    # A sink filling buf from the front, out of rx (a memoryview of the receive buffer)
+    view = memoryview(buf)
+    at = [0]
+
+    def write(src, start, end):
+        size = end - start
+        view[at[0]:at[0] + size] = rx[start:end]
+        at[0] += size
+
+    return write
+
+
+def _extender(buf, rx):
+    # A sink appending to buf, out of rx
+    def extend(src, start, end):
+        buf.extend(rx[start:end])
+
+    return extend
+
+
+class Response:
+    def __init__(self, status, reason, body=None, length=None, chunked=False, closes=False):
+        self.status  = status
+        self.reason  = reason   # "" for a 200, only decoded for the error message otherwise
+        self.body    = body
+        self.length  = length   # Content-Length, None if not given
+        self.chunked = chunked  # Transfer-Encoding: chunked
+        self.closes  = closes   # the server closes the connection after it
+
+    def json(self):
+        import json
+        return json.loads(self.body)
+
+
+class Connection:
+    # One socket to one host, read and written without blocking the event loop.
+    def __init__(self, pool, ssl_context, host, port=HTTPS_PORT, tls=True, timeout=5):
+        self.host        = host
+        self.port        = port
+        self.tls         = tls
+        self.timeout     = timeout
+        self._pool       = pool
+        self._ssl        = ssl_context
+        self._sock       = None
+        self._rx         = bytearray(RX_SIZE)
+        self._view       = memoryview(self._rx)
+        self._start      = 0  # received bytes not read yet are _rx[_start:_end]
+        self._end        = 0
+        self._deadline   = 0
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def connect(self):
+        try:
+            self._connect()
+        except OSError:
+            # The address may have come from a cache (ge_dns) and gone stale:
+            # look it up again and have one more go
+            forget = getattr(self._pool, "forget", None)
+            if forget is None or not forget(self.host, self.port):
+                raise
+            self._connect()
+
+    def _connect(self):
+        info = self._pool.getaddrinfo(self.host, self.port, 0, self._pool.SOCK_STREAM)[0]
+        sock = self._pool.socket(info[0], info[1])
+        try:
+            if self.tls:
+                sock = self._ssl.wrap_socket(sock, server_hostname=self.host)
+            sock.settimeout(self.timeout)
+            sock.connect(info[-1])
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self._start = self._end = 0
+
+    async def _wait(self):
+        if time.monotonic() > self._deadline:
+            raise OSError(errno.ETIMEDOUT)
+        await asyncio.sleep(0)
+
+    async def send(self, data):
+        view = memoryview(data)
+        while view:
+            try:
+                sent = self._sock.send(view)
+            except OSError as e:
+                if not _would_block(e):
+                    raise
+                sent = 0
+            if sent:
+                view = view[sent:]
+            else:
+                await self._wait()
+
+    def _fill(self):
+        # Receive more after what the buffer holds; -> bytes received, 0 once the peer has
+        # closed, None if nothing has come in yet. Not a coroutine, so a recv that doesn't
+        # have to wait doesn't make one
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._rx):
+            # Full: move what is held to the front, in steps that don't overlap
+            shift, held = self._start, self._end - self._start
+            if not shift:
+                raise OSError("line longer than the %d byte receive buffer" % len(self._rx))
+            for i in range(0, held, shift):
+                n = min(shift, held - i)
+                self._rx[i:i + n] = self._view[shift + i:shift + i + n]
+            self._start, self._end = 0, held
+        try:
+            # into the whole buffer when it is empty, no slice to make
+            size = self._sock.recv_into(self._view[self._end:] if self._end else self._rx)
+        except OSError as e:
+            if not _would_block(e):
+                raise
+            return None
+        self._end += size
+        return size
+
+    async def _receive(self):
+        # _fill(), waiting for data as long as the deadline allows
+        size = self._fill()
+        while size is None:
+            await self._wait()
+            size = self._fill()
+        return size
+
+    def _line_end(self):
+        # Where the line at _start ends (its CR), receiving as much of it as has come in;
+        # -1 if there is more to wait for. The line stays in the buffer until _start moves on
+        end = _find_crlf(self._rx, self._start, self._end)
+        while end < 0:
+            size = self._fill()
+            if size is None:
+                return -1
+            if not size:
+                raise OSError(errno.ECONNRESET)
+            end = _find_crlf(self._rx, self._start, self._end)
+        return end
+
+    async def _wait_line(self):
+        # _line_end(), waiting for the rest of the line as long as the deadline allows
+        end = self._line_end()
+        while end < 0:
+            await self._wait()
+            end = self._line_end()
+        return end
+
+    async def _read_body(self, response, sink):
+        # Hand the body to sink() a block at a time as it arrives
+        chunked = response.chunked
+        length  = None if chunked else response.length  # None: to the close, unless chunked
+        while True:
+            if chunked:
+                end = self._line_end()
+                if end < 0:
+                    end = await self._wait_line()
+                length = _number(self._rx, self._start, end, 16)  # a chunk extension after ";" is ignored
+                self._start = end + 2
+                if not length:
+                    break
+            while length is None or length:
+                if self._start == self._end:
+                    received = self._fill()
+                    if received is None:
+                        received = await self._receive()
+                    if not received:
+                        if length is None:
+                            self.close()
+                            return
+                        raise OSError(errno.ECONNRESET)
+                size = self._end - self._start if length is None else min(length, self._end - self._start)
+                sink(self._rx, self._start, self._start + size)
+                self._start += size
+                if length is not None:
+                    length -= size
+            if not chunked:
+                return
+            end = self._line_end()  # the CRLF after the chunk
+            if end < 0:
+                end = await self._wait_line()
+            self._start = end + 2
+        # Trailer lines, if any, up to the empty line
+        while True:
+            end = self._line_end()
+            if end < 0:
+                end = await self._wait_line()
+            last = end == self._start
+            self._start = end + 2
+            if last:
+                return
+
+    def peer_closed(self):
+        # An idle keep-alive socket has nothing to read: EOF or stray bytes mean it can't be reused
+        if self._start != self._end:
+            return True
+        try:
+            self._sock.recv_into(self._rx)
+        except OSError as e:
+            return not _would_block(e)
+        return True
+
+    async def send_request(self, method, path, headers=None, body=None):
+        self._deadline = time.monotonic() + self.timeout
+        if self._sock is None:
+            self.connect()
+        head = "%s %s HTTP/1.1\r\nHost: %s\r\nUser-Agent: GivEnergy-Display\r\n" % (method, path, self.host)
+        if headers:
+            for name in headers:
+                head += "%s: %s\r\n" % (name, headers[name])
+        if body is not None:
+            if isinstance(body, str):
+                body = body.encode()
+            head += "Content-Length: %d\r\n" % len(body)
+        await self.send(head.encode() + b"\r\n" + (body or b""))
+
+    async def read_response(self, sink=None):
+        # With a sink the body is streamed into it and response.body is None,
+        # otherwise the body is gathered into one bytearray, made to size if the length is given
+        self._deadline = time.monotonic() + self.timeout
+        rx = self._rx
+        end = self._line_end()
+        if end < 0:
+            end = await self._wait_line()
+        # "HTTP/1.x 200 OK"
+        start = self._start
+        space = _find(rx, b" ", start, end)
+        if space < 0:
+            raise OSError("no status in the response")
+        space  = _skip_spaces(rx, space, end)
+        status = _number(rx, space, end)
+        response = Response(status, "")
+        response.closes = space - start > 7 and rx[start + 7] == 0x30  # HTTP/1.0 closes after each response
+        if status != 200:
+            response.reason = bytes(rx[_skip_spaces(rx, space + 3, end):end]).decode()
+        self._start = end + 2
+        while True:
+            end = self._line_end()
+            if end < 0:
+                end = await self._wait_line()
+            start = self._start
+            self._start = end + 2
+            if end == start:
+                break
+            colon = _find(rx, b":", start, end)
+            if colon < 0:
+                continue
+            value = _skip_spaces(rx, colon + 1, end)
+            while end > value and (rx[end - 1] == 0x20 or rx[end - 1] == 0x09):
+                end -= 1
+            if _lower_is(rx, start, colon, b"content-length"):
+                response.length = _number(rx, value, end)
+            elif _lower_is(rx, start, colon, b"transfer-encoding"):
+                response.chunked = _lower_is(rx, value, end, b"chunked")
+            elif _lower_is(rx, start, colon, b"connection"):
+                response.closes = _lower_is(rx, value, end, b"close")
+        if sink is None:
+            if response.length is not None and not response.chunked:
+                response.body = bytearray(response.length)
+                sink = _writer(response.body, self._view)
+            else:
+                response.body = bytearray()
+                sink = _extender(response.body, self._view)
+        await self._read_body(response, sink)
+        if response.closes:
+            self.close()
+        return response
+
+    async def request(self, method, path, headers=None, body=None, sink=None):
+        await self.send_request(method, path, headers, body)
+        return await self.read_response(sink)
+
+
+class FetchResult:
+    # One slot of a gathered fetch: either data or error is set.
+    # With fields, only those key paths are kept (see ge_extract), and a
+    # response without all of them fails its slot; a
+    # function in place of fields decodes the whole body (e.g. ge_record.decode).
+    def __init__(self, url, fields=None):
+        self.url        = url
+        self.fields     = fields
+        self.data       = None
+        self.error      = None
+        self.elapsed_ms = 0
+        self.parse_ns   = 0  # of elapsed_ms, time spent parsing the body
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def sink(self):
+        if not self.fields or callable(self.fields):
+            return None
+        self._extractor = ge_extract.Extractor(self.fields)
+        self.parse_ns = 0
+        return self._feed
+
+    def _feed(self, buf, start, end):
+        mark = time.monotonic_ns()
+        self._extractor.feed(buf, start, end)
+        self.parse_ns += time.monotonic_ns() - mark
+
+    def finish(self, response):
+        if response.status != 200:
+            raise RuntimeError("HTTP %d %s" % (response.status, response.reason))
+        start = time.monotonic_ns()
+        if callable(self.fields):
+            data = self.fields(response.body)
+        else:
+            data = self._extractor.close() if self.fields else response.json()
+        self.parse_ns += time.monotonic_ns() - start
+        if self.fields and not callable(self.fields) and self._extractor.found < len(self._extractor.fields):
+            # A 200 with a field missing would only fail later, where the reading is used
+            raise ValueError("%d of %d fields in the response" % (self._extractor.found, len(self._extractor.fields)))
+        return data
+
+    @property
+    def parse_ms(self):
+        return self.parse_ns // 1000000
+
+
+def _results(urls, fields):
+    if fields is None:
+        fields = [None] * len(urls)
+    return [FetchResult(url, f) for url, f in zip(urls, fields)]
+
+
+async def _fetch_json(pool, ssl_context, result, headers, body, timeout):
+    start = time.monotonic_ns()
+    tls, host, port, path = split_url(result.url)
+    conn = Connection(pool, ssl_context, host, port, tls, timeout)
+    try:
+        response = await conn.request("GET", path, headers, body, result.sink())
+        result.data = result.finish(response)
+    except Exception as e:  # only this slot fails
+        result.error = e
+    finally:
+        conn.close()
+        result.elapsed_ms = _ms_since(start)
+
+
+async def gather_json(pool, ssl_context, urls, headers=None, body=None, timeout=5, fields=None):
+    results = _results(urls, fields)
+    await asyncio.gather(*[_fetch_json(pool, ssl_context, r, headers, body, timeout) for r in results])
+    return results
+
+
+def fetch_all(pool, ssl_context, urls, headers=None, body=None, timeout=5, fields=None):
+    # Fetch every url at once and report the saving over fetching back to back.
+    # fields, if given, holds a tuple of key paths (or None) for each url.
+    start = time.monotonic_ns()
+    results = asyncio.run(gather_json(pool, ssl_context, urls, headers, body, timeout, fields))
+    _report(results, _ms_since(start))
+    return results
+
+
+def _report(results, wall_ms):
+    for r in results:
+        if r.ok:
+            print("  %5d ms  %s" % (r.elapsed_ms, r.url))
+        else:
+            print("  %5d ms  %s FAILED: %r" % (r.elapsed_ms, r.url, r.error))
+    serial_ms = sum(r.elapsed_ms for r in results)
+    print("Fetched %d in %d ms (back to back ~%d ms, saved %d ms)" % (len(results), wall_ms, serial_ms, serial_ms - wall_ms))
+
+
+class Session:
+    # Connection-reuse mode: one keep-alive socket per host, kept across calls
+    # (and loop iterations), so each poll skips the TCP connect and TLS
+    # handshake. Requests to the same host are pipelined over its socket and
+    # the responses read back in order; a broken socket is reconnected once.
+    # With max_connections above 1 a host's requests are shared out over up
+    # to that many sockets, read side by side; the socket pool on the board
+    # is small, so keep it low.
+    def __init__(self, pool, ssl_context, timeout=5, max_connections=1):
+        self._pool           = pool
+        self._ssl            = ssl_context
+        self.timeout         = timeout
+        self.max_connections = max_connections  # sockets per host
+        self._connections    = {}
+        self.requests        = 0  # responses received
+        self.handshakes      = 0  # sockets opened
+
+    @property
+    def handshakes_avoided(self):
+        return max(0, self.requests - self.handshakes)
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+        self._connections = {}
+
+    def _connection(self, tls, host, port, lane=0):
+        key = (tls, host, port, lane)
+        conn = self._connections.get(key)
+        if conn is None:
+            conn = Connection(self._pool, self._ssl, host, port, tls, self.timeout)
+            self._connections[key] = conn
+        return conn
+
+    async def _fetch_host(self, conn, results, headers, body):
+        # Each response is timed from the one before it on this socket (the first from
+        # the start, connect included): the time the socket spent on it, so a lane's
+        # times add up to the same requests fetched back to back over it
+        mark = time.monotonic_ns()
+        pending = list(results)
+        retried = False
+        while pending:
+            if conn.connected and conn.peer_closed():
+                conn.close()
+            reused = conn.connected
+            try:
+                if not reused:
+                    conn.connect()
+                    self.handshakes += 1
+                for r in pending:
+                    await conn.send_request("GET", split_url(r.url)[3], headers, body)
+                while pending:
+                    r = pending[0]
+                    response = await conn.read_response(r.sink())
+                    pending.pop(0)
+                    self.requests += 1
+                    r.elapsed_ms = _ms_since(mark)
+                    mark = time.monotonic_ns()
+                    try:
+                        r.data = r.finish(response)
+                    except Exception as e:  # only this slot fails
+                        r.error = e
+                    if pending and not conn.connected:
+                        break  # server closed after this response, reconnect for the rest
+            except Exception as e:
+                conn.close()
+                if reused and not retried:
+                    retried = True  # stale keep-alive socket, try once on a fresh one
+                    continue
+                for r in pending:
+                    r.error = e
+                    r.elapsed_ms = _ms_since(mark)
+                return
+
+    async def gather_json(self, urls, headers=None, body=None, fields=None):
+        results = _results(urls, fields)
+        by_host = {}
+        for r in results:
+            tls, host, port, _ = split_url(r.url)
+            by_host.setdefault((tls, host, port), []).append(r)
+        lanes = {}
+        for key, host_results in by_host.items():
+            count = min(self.max_connections, len(host_results))
+            for i, r in enumerate(host_results):
+                lanes.setdefault(key + (i % count,), []).append(r)
+        await asyncio.gather(*[self._fetch_host(self._connection(*key), lanes[key], headers, body) for key in lanes])
+        return results
+
+    def fetch_all(self, urls, headers=None, body=None, fields=None):
+        start = time.monotonic_ns()
+        results = asyncio.run(self.gather_json(urls, headers, body, fields))
+        _report(results, _ms_since(start))
+        print("Connections opened %d for %d requests, %d handshakes avoided" % (self.handshakes, self.requests, self.handshakes_avoided))
+        return results
@@ -0,0 +1,68 @@
+# Frame fingerprint, to skip e-ink refreshes that wouldn't change the panel.
+#
+# A grayscale refresh of the IL0373 takes seconds of current draw, and
+# overnight the numbers on screen often come out the same after "{:.1f}"
+# formatting. The fingerprint hashes what the composed frame is made of:
+# every label's text, colour and position, and the position, tile size
+# (a Rect's width and height) and tile layout of every other element (so the
+# battery gauge level counts), and for a Sparkline the rows it has plotted;
+# and whether each element is hidden. It is kept in
+# sleep memory with a count of skipped refreshes; a refresh is still forced
+# every full_refresh_every cycles to clear any ghosting.
+
+import array
+
+import ge_state
+
+_FNV_OFFSET = 0x811C9DC5
+_FNV_PRIME  = 0x01000193
+
+
+def _fnv1a(h, data):
+    for b in data:
+        h = ((h ^ b) * _FNV_PRIME) & 0xFFFFFFFF
+    return h
+
+
+def _walk(h, group, skip):
+    for item in group:
+        if item in skip:
+            continue
+        h = _fnv1a(h, ("%s,%s,%s,%d;" % (type(item).__name__, item.x, item.y, item.hidden)).encode())
+        if hasattr(item, "text"):
+            h = _fnv1a(h, ("%s,%s;" % (item.text, getattr(item, "color", ""))).encode())
+        elif hasattr(item, "scale") or hasattr(item, "append"):
+            h = _fnv1a(h, ("%s[" % getattr(item, "scale", 1)).encode())
+            h = _walk(h, item, skip)
+            h = _fnv1a(h, b"]")
+        else:
+            # A TileGrid: its tile size and layout (e.g. the battery gauge level), 16 bits an index
+            h = _fnv1a(h, ("%s,%s;" % (item.tile_width, item.tile_height)).encode())
+            h = _fnv1a(h, bytes(array.array("H", (item[i] for i in range(item.width * item.height)))))
+            if hasattr(item, "plotted"):
+                h = _fnv1a(h, item.plotted())
+    return h
+
+
+def fingerprint(group, skip=()):
+    # 32-bit hash of the group tree, leaving out anything in skip
+    return _walk(_FNV_OFFSET, group, skip)
+
+
+class FrameGuard:
+    def __init__(self, memory, full_refresh_every=12):
+        self._block = ge_state.Block(memory, ge_state.FRAME_OFFSET, 0xA2, "IH")
+        self.full_refresh_every = full_refresh_every
+
+    def needs_refresh(self, frame_hash):
+        stored = self._block.load()
+        if stored is None or stored[0] != frame_hash:
+            return True
+        return stored[1] + 1 >= self.full_refresh_every
+
+    def refreshed(self, frame_hash):
+        self._block.save(frame_hash, 0)
+
+    def skipped(self, frame_hash):
+        stored = self._block.load()
+        self._block.save(frame_hash, stored[1] + 1 if stored else 1)
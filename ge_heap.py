@@ -0,0 +1,143 @@
+# Heap accounting per phase of the wake, kept in sleep memory.
+#
+# The scripts ran gc.collect() at fixed points and never looked at free
+# memory, so a growing payload or a few more labels showed up as a
+# MemoryError on the board. HeapBudget is told where each phase starts and
+# ends and records gc.mem_free() on both sides, so it can say how much a
+# phase took and flag one that took more than its budget or left less
+# free than floor.
+#
+#   heap = ge_heap.HeapBudget(alarm.sleep_memory, {"fetch": 24 * 1024})
+#   heap.enter("connect") ... heap.enter("fetch") ... heap.leave()
+#   heap.dump()            table over serial
+#
+# Whether a gc.collect() at the end of a phase pays off is learned rather
+# than fixed: every sample_every wakes is a measuring wake that collects
+# after every phase and keeps what each collect got back, and also finds
+# the largest block that can still be allocated once that collect is done
+# (largest_free(); its failed tries make the VM collect anyway, so a
+# figure from before the collect can't be had, and it is only run then).
+# On other wakes a phase is collected after only if its collects have got
+# back at least min_reclaim bytes, or free memory is under floor. Per
+# phase the block keeps the lowest free and the smallest largest block
+# seen, the bytes its last measured collect got back and how many wakes it
+# broke its budget. The parse is done as the responses stream in
+# (ge_extract), so it is part of "fetch".
+
+import gc
+import time
+
+import ge_state
+
+PHASES = ("connect", "fetch", "layout", "refresh")
+
+SAMPLE_EVERY = 8          # wakes, one in this many measures every phase
+MIN_RECLAIM  = 4 * 1024   # bytes a collect has to get back to be worth it
+FLOOR        = 16 * 1024  # bytes, less free than this after a phase is flagged
+
+UNKNOWN = 0xFFFFFFFF  # stored for a figure not measured yet
+
+
+def largest_free(limit=None):
+    # The largest bytearray that can be allocated now, to within an eighth, trying down from limit
+    size = gc.mem_free() if limit is None else limit
+    while size >= 64:
+        try:
+            block = bytearray(size)
+        except MemoryError:
+            size = size * 7 // 8
+            continue
+        del block
+        return size
+    return 0
+
+
+class HeapBudget:
+    def __init__(self, memory, budgets=None, floor=FLOOR, min_reclaim=MIN_RECLAIM, sample_every=SAMPLE_EVERY):
+        # wakes, then per phase: lowest free, smallest largest block, last reclaim, wakes over budget
+        self._block       = ge_state.Block(memory, ge_state.HEAP_OFFSET, 0xA9, "H" + "IIIH" * len(PHASES))
+        self.budgets      = budgets or {}  # phase -> bytes it may take
+        self.floor        = floor
+        self.min_reclaim  = min_reclaim
+        self.sample_every = sample_every
+        stored            = self._block.load()
+        self._base        = list(stored) if stored is not None else [0] + [UNKNOWN, UNKNOWN, UNKNOWN, 0] * len(PHASES)
+        self.stored       = self._base  # as saved by the last leave()
+        self.measuring    = self._base[0] % sample_every == 0  # the first wake after power on too
+        self.wakes        = self._base[0] + 1
+        self.used         = {}  # phase -> bytes taken this wake
+        self.free         = {}  # phase -> bytes free after it this wake
+        self.largest      = {}  # phase -> largest block after it, on a measuring wake
+        self.collected    = {}  # phase -> (bytes got back, ms) for the collects run this wake
+        self.breaches     = []  # (phase, why) this wake
+        self._phase       = None
+        self._before      = 0
+
+    def _fields(self, values, phase):
+        i = 1 + 4 * PHASES.index(phase)
+        return values[i:i + 4]
+
+    def enter(self, phase):
+        # Ends the running phase, if any, and starts phase
+        self.leave()
+        self._phase  = phase
+        self._before = gc.mem_free()
+
+    def pays(self, phase, free):
+        # Whether to collect after phase, with free bytes left
+        if self.measuring or free < self.floor:
+            return True
+        return self._fields(self._base, phase)[2] >= self.min_reclaim  # UNKNOWN until measured
+
+    def leave(self):
+        phase = self._phase
+        if phase is None:
+            return
+        self._phase = None
+        free = gc.mem_free()
+        used = max(self._before - free, 0)
+        self.used[phase] = used
+        budget = self.budgets.get(phase)
+        if budget is not None and used > budget:
+            self.breaches.append((phase, "took %d bytes, budget %d" % (used, budget)))
+        if free < self.floor:
+            self.breaches.append((phase, "left %d bytes free, floor %d" % (free, self.floor)))
+        if self.pays(phase, free):
+            start = time.monotonic_ns()
+            gc.collect()
+            after = gc.mem_free()
+            self.collected[phase] = (after - free, (time.monotonic_ns() - start) // 1000000)
+            free = after
+        self.free[phase] = free
+        if self.measuring:
+            self.largest[phase] = largest_free(free)
+        for p, why in self.breaches:
+            if p == phase:
+                print("Heap budget: %s %s" % (phase, why))
+        self._save()
+
+    def _save(self):
+        # What was stored at the start of the wake, with this wake's figures so far
+        values = [min(self.wakes, 0xFFFF)]
+        for phase in PHASES:
+            low, largest, reclaim, breaches = self._fields(self._base, phase)
+            low     = min(low, self.free.get(phase, UNKNOWN))
+            largest = min(largest, self.largest.get(phase, UNKNOWN))
+            if self.measuring and phase in self.collected:
+                reclaim = max(self.collected[phase][0], 0)
+            if any(p == phase for p, _ in self.breaches):
+                breaches = min(breaches + 1, 0xFFFF)
+            values += [low, largest, reclaim, breaches]
+        self._block.save(*values)
+        self.stored = values
+
+    def dump(self):
+        print("Heap by phase (bytes), wake %d%s; largest is measured after the phase's collect, one wake in %d"
+              % (self.wakes, ", measuring" if self.measuring else "", self.sample_every))
+        print("%-8s%8s%8s%8s%9s%8s%8s%9s" % ("phase", "took", "free", "lowest", "largest", "reclaim", "gc ms", "breaches"))
+        for phase in PHASES:
+            low, largest, _, breaches = self._fields(self.stored, phase)
+            got, ms = self.collected.get(phase, ("-", "-"))
+            print("%-8s%8s%8s%8s%9s%8s%8s%9s" % (phase, self.used.get(phase, "-"), self.free.get(phase, "-"),
+                                                 low if low != UNKNOWN else "-",
+                                                 largest if largest != UNKNOWN else "-", got, ms, breaches))
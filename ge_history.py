@@ -0,0 +1,112 @@
+# History of the readings, a ring buffer in sleep memory.
+#
+# Each wake adds one fixed-size sample (time, SoC and the four powers) to a
+# ring of SLOTS samples after a small header, so the newest SLOTS samples
+# are kept and the oldest is overwritten. A sample is written with one slice
+# assignment and read with one slice, so appending and reading a window cost
+# the same whatever the ring holds.
+#
+#   time         uint32  seconds since 1970 (UTC), from system-data
+#   soc          uint8   %
+#   battery      int16   W, + discharging
+#   solar        uint16  W
+#   grid         int16   W, + exporting
+#   consumption  uint16  W
+#
+# Samples are kept on a fixed grid of INTERVAL seconds, the first of each
+# 10 minutes, however often the scheduler wakes (down to every 5 minutes),
+# so 288 samples of 13 bytes always cover 48 hours in under 4 KB.
+# Samples come in time order, so since() finds the start of a window by
+# bisection. Any bytearray-like buffer will do in place of sleep memory,
+# e.g. one read from and written back to a file on flash.
+
+import struct
+
+import ge_state
+import ge_time
+
+SLOTS    = 288  # 48 hours of INTERVAL samples
+INTERVAL = 600  # seconds, one sample kept in each
+
+_SAMPLE = "<IBhHhH"
+SAMPLE_SIZE = struct.calcsize(_SAMPLE)
+FIELDS = ("time", "soc", "battery", "solar", "grid", "consumption")
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, int(value)))
+
+
+class History:
+    def __init__(self, memory, slots=SLOTS, interval=INTERVAL):
+        # slots, next slot to write, samples held
+        self._header   = ge_state.Block(memory, ge_state.HISTORY_OFFSET, 0xA7, "HHH")
+        self._memory   = memory
+        self._base     = ge_state.HISTORY_OFFSET + self._header.size
+        self.slots     = slots
+        self.interval  = interval
+        state = self._header.load()
+        # A ring of another size is a different layout, start again
+        self._next, self._count = state[1:] if state is not None and state[0] == slots else (0, 0)
+
+    @property
+    def size(self):
+        # bytes of sleep memory used, header included
+        return self._header.size + self.slots * SAMPLE_SIZE
+
+    def __len__(self):
+        return self._count
+
+    def _read(self, slot):
+        start = self._base + slot * SAMPLE_SIZE
+        return struct.unpack(_SAMPLE, bytes(self._memory[start:start + SAMPLE_SIZE]))
+
+    def _slot(self, index):
+        # index 0 is the oldest sample held
+        return (self._next - self._count + index) % self.slots
+
+    def append(self, system_data):
+        # False if the sample falls in the same interval as the last one (or before it),
+        # so the ring stays in time order with a sample an interval
+        system = system_data["data"]
+        stamp  = ge_time.iso_to_epoch(system["time"])
+        newest = self.newest()
+        if newest is not None and stamp // self.interval <= newest[0] // self.interval:
+            return False
+        sample = struct.pack(_SAMPLE, stamp,
+                             _clamp(system["battery"]["percent"], 0, 255),
+                             _clamp(system["battery"].get("power", 0), -32768, 32767),
+                             _clamp(system["solar"]["power"], 0, 65535),
+                             _clamp(system.get("grid", {}).get("power", 0), -32768, 32767),
+                             _clamp(system["consumption"], 0, 65535))
+        start = self._base + self._next * SAMPLE_SIZE
+        self._memory[start:start + SAMPLE_SIZE] = sample
+        self._next  = (self._next + 1) % self.slots
+        self._count = min(self._count + 1, self.slots)
+        self._header.save(self.slots, self._next, self._count)
+        return True
+
+    def latest(self, n=None):
+        # The newest n samples (all of them if n is None), oldest first, as tuples in FIELDS order
+        n = self._count if n is None else min(n, self._count)
+        for index in range(self._count - n, self._count):
+            yield self._read(self._slot(index))
+
+    def since(self, epoch):
+        # The samples taken at or after epoch, oldest first
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._read(self._slot(mid))[0] < epoch:
+                low = mid + 1
+            else:
+                high = mid
+        for index in range(low, self._count):
+            yield self._read(self._slot(index))
+
+    def newest(self):
+        return self._read(self._slot(self._count - 1)) if self._count else None
+
+    def clear(self):
+        self._next, self._count = 0, 0
+        self._header.clear()
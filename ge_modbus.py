@@ -0,0 +1,163 @@
+# Readings straight from the inverter over Modbus TCP on the LAN.
+#
+# The cloud API is a round trip to the internet and behind the inverter by
+# however long the cloud takes to post a sample. LocalInverter reads the
+# same numbers from the inverter's input registers in one Modbus request
+# and returns them as system-data/meter-data payloads in the API's shape,
+# with the keys the dashboards use, so everything after the fetch takes it
+# as it takes the cloud's.
+#
+# The register map is the GivEnergy hybrid inverter's, as the community
+# givenergy-modbus project documents it (energies in 0.1 kWh, powers in W).
+# There is no register for today's consumption, so it is worked out from
+# the others: solar + import + discharge - export - charge. The inverter
+# doesn't time its samples either; the time of the read is used.
+#
+# The transport is plain Modbus TCP (MBAP header, function 4). GivEnergy's
+# own WiFi dongle on port 8899 wraps its frames differently, so a Modbus
+# TCP gateway in front of the inverter (or one that speaks it) is assumed.
+
+import struct
+import time
+
+import ge_time
+
+PORT = 502
+UNIT = 0x11  # GivEnergy inverters answer as unit 0x11
+
+READ_INPUT_REGISTERS = 0x04
+
+# Input registers
+E_PV1_DAY               = 17
+P_PV1                   = 18
+E_PV2_DAY               = 19
+P_PV2                   = 20
+E_GRID_OUT_DAY          = 25
+E_GRID_IN_DAY           = 26
+P_GRID_OUT              = 30  # signed, + exporting
+E_BATTERY_CHARGE_DAY    = 36
+E_BATTERY_DISCHARGE_DAY = 37
+P_LOAD_DEMAND           = 42
+P_BATTERY               = 52  # signed, + discharging
+BATTERY_PERCENT         = 59
+REGISTERS               = 60  # read 0..59 in one request, the most the inverter returns at once
+
+
+def _signed(value):
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class ModbusTCP:
+    def __init__(self, pool, host, port=PORT, unit=UNIT, timeout=5):
+        self._pool       = pool
+        self.host        = host
+        self.port        = port
+        self.unit        = unit
+        self.timeout     = timeout
+        self._sock       = None
+        self._rx         = bytearray(9 + 2 * REGISTERS)  # MBAP, function, byte count, registers
+        self.transaction = 0
+
+    def connect(self):
+        info = self._pool.getaddrinfo(self.host, self.port, 0, self._pool.SOCK_STREAM)[0]
+        sock = self._pool.socket(info[0], info[1])
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(info[-1])
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _recv(self, view):
+        while view:
+            size = self._sock.recv_into(view)
+            if not size:
+                raise OSError("Modbus connection closed")
+            view = view[size:]
+
+    def read_input_registers(self, address, count):
+        # -> count register values (unsigned 16 bit) from address on
+        if self._sock is None:
+            self.connect()
+        self.transaction = (self.transaction + 1) & 0xFFFF
+        self._sock.send(struct.pack(">HHHBBHH", self.transaction, 0, 6, self.unit,
+                                    READ_INPUT_REGISTERS, address, count))
+        view = memoryview(self._rx)
+        self._recv(view[:8])
+        transaction, protocol, length, unit, function = struct.unpack(">HHHBB", self._rx[:8])
+        if length < 2 or length > len(self._rx) - 6:
+            raise OSError("Modbus frame of %d bytes" % length)
+        self._recv(view[8:6 + length])
+        if function == READ_INPUT_REGISTERS | 0x80:
+            raise RuntimeError("Modbus exception %d" % self._rx[8])
+        if transaction != self.transaction or function != READ_INPUT_REGISTERS or self._rx[8] != 2 * count:
+            raise OSError("Modbus reply doesn't match the request")
+        return struct.unpack(">%dH" % count, self._rx[9:9 + 2 * count])
+
+
+def payloads(registers, epoch):
+    # Input registers 0..59 read at epoch -> (system_data, meter_data)
+    charge, discharge = registers[E_BATTERY_CHARGE_DAY], registers[E_BATTERY_DISCHARGE_DAY]
+    grid_import, grid_export = registers[E_GRID_IN_DAY], registers[E_GRID_OUT_DAY]
+    solar = registers[E_PV1_DAY] + registers[E_PV2_DAY]
+    consumption = max(0, solar + grid_import + discharge - grid_export - charge)
+    stamp = ge_time.epoch_to_iso(epoch)
+    system_data = {"data": {
+        "time": stamp,
+        "battery": {"percent": registers[BATTERY_PERCENT], "power": _signed(registers[P_BATTERY])},
+        "solar": {"power": registers[P_PV1] + registers[P_PV2]},
+        "grid": {"power": _signed(registers[P_GRID_OUT])},
+        "consumption": registers[P_LOAD_DEMAND],
+    }}
+    meter_data = {"data": {
+        "time": stamp,
+        "today": {
+            "battery": {"charge": charge / 10, "discharge": discharge / 10},
+            "grid": {"import": grid_import / 10, "export": grid_export / 10},
+            "solar": solar / 10,
+            "consumption": consumption / 10,
+        },
+    }}
+    return system_data, meter_data
+
+
+def registers(system_data, meter_data):
+    # The other way, input registers 0..59 for a sample (for stand-ins)
+    system = system_data["data"]
+    today  = meter_data["data"]["today"]
+    values = [0] * REGISTERS
+    values[BATTERY_PERCENT]         = system["battery"]["percent"]
+    values[P_BATTERY]               = system["battery"].get("power", 0) & 0xFFFF
+    values[P_PV1]                   = system["solar"]["power"]
+    values[P_GRID_OUT]              = system.get("grid", {}).get("power", 0) & 0xFFFF
+    values[P_LOAD_DEMAND]           = system["consumption"]
+    values[E_PV1_DAY]               = int(today["solar"] * 10 + 0.5)
+    values[E_GRID_IN_DAY]           = int(today["grid"]["import"] * 10 + 0.5)
+    values[E_GRID_OUT_DAY]          = int(today["grid"]["export"] * 10 + 0.5)
+    values[E_BATTERY_CHARGE_DAY]    = int(today["battery"]["charge"] * 10 + 0.5)
+    values[E_BATTERY_DISCHARGE_DAY] = int(today["battery"]["discharge"] * 10 + 0.5)
+    return values
+
+
+class LocalInverter:
+    def __init__(self, pool, host, port=PORT, unit=UNIT, clock=None, timeout=5):
+        self._client    = ModbusTCP(pool, host, port, unit, timeout)
+        self._clock     = clock
+        self.elapsed_ms = 0
+
+    def read(self):
+        # -> (system_data, meter_data); raises OSError or RuntimeError if the inverter can't be read
+        start = time.monotonic_ns()
+        try:
+            values = self._client.read_input_registers(0, REGISTERS)
+        finally:
+            self._client.close()
+            self.elapsed_ms = (time.monotonic_ns() - start) // 1000000
+        epoch = self._clock.now() if self._clock is not None else None
+        return payloads(values, epoch if epoch is not None else int(time.time()))
@@ -0,0 +1,51 @@
+# Getting on the network: WiFi, the socket pool and the API session.
+#
+#   ge_network.connect(secrets, rejoin)            rejoin a ge_wifi.Rejoin, or None for a plain connect
+#   pool    = ge_network.socket_pool(alarm.sleep_memory, clock)
+#   session = ge_network.session(pool)
+#
+# ssl and ge_fetch (and asyncio with it) are only imported by session(),
+# so a wake that reads the inverter over Modbus never loads them.
+
+import time
+
+import socketpool
+import wifi
+
+
+def connect(secrets, rejoin=None):
+    # Connect to Wi-Fi, straight to the access point and address of the last wake if rejoin can (ge_wifi)
+    print("\n===============================")
+    print("Connecting to WiFi...")
+    while not wifi.radio.ipv4_address:
+        try:
+            if rejoin is not None:
+                rejoin.connect(wifi.radio, secrets["ssid"], secrets["password"])
+            else:
+                wifi.radio.connect(secrets["ssid"], secrets["password"])
+        except ConnectionError as e:
+            print("Connection Error:", e)
+            print("Retrying in 10 seconds")
+            time.sleep(10)
+    if rejoin is not None:
+        print("Connected (%s) in %d ms" % (rejoin.path, rejoin.elapsed_ms))
+    else:
+        print("Connected to %s!" % secrets["ssid"])
+        print("My IP address is", wifi.radio.ipv4_address)
+
+
+def socket_pool(memory=None, clock=None):
+    # There can be only one pool. Given sleep memory, the API hosts' addresses are kept
+    # across wakes, so most wakes skip the DNS lookups (ge_dns)
+    pool = socketpool.SocketPool(wifi.radio)
+    if memory is None:
+        return pool
+    import ge_dns
+    return ge_dns.CachedPool(pool, memory, clock)
+
+
+def session(pool, max_connections=1):
+    # Keep-alive connections to the API over pool (ge_fetch)
+    import ssl
+    import ge_fetch
+    return ge_fetch.Session(pool, ssl.create_default_context(), timeout=5, max_connections=max_connections)
@@ -0,0 +1,85 @@
+# Compact binary reading: the numbers the dashboards use from system-data and
+# meter-data, in one fixed-layout record.
+#
+# A wake downloads and parses both JSON bodies (the total block,
+# solar.arrays, the inverter's frequencies and more) for about a dozen
+# numbers. A service between the cloud and the displays
+# (host/ge_aggregator.py) can send this record instead, 32 bytes for both
+# endpoints, and decode() turns it back into payloads in the API's shape,
+# so everything after the fetch takes it as it takes the JSON.
+#
+#   "GE", version, then FIELDS little-endian:
+#   system time, meter time (uint32 seconds since 1970 UTC), SoC %,
+#   battery W, solar W, grid W, consumption W, then today's battery charge
+#   and discharge, grid import and export, solar and consumption in 0.1 kWh
+#
+# ge_state.Readings keeps the same FIELDS in sleep memory.
+
+import struct
+
+import ge_time
+
+MAGIC   = b"GE"
+VERSION = 1
+
+FIELDS = "IIBhHhHHHHHHH"
+RECORD = "<2sB" + FIELDS
+SIZE   = struct.calcsize(RECORD)
+
+CONTENT_TYPE = "application/x-ge-record"
+
+
+def _tenths(kwh):
+    return int(kwh * 10 + 0.5)
+
+
+def values(system_data, meter_data):
+    # The FIELDS of a system-data/meter-data sample
+    system = system_data["data"]
+    today  = meter_data["data"]["today"]
+    return (ge_time.iso_to_epoch(system["time"]), ge_time.iso_to_epoch(meter_data["data"]["time"]),
+            system["battery"]["percent"], system["battery"].get("power", 0),
+            system["solar"]["power"], system.get("grid", {}).get("power", 0), system["consumption"],
+            _tenths(today["battery"]["charge"]), _tenths(today["battery"]["discharge"]),
+            _tenths(today["grid"]["import"]), _tenths(today["grid"]["export"]),
+            _tenths(today["solar"]), _tenths(today["consumption"]))
+
+
+def payloads(values):
+    # FIELDS -> (system_data, meter_data) with just the keys the dashboards read
+    (system_time, meter_time, percent, battery_power, solar_power, grid_power, consumption,
+     charge, discharge, grid_import, grid_export, solar_today, consumption_today) = values
+    system_data = {"data": {
+        "time": system_time,
+        "battery": {"percent": percent, "power": battery_power},
+        "solar": {"power": solar_power},
+        "grid": {"power": grid_power},
+        "consumption": consumption,
+    }}
+    meter_data = {"data": {
+        "time": meter_time,
+        "today": {
+            "battery": {"charge": charge / 10, "discharge": discharge / 10},
+            "grid": {"import": grid_import / 10, "export": grid_export / 10},
+            "solar": solar_today / 10,
+            "consumption": consumption_today / 10,
+        },
+    }}
+    return system_data, meter_data
+
+
+def encode(system_data, meter_data):
+    return struct.pack(RECORD, MAGIC, VERSION, *values(system_data, meter_data))
+
+
+def decode(data):
+    # A record -> (system_data, meter_data); the times come back as ISO strings, as the API sends them
+    if len(data) != SIZE:
+        raise ValueError("record is %d bytes, not %d" % (len(data), SIZE))
+    fields = struct.unpack(RECORD, data)
+    if fields[0] != MAGIC or fields[1] != VERSION:
+        raise ValueError("not a version %d reading record" % VERSION)
+    system_data, meter_data = payloads(fields[2:])
+    system_data["data"]["time"] = ge_time.epoch_to_iso(system_data["data"]["time"])
+    meter_data["data"]["time"]  = ge_time.epoch_to_iso(meter_data["data"]["time"])
+    return system_data, meter_data
@@ -0,0 +1,72 @@
+# The e-ink panel, brought up only when there is something to draw.
+#
+# Every script began by importing displayio, adafruit_il0373 and the
+# display_text and display_shapes libraries and bringing up the SPI bus
+# and the IL0373 (with a second for the bus to settle), so a wake that
+# found no new readings, or no WiFi, paid for all of it. Here nothing of
+# the display stack is imported until a phase asks for it:
+#
+#   dashboard = ge_render.dashboard(8.0, "ge_assets.bin")    the layout
+#   ge_render.refresh(dashboard.group)                       the refresh
+#   ge_render.partial(dashboard.group, rects)                or only rects of it (ge_epd, unverified)
+#
+# The display is set up on the first refresh() (or display()) of a run and
+# kept for the rest of it, with its bus for partial().
+
+WIDTH    = 296
+HEIGHT   = 128
+ROTATION = 270
+
+_display = None
+_bus     = None
+
+
+def display():
+    # The IL0373 on the SPI bus, set up on first use
+    global _display, _bus
+    if _display is None:
+        import time
+        import board
+        import busio
+        import displayio
+        import adafruit_il0373
+        displayio.release_displays()
+        spi = busio.SPI(board.IO5, board.IO18)  # Uses SCK and MOSI
+        _bus = displayio.FourWire(spi, command=board.IO33, chip_select=board.IO15, baudrate=1000000)
+        time.sleep(1)
+        _display = adafruit_il0373.IL0373(
+            _bus,
+            width=WIDTH,
+            height=HEIGHT,
+            rotation=ROTATION,
+            black_bits_inverted=False,
+            color_bits_inverted=False,
+            grayscale=True,
+            refresh_time=1,
+        )
+    return _display
+
+
+def refresh(group):
+    # Shows group and refreshes the panel
+    panel = display()
+    panel.show(group)
+    panel.refresh()
+
+
+def partial(group, rects):
+    # Sends only rects (display pixels) of group to the panel; -> bytes sent
+    import ge_epd
+    display()
+    return ge_epd.PartialIL0373(_bus, WIDTH, HEIGHT, ROTATION).update(group, rects)
+
+
+def dashboard(battery_capacity, asset_pack=None):
+    # A ge_dashboard.Dashboard, with the fonts and images of asset_pack if there is one
+    # (None without, then terminalio.FONT and Rects are used)
+    import ge_dashboard
+    assets = None
+    if asset_pack:
+        import ge_assets
+        assets = ge_assets.load(asset_pack)
+    return ge_dashboard.Dashboard(battery_capacity=battery_capacity, assets=assets)
@@ -0,0 +1,88 @@
+# Retry policy for the fetch stage.
+#
+# A failed fetch used to leave the wake with no data (v5 crashed on it and
+# the panel wasn't updated) or, in the continuous script, wait a fixed 60 s
+# and try again at full cost. Here:
+#
+#   Backoff   jittered exponential delays ("full jitter": anywhere from 0 to
+#             base * factor ** attempt, capped), so retries spread out
+#             rather than hammering the API in step
+#   Breaker   a circuit breaker kept in sleep memory across wakes. A wake
+#             makes up to attempts tries, with Backoff between them; after
+#             threshold failed wakes in a row the breaker opens, and each
+#             wake makes a single try and sleeps longer, doubling up to
+#             max_sleep, until one succeeds and closes it again
+#
+# When the breaker gives up, the script shows the last good readings
+# (ge_state.Readings) marked as stale rather than nothing.
+
+import random
+import time
+
+import ge_state
+
+
+class Backoff:
+    def __init__(self, base=2.0, factor=2.0, cap=30.0):
+        self.base   = base    # seconds
+        self.factor = factor
+        self.cap    = cap     # seconds
+
+    def delay(self, attempt):
+        # Seconds to wait after failed attempt number attempt (0 the first)
+        return random.uniform(0, min(self.cap, self.base * self.factor ** attempt))
+
+
+class Breaker:
+    def __init__(self, memory, threshold=3, attempts=3, backoff=None):
+        # failed wakes in a row
+        self._block    = ge_state.Block(memory, ge_state.BREAKER_OFFSET, 0xA8, "H")
+        self.threshold = threshold
+        self.attempts  = attempts
+        self.backoff   = backoff or Backoff()
+        self.tries     = 0      # made by the last run()
+        self.recovered = False  # the last run() succeeded after failed wakes
+
+    @property
+    def failures(self):
+        stored = self._block.load()
+        return stored[0] if stored is not None else 0
+
+    @property
+    def open(self):
+        return self.failures >= self.threshold
+
+    def run(self, fetch):
+        # fetch() -> (system_data, meter_data), None for an endpoint that failed (a response
+        # without the fields asked for is one, see ge_fetch). Retries until both are in,
+        # keeping an endpoint that got through on an earlier try; a fetch that raises is a failed try.
+        failures = self.failures
+        tries = 1 if failures >= self.threshold else self.attempts
+        system_data = meter_data = None
+        for attempt in range(tries):
+            if attempt:
+                delay = self.backoff.delay(attempt - 1)
+                print("Fetch failed, try %d of %d in %.1f s" % (attempt + 1, tries, delay))
+                time.sleep(delay)
+            self.tries = attempt + 1
+            try:
+                system, meter = fetch()
+            except (OSError, RuntimeError, ValueError, KeyError) as e:
+                print("Fetch error:", e)
+                system = meter = None
+            system_data = system if system is not None else system_data
+            meter_data  = meter if meter is not None else meter_data
+            if system_data is not None and meter_data is not None:
+                self._block.save(0)
+                self.recovered = failures > 0
+                return system_data, meter_data
+        self._block.save(min(failures + 1, 0xFFFF))
+        if self.open:
+            print("Fetch failed %d wakes in a row, circuit open" % self.failures)
+        return system_data, meter_data
+
+    def sleep_time(self, sleep_time, max_sleep):
+        # Seconds to sleep: sleep_time while closed, doubling for each failed wake once open
+        if not self.open:
+            return sleep_time
+        return min(max_sleep, sleep_time * 2 ** min(self.failures - self.threshold + 1, 8))
@@ -0,0 +1,71 @@
+# Adaptive wake interval, picked from the inverter data itself.
+#
+# A fixed sleep_time wakes as often at 3 am, with no sun and a static battery,
+# as at midday with the SoC moving fast. Scheduler works out how long it will
+# take for what is on screen to go out of date and sleeps for that long:
+#
+#   - SoC: from the change since the last sample, or the battery power
+#     against the battery capacity, the time to move soc_step percent
+#   - the day's kWh counters: from the largest power flow (solar,
+#     consumption, grid, battery), the time to move energy_step kWh
+#   - time of day: outside quiet hours the sleep is capped at day_max, and a
+#     quiet-hours sleep never runs past the end of them
+#
+# and clamps the result to [min_sleep, max_sleep]. host/replay_schedule.py
+# replays a day-long trace against it.
+
+import ge_time
+
+
+def _epoch(stamp):
+    return stamp if isinstance(stamp, int) else ge_time.iso_to_epoch(stamp)
+
+
+class Scheduler:
+    def __init__(self, min_sleep=300, max_sleep=3600, day_max=1200, soc_step=2, energy_step=0.2,
+                 battery_capacity=8.0, quiet_hours=(23, 6)):
+        self.min_sleep        = min_sleep         # seconds, the inverter posts about every 5 minutes
+        self.max_sleep        = max_sleep         # seconds
+        self.day_max          = day_max           # seconds, cap outside quiet hours
+        self.soc_step         = soc_step          # percent
+        self.energy_step      = energy_step       # kWh
+        self.battery_capacity = battery_capacity  # kWh
+        self.quiet_hours      = quiet_hours       # (start, end) local hours
+
+    def _quiet(self, hour):
+        start, end = self.quiet_hours
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def next_sleep(self, system_data, previous=None, local_time=None):
+        # system_data: this wake's sample, previous: the last one (or None),
+        # local_time: a struct_time for the time-of-day rule (or None)
+        data  = system_data['data']
+        soc   = data['battery']['percent']
+        sleep = self.max_sleep
+
+        soc_rate = abs(data['battery'].get('power', 0)) / (self.battery_capacity * 36000)  # %/s
+        if previous is not None:
+            prev    = previous['data']
+            elapsed = _epoch(data['time']) - _epoch(prev['time'])
+            if elapsed > 0:
+                soc_rate = max(soc_rate, abs(soc - prev['battery']['percent']) / elapsed)
+        if soc_rate > 0:
+            sleep = min(sleep, self.soc_step / soc_rate)
+
+        flow = max(data['solar']['power'], data.get('consumption', 0),
+                   abs(data.get('grid', {}).get('power', 0)), abs(data['battery'].get('power', 0)))
+        if flow > 0:
+            sleep = min(sleep, self.energy_step * 3600000 / flow)
+
+        if local_time is not None:
+            hour = local_time.tm_hour
+            if not self._quiet(hour):
+                sleep = min(sleep, self.day_max)
+            else:
+                end = self.quiet_hours[1]
+                until_end = ((end - hour) % 24) * 3600 - local_time.tm_min * 60 - local_time.tm_sec
+                sleep = min(sleep, max(until_end, self.min_sleep))
+
+        return int(max(self.min_sleep, min(sleep, self.max_sleep)))
@@ -0,0 +1,97 @@
+# Several inverters on one site, fetched together and added up for the display.
+#
+# Site builds the system-data and meter-data URLs for each serial and fetches
+# them all over one ge_fetch.Session, whose max_connections caps the sockets
+# open at once (the socket pool on the board is small). It reports each
+# inverter's latency and sums the samples into one system-data/meter-data
+# pair in the API's shape, so the dashboard, scheduler and stored readings
+# take a site as they take a single inverter.
+#
+# Powers and today's kWh are summed, the SoC is the mean weighted by each
+# battery's capacity, and the time is the newest of the samples. An inverter
+# whose fetch failed is left out of the totals for that endpoint.
+#
+# With record=True each inverter is one request for its ge_record (served
+# by host/ge_aggregator.py) in place of the two JSON endpoints.
+
+import ge_extract
+import ge_record
+
+API = "https://api.givenergy.cloud/v1/inverter/"
+
+
+def _add(total, sample):
+    # Adds the numbers in sample into total, a dict of the same shape
+    for key, value in sample.items():
+        if isinstance(value, dict):
+            _add(total.setdefault(key, {}), value)
+        elif key == "time":
+            total[key] = max(total.get(key, value), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+def _split(result):
+    # A record's FetchResult -> system-data and meter-data FetchResults, the time all on the first
+    import ge_fetch  # already loaded by the Session that fetched it
+    system, meter = ge_fetch.FetchResult(result.url), ge_fetch.FetchResult(result.url)
+    system.error = meter.error = result.error
+    system.elapsed_ms, system.parse_ns = result.elapsed_ms, result.parse_ns
+    if result.ok:
+        system.data, meter.data = result.data
+    return system, meter
+
+
+class Site:
+    def __init__(self, serials, capacities=None, api=API, record=False):
+        self.serials    = list(serials)
+        self.capacities = list(capacities) if capacities else [8.0] * len(self.serials)  # kWh per battery
+        self.api        = api
+        self.record     = record
+        self.results    = []  # (serial, system-data FetchResult, meter-data FetchResult) after fetch()
+
+    @property
+    def battery_capacity(self):
+        return sum(self.capacities)
+
+    def urls(self):
+        # -> (urls, fields), system-data then meter-data for each serial
+        if self.record:
+            return [self.api + serial + "/record" for serial in self.serials], [ge_record.decode] * len(self.serials)
+        urls, fields = [], []
+        for serial in self.serials:
+            urls.append(self.api + serial + "/system-data/latest")
+            urls.append(self.api + serial + "/meter-data/latest")
+            fields.append(ge_extract.SYSTEM_DATA_FIELDS)
+            fields.append(ge_extract.METER_DATA_FIELDS)
+        return urls, fields
+
+    def fetch(self, session, headers=None, body=None):
+        urls, fields = self.urls()
+        results = session.fetch_all(urls, headers, body, fields)
+        if self.record:
+            self.results = [(serial,) + _split(result) for serial, result in zip(self.serials, results)]
+        else:
+            self.results = [(serial, results[2 * i], results[2 * i + 1]) for i, serial in enumerate(self.serials)]
+        self.report()
+        return self.results
+
+    def report(self):
+        for serial, system, meter in self.results:
+            state = "ok" if system.ok and meter.ok else "FAILED: %r" % (system.error or meter.error)
+            print("  %s  system %5d ms  meter %5d ms  %s" % (serial, system.elapsed_ms, meter.elapsed_ms, state))
+
+    def totals(self):
+        # -> (system_data, meter_data) for the whole site, None for an endpoint no inverter answered
+        system, meter = {}, {}
+        charge, capacity = 0, 0
+        for (serial, system_result, meter_result), battery in zip(self.results, self.capacities):
+            if system_result.ok:
+                _add(system, system_result.data["data"])
+                charge   += system_result.data["data"]["battery"]["percent"] * battery
+                capacity += battery
+            if meter_result.ok:
+                _add(meter, meter_result.data["data"])
+        if system:
+            system["battery"]["percent"] = int(charge / capacity + 0.5) if capacity else 0
+        return ({"data": system} if system else None), ({"data": meter} if meter else None)
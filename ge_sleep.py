@@ -0,0 +1,35 @@
+# The end of a wake: deep sleep until a TimeAlarm.
+#
+#   ge_sleep.deep_sleep(600, clock, timer, heap)    does not return
+#
+# clock (ge_time.Clock) is told how long the sleep is, so the time carries
+# across it; timer (ge_timing.PhaseTimer) and heap (ge_heap.HeapBudget)
+# close their last phase and are shown over serial if someone is watching.
+
+import time
+
+import alarm
+
+
+def deep_sleep(seconds, clock=None, timer=None, heap=None):
+    if heap is not None:
+        heap.leave()
+    if timer is not None:
+        timer.start("sleep")
+    if clock is not None:
+        clock.sleeping(seconds)
+    if timer is not None:
+        timer.record(clock.now() if clock is not None else 0)
+    if timer is not None or heap is not None:
+        # Someone is watching the serial console, show where the awake time and heap went
+        import supervisor
+        if supervisor.runtime.serial_connected:
+            if timer is not None:
+                timer.dump()
+            if heap is not None:
+                heap.dump()
+    # Create an alarm that will trigger N-secs from now.
+    time_alarm = alarm.time.TimeAlarm(monotonic_time=time.monotonic() + seconds)
+    # Exit the program, and then deep sleep until the alarm wakes
+    alarm.exit_and_deep_sleep_until_alarms(time_alarm)
+    # Does not return, we never get here
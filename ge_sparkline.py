@@ -0,0 +1,92 @@
+# Trend line drawn straight into one Bitmap.
+#
+# A Sparkline is a TileGrid over a two-colour bitmap with a column of pixels
+# per value. The tiles are one pixel wide, one per bitmap column, so the
+# bitmap is used as a ring: push() clears the oldest column, draws the new
+# value into it (a vertical stroke from the previous value, so the line
+# joins up), then turns the tile indices so that column shows at the right
+# hand end. A push touches one column of pixels and width tile indices,
+# whatever has been plotted before, and allocates nothing; extend() turns
+# the tiles once for all its values.
+#
+# bitmaptools.fill_region and draw_line do the pixel work where the board's
+# CircuitPython build has them; otherwise it is done a pixel at a time.
+
+import displayio
+
+try:
+    import bitmaptools
+except ImportError:
+    bitmaptools = None
+
+_EMPTY = 0xFF  # no value in this column yet
+
+
+class Sparkline(displayio.TileGrid):
+    def __init__(self, width, height, low, high, *, x=0, y=0, colour=0x000000, background=0xFFFFFF):
+        if height > _EMPTY:
+            raise ValueError("height must be under 255")
+        bitmap  = displayio.Bitmap(width, height, 2)
+        palette = displayio.Palette(2)
+        palette[0] = background
+        palette[1] = colour
+        super().__init__(bitmap, pixel_shader=palette, width=width, height=1, tile_width=1, tile_height=height,
+                         x=x, y=y)
+        self.low     = low
+        self.high    = high
+        self.columns = width
+        self.rows    = height
+        self._next   = 0  # bitmap column the next value goes in
+        self._last   = None  # row of the last value
+        self._ys     = bytearray([_EMPTY]) * width  # row plotted in each bitmap column
+
+    def _row(self, value):
+        value = min(max(value, self.low), self.high)
+        return self.rows - 1 - int((value - self.low) * (self.rows - 1) / (self.high - self.low) + 0.5)
+
+    def _column(self, column, row):
+        # Clear the column, then stroke from the last value's row to this one
+        bitmap = self.bitmap
+        top, bottom = (row, row) if self._last is None else (min(row, self._last), max(row, self._last))
+        if bitmaptools is not None:
+            bitmaptools.fill_region(bitmap, column, 0, column + 1, self.rows, 0)
+            bitmaptools.draw_line(bitmap, column, top, column, bottom, 1)
+        else:
+            for y in range(self.rows):
+                bitmap[column, y] = 1 if top <= y <= bottom else 0
+
+    def _plot(self, value):
+        row = self._row(value)
+        self._column(self._next, row)
+        self._ys[self._next] = row
+        self._last = row
+        self._next = (self._next + 1) % self.columns
+
+    def _turn(self):
+        # The tile on the left shows the oldest column
+        for i in range(self.columns):
+            self[i, 0] = (self._next + i) % self.columns
+
+    def push(self, value):
+        self._plot(value)
+        self._turn()
+
+    def extend(self, values):
+        for value in values:
+            self._plot(value)
+        self._turn()
+
+    def clear(self):
+        if bitmaptools is not None:
+            bitmaptools.fill_region(self.bitmap, 0, 0, self.columns, self.rows, 0)
+        else:
+            self.bitmap.fill(0)
+        for i in range(self.columns):
+            self[i, 0] = i
+        self._next = 0
+        self._last = None
+        self._ys[:] = bytes([_EMPTY]) * self.columns
+
+    def plotted(self):
+        # The row plotted in each column as shown, oldest first (for ge_frame.fingerprint)
+        return bytes(self._ys[self._next:]) + bytes(self._ys[:self._next])
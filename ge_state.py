@@ -0,0 +1,86 @@
+# State kept in alarm.sleep_memory across deep sleep.
+#
+# sleep_memory survives deep sleep but not a power cycle or reset. It is
+# split into fixed blocks, each starting with a tag byte, so zeroed memory
+# after a cold boot (or a block whose layout has changed) reads back as
+# "nothing stored" rather than garbage.
+#
+#   offset  size  block
+#        0    32  READINGS  last system-data and meter-data sample
+#       32     8  FRAME     fingerprint of the frame on the panel (ge_frame)
+#       40    16  CLOCK     last NTP sync and sleep start/length (ge_time)
+#       56   392  TIMING    per-phase timings of the last wakes (ge_timing)
+#      448    32  WIFI      channel, BSSID and lease for a fast rejoin (ge_wifi)
+#      480    64  DNS       cached addresses of the API hosts (ge_dns)
+#      544  3751  HISTORY   ring of the last 48 hours of readings (ge_history)
+#     4296     3  BREAKER   failed fetches in a row (ge_retry)
+#     4300    59  HEAP      free memory and collects per phase (ge_heap)
+#     4359   292  REGIONS   element boxes and hashes on the panel (ge_epd)
+
+import struct
+
+import ge_record
+import ge_time
+
+READINGS_OFFSET = 0
+FRAME_OFFSET    = 32
+CLOCK_OFFSET    = 40
+TIMING_OFFSET   = 56
+WIFI_OFFSET     = 448
+DNS_OFFSET      = 480
+HISTORY_OFFSET  = 544
+BREAKER_OFFSET  = 4296
+HEAP_OFFSET     = 4300
+REGIONS_OFFSET  = 4359
+
+
+class Block:
+    # A tagged struct at a fixed offset in sleep memory
+    def __init__(self, memory, offset, tag, fmt):
+        self._memory = memory
+        self.offset  = offset
+        self.tag     = tag
+        self._fmt    = "<B" + fmt
+        self.size    = struct.calcsize(self._fmt)
+
+    def load(self):
+        values = struct.unpack(self._fmt, bytes(self._memory[self.offset:self.offset + self.size]))
+        if values[0] != self.tag:
+            return None
+        return values[1:]
+
+    def save(self, *values):
+        self._memory[self.offset:self.offset + self.size] = struct.pack(self._fmt, self.tag, *values)
+
+    def clear(self):
+        self._memory[self.offset] = 0
+
+
+class Readings:
+    # The last sample, stored compact (ge_record's fields) and read back in the shape of the API payloads
+    def __init__(self, memory):
+        self._block = Block(memory, READINGS_OFFSET, 0xA1, ge_record.FIELDS)
+
+    def load(self):
+        values = self._block.load()
+        if values is None:
+            return None
+        return ge_record.payloads(values)
+
+    def save(self, system_data, meter_data):
+        self._block.save(*ge_record.values(system_data, meter_data))
+
+    def unchanged(self, system_data, meter_data, by_value=False):
+        # True when both endpoints report the sample already stored; by_value compares the
+        # readings instead of their times, for a source that stamps a sample when it is read (ge_modbus)
+        values = self._block.load()
+        if values is None:
+            return False
+        if by_value:
+            fmt = "<" + ge_record.FIELDS[2:]  # all but the two times, as they would be stored
+            return values[2:] == struct.unpack(fmt, struct.pack(fmt, *ge_record.values(system_data, meter_data)[2:]))
+        return (values[0] == ge_time.iso_to_epoch(system_data["data"]["time"])
+                and values[1] == ge_time.iso_to_epoch(meter_data["data"]["time"]))
+
+    def clear(self):
+        self._block.clear()
@@ -0,0 +1,154 @@
+# Europe/London local time, worked out on the device.
+#
+# UK clocks go forward to BST at 01:00 UTC on the last Sunday of March and
+# back to GMT at 01:00 UTC on the last Sunday of October, so the offset is a
+# calculation, not something to ask worldtimeapi.org for on every wake (or
+# to hard-code, as tz_offset=1 was, wrong half the year).
+#
+# The clock is UTC seconds since 1970. Clock keeps the time of the last NTP
+# sync in sleep memory, together with when the device went to sleep and for
+# how long, so the time can be carried across deep sleep even if the RTC
+# was not, and NTP is only asked once a day.
+
+import time
+
+import ge_state
+
+MIN_VALID_EPOCH = 1672531200  # 2023-01-01, anything earlier means the RTC was never set
+RESYNC_EVERY    = 24 * 60 * 60
+
+
+def days_from_civil(y, m, d):
+    # Days since 1970-01-01 for a proleptic Gregorian date
+    y -= m <= 2
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (m + (-3 if m > 2 else 9)) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def civil_from_days(days):
+    # Inverse of days_from_civil -> (y, m, d)
+    days += 719468
+    era = days // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    d = doy - (153 * mp + 2) // 5 + 1
+    m = mp + (3 if mp < 10 else -9)
+    return yoe + era * 400 + (m <= 2), m, d
+
+
+def iso_to_epoch(stamp):
+    # '2023-05-28T10:16:27Z' -> seconds since 1970 (UTC)
+    days = days_from_civil(int(stamp[0:4]), int(stamp[5:7]), int(stamp[8:10]))
+    return days * 86400 + int(stamp[11:13]) * 3600 + int(stamp[14:16]) * 60 + int(stamp[17:19])
+
+
+def epoch_to_iso(epoch):
+    # Inverse of iso_to_epoch
+    days, secs = divmod(epoch, 86400)
+    y, m, d = civil_from_days(days)
+    return "%04d-%02d-%02dT%02d:%02d:%02dZ" % (y, m, d, secs // 3600, secs // 60 % 60, secs % 60)
+
+
+def struct_to_epoch(t):
+    # A UTC struct_time (e.g. adafruit_ntp's datetime) -> seconds since 1970
+    return days_from_civil(t[0], t[1], t[2]) * 86400 + t[3] * 3600 + t[4] * 60 + t[5]
+
+
+def _last_sunday(year, month):
+    # 01:00 UTC on the last Sunday of the month, as seconds since 1970
+    if month == 12:
+        last = days_from_civil(year + 1, 1, 1) - 1
+    else:
+        last = days_from_civil(year, month + 1, 1) - 1
+    last -= (last + 4) % 7  # 1970-01-01 was a Thursday
+    return last * 86400 + 3600
+
+
+def uk_offset(epoch):
+    # Seconds to add to UTC for Europe/London at that moment
+    year = civil_from_days(epoch // 86400)[0]
+    if _last_sunday(year, 3) <= epoch < _last_sunday(year, 10):
+        return 3600
+    return 0
+
+
+def local_time(epoch):
+    # Europe/London struct_time for a UTC epoch
+    local = epoch + uk_offset(epoch)
+    days, secs = divmod(local, 86400)
+    y, m, d = civil_from_days(days)
+    yday = days - days_from_civil(y, 1, 1) + 1
+    return time.struct_time((y, m, d, secs // 3600, secs // 60 % 60, secs % 60, (days + 3) % 7, yday, 1 if local != epoch else 0))
+
+
+def format_local(epoch):
+    t = local_time(epoch)
+    return f"{t.tm_mday:02d}/{t.tm_mon:02d}/{t.tm_year:02d} {t.tm_hour:02d}:{t.tm_min:02d}"
+
+
+class Clock:
+    # UTC time carried across deep sleep, resynced from NTP once a day
+    def __init__(self, memory, resync_every=RESYNC_EVERY):
+        self._block = ge_state.Block(memory, ge_state.CLOCK_OFFSET, 0xA3, "III")
+        self.resync_every = resync_every
+
+    def now(self):
+        # Seconds since 1970 UTC, or None if the time is not known
+        epoch = int(time.time())
+        if epoch >= MIN_VALID_EPOCH:
+            return epoch
+        stored = self._block.load()
+        if stored is None:
+            return None
+        slept_at, slept_for, _ = stored
+        epoch = slept_at + slept_for + int(time.monotonic())
+        self._set_rtc(epoch)
+        return epoch
+
+    def sync_age(self):
+        # Seconds since the last NTP sync, None if there hasn't been one
+        stored = self._block.load()
+        now = self.now()
+        if stored is None or now is None:
+            return None
+        return now - stored[2]
+
+    def needs_sync(self):
+        age = self.sync_age()
+        return age is None or age < 0 or age >= self.resync_every
+
+    def synced(self, epoch):
+        self._set_rtc(epoch)
+        stored = self._block.load()
+        if stored is None:
+            self._block.save(epoch, 0, epoch)
+        else:
+            self._block.save(stored[0], stored[1], epoch)
+
+    def sleeping(self, seconds):
+        # Call just before deep sleep
+        now = self.now()
+        stored = self._block.load()
+        if now is not None and stored is not None:
+            self._block.save(now, seconds, stored[2])
+
+    def _set_rtc(self, epoch):
+        try:
+            import rtc
+        except ImportError:  # not on a board
+            return
+        days, secs = divmod(epoch, 86400)
+        y, m, d = civil_from_days(days)
+        rtc.RTC().datetime = time.struct_time((y, m, d, secs // 3600, secs // 60 % 60, secs % 60, (days + 3) % 7, -1, -1))
+
+
+def sync_ntp(clock, pool):
+    # One NTP round trip; adafruit_ntp is only imported when a sync is due
+    import adafruit_ntp
+    ntp = adafruit_ntp.NTP(pool, tz_offset=0)
+    clock.synced(struct_to_epoch(ntp.datetime))
@@ -0,0 +1,84 @@
+# Per-phase timing of the wake cycle, kept in sleep memory.
+#
+# Each phase of the pipeline is stamped with time.monotonic_ns() and the
+# last CYCLES wakes are kept as packed milliseconds in a ring in sleep
+# memory, so where the awake seconds go can be read back later:
+#
+#   timer = ge_timing.PhaseTimer(alarm.sleep_memory)
+#   timer.start("wifi") ... timer.start("system") ... timer.stop()
+#   timer.record(stamp)    just before deep sleep
+#   timer.dump()           table of the stored cycles over serial
+#
+# "boot" is the time from reset to the PhaseTimer being made (imports and
+# setup), "total" is the time from reset to record().
+
+import struct
+import time
+
+import ge_state
+
+PHASES = ("boot", "wifi", "time", "system", "meter", "parse", "layout", "refresh", "sleep", "total")
+CYCLES = 16
+
+_RECORD = "<I" + "H" * len(PHASES)  # wake time (UTC epoch, 0 if unknown), then ms per phase
+_RECORD_SIZE = struct.calcsize(_RECORD)
+
+
+def _now_ms():
+    return time.monotonic_ns() // 1000000
+
+
+class PhaseTimer:
+    def __init__(self, memory, cycles=CYCLES):
+        self._memory  = memory
+        self.cycles   = cycles
+        self._header  = ge_state.Block(memory, ge_state.TIMING_OFFSET, 0xA4, "BB")  # next slot, stored count
+        self._records = ge_state.TIMING_OFFSET + self._header.size
+        self.ms       = [0] * len(PHASES)
+        self.ms[0]    = _now_ms()
+        self._phase   = None
+        self._started = 0
+
+    def start(self, phase):
+        # Ends the running phase, if any, and starts timing phase
+        self.stop()
+        self._phase   = PHASES.index(phase)
+        self._started = _now_ms()
+
+    def stop(self):
+        if self._phase is not None:
+            self.ms[self._phase] += _now_ms() - self._started
+            self._phase = None
+
+    def add(self, phase, ms):
+        self.ms[PHASES.index(phase)] += ms
+
+    def record(self, stamp=0):
+        self.stop()
+        self.ms[-1] = _now_ms()
+        header = self._header.load() or (0, 0)
+        slot, count = header
+        offset = self._records + slot * _RECORD_SIZE
+        values = [min(ms, 0xFFFF) for ms in self.ms]
+        self._memory[offset:offset + _RECORD_SIZE] = struct.pack(_RECORD, stamp or 0, *values)
+        self._header.save((slot + 1) % self.cycles, min(count + 1, self.cycles))
+
+    def stored(self):
+        # The stored cycles, oldest first, as (stamp, [ms per phase])
+        header = self._header.load()
+        if header is None:
+            return []
+        slot, count = header
+        cycles = []
+        for i in range(count):
+            offset = self._records + (slot - count + i) % self.cycles * _RECORD_SIZE
+            values = struct.unpack(_RECORD, bytes(self._memory[offset:offset + _RECORD_SIZE]))
+            cycles.append((values[0], list(values[1:])))
+        return cycles
+
+    def dump(self):
+        print("Wake cycle timings (ms), oldest first")
+        print("%-8s" % "UTC" + "".join("%8s" % p for p in PHASES))
+        for stamp, ms in self.stored():
+            wake = "%02d:%02d:%02d" % (stamp // 3600 % 24, stamp // 60 % 60, stamp % 60) if stamp else "-"
+            print("%-8s" % wake + "".join("%8d" % v for v in ms))
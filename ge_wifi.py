@@ -0,0 +1,74 @@
+# Fast WiFi rejoin, from what the last good connect learnt.
+#
+# wifi.radio.connect(ssid, password) scans every channel for the network and
+# then waits for a DHCP lease, on every wake. After a good connect Rejoin
+# keeps the channel, the access point's BSSID and the lease (address,
+# netmask, gateway, DNS) in sleep memory; the next wake sets the address
+# statically and connects straight to that access point on that channel,
+# with no scan and no DHCP.
+#
+# If that fails (the AP has moved channel, or it's a different AP) the stored
+# details are dropped, DHCP is turned back on and a full connect follows. A
+# full connect is also made every full_every joins, so the router sees the
+# lease renewed and doesn't hand the address to something else.
+
+import ipaddress
+import time
+
+import ge_state
+
+FULL_EVERY = 72  # joins, about half a day at 10 minutes a wake
+
+
+def _packed(address):
+    return address.packed if address is not None else bytes(4)
+
+
+def _address(packed):
+    return ipaddress.IPv4Address(packed) if packed != bytes(4) else None
+
+
+class Rejoin:
+    def __init__(self, memory, full_every=FULL_EVERY):
+        # channel, BSSID, address, netmask, gateway, DNS, joins since the last full connect
+        self._block = ge_state.Block(memory, ge_state.WIFI_OFFSET, 0xA5, "B6s4s4s4s4sH")
+        self.full_every = full_every
+        self.path       = None  # "cached" or "scan", how the last connect() got on
+        self.elapsed_ms = 0
+
+    def connect(self, radio, ssid, password):
+        # Raises ConnectionError if the full connect fails too
+        start = time.monotonic_ns()
+        stored = self._block.load()
+        if stored is not None and stored[-1] < self.full_every:
+            try:
+                self._rejoin(radio, ssid, password, stored)
+                self._block.save(*stored[:-1], stored[-1] + 1)
+                self.path = "cached"
+                self.elapsed_ms = (time.monotonic_ns() - start) // 1000000
+                return self.path
+            except ConnectionError as e:
+                print("Cached WiFi rejoin failed:", e)
+        self._block.clear()
+        radio.start_dhcp()
+        radio.connect(ssid, password)
+        self._store(radio)
+        self.path = "scan"
+        self.elapsed_ms = (time.monotonic_ns() - start) // 1000000
+        return self.path
+
+    def _rejoin(self, radio, ssid, password, stored):
+        channel, bssid, address, netmask, gateway, dns, _ = stored
+        radio.set_ipv4_address(ipv4=_address(address), netmask=_address(netmask),
+                               gateway=_address(gateway), ipv4_dns=_address(dns))
+        radio.connect(ssid, password, channel=channel, bssid=bssid)
+
+    def _store(self, radio):
+        ap = radio.ap_info
+        if ap is None or radio.ipv4_address is None:
+            return
+        self._block.save(ap.channel, bytes(ap.bssid), _packed(radio.ipv4_address), _packed(radio.ipv4_subnet),
+                         _packed(radio.ipv4_gateway), _packed(radio.ipv4_dns), 0)
+
+    def forget(self):
+        self._block.clear()
@@ -0,0 +1,81 @@
+# Heap cost of response.json() against the streaming extractor.
+#
+# Runs both over the recorded payloads, fed in socket-sized blocks, and
+# reports peak traced allocation, what is still held once parsing is done,
+# and the number of objects left alive. A system-data payload padded out with
+# extra solar arrays shows how each scales with payload size.
+#
+#   python3 host/bench_extract.py
+
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import ge_extract
+import ge_fetch
+from ge_standin import METER_DATA, SYSTEM_DATA
+
+
+def _blocks(raw):
+    for i in range(0, len(raw), ge_fetch.RX_SIZE):
+        yield raw[i:i + ge_fetch.RX_SIZE]
+
+
+def full_json(raw, fields):
+    parts = []
+    for block in _blocks(raw):
+        parts.append(block)
+    return json.loads(b"".join(parts))
+
+
+def streamed(raw, fields):
+    ex = ge_extract.Extractor(fields)
+    for block in _blocks(raw):
+        ex.feed(block)
+    return ex.close()
+
+
+def with_arrays(payload, count):
+    padded = json.loads(json.dumps(payload))
+    padded["data"]["solar"]["arrays"] = [
+        {"array": n + 1, "current": 12.2, "power": 2975, "voltage": 242} for n in range(count)]
+    return padded
+
+
+def measure(fn, raw, fields, repeat=50):
+    fn(raw, fields)  # warm up caches
+    gc.collect()
+    objects = len(gc.get_objects())
+    tracemalloc.start()
+    result = fn(raw, fields)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    alive = len(gc.get_objects()) - objects
+    del result
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(raw, fields)
+    return peak, held, alive, (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    cases = (
+        ("system-data", SYSTEM_DATA, ge_extract.SYSTEM_DATA_FIELDS),
+        ("meter-data", METER_DATA, ge_extract.METER_DATA_FIELDS),
+        ("system x32", with_arrays(SYSTEM_DATA, 32), ge_extract.SYSTEM_DATA_FIELDS),
+    )
+    print("%-12s %7s %-8s %8s %8s %8s %9s" % ("payload", "bytes", "parser", "peak B", "held B", "objects", "us/parse"))
+    for name, payload, fields in cases:
+        raw = json.dumps(payload).encode()
+        for label, fn in (("json", full_json), ("extract", streamed)):
+            peak, held, alive, us = measure(fn, raw, fields)
+            print("%-12s %7d %-8s %8d %8d %8d %9.1f" % (name, len(raw), label, peak, held, alive, us))
+
+
+if __name__ == "__main__":
+    main()
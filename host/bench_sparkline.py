@@ -0,0 +1,112 @@
+# Sparkline in one Bitmap against the same trend made of Rects.
+#
+#   bitmap       ge_sparkline.Sparkline, pixel work by bitmaptools
+#   bitmap-px    the same without bitmaptools, a pixel at a time
+#   rects        a Group holding a 1 pixel wide Rect per sample, the stroke
+#                from the previous value, as stacking shapes would draw it
+#
+# For each: building the trend from a full window of samples, adding one
+# sample to a full trend, and composing it into a frame (the shim's cost of
+# drawing it on the panel). Times are medians under the shim's fakes, peak
+# and held bytes from tracemalloc, as in host/benchmark.py. "layers" is the
+# number of TileGrids in the trend: on the board displayio looks through
+# every layer for each pixel it redraws, so that scales the refresh work.
+#
+# The shim's bitmaptools and compose are Python a pixel at a time, which is
+# slower per pixel than the board's C; compare the rows with each other.
+#
+#   python3 host/bench_sparkline.py
+#   python3 host/bench_sparkline.py --width 288
+
+import argparse
+import math
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.append(os.path.join(HERE, "shim"))
+
+import bitmaptools  # noqa: E402
+import displayio  # noqa: E402
+from adafruit_display_shapes.rect import Rect  # noqa: E402
+
+import ge_dashboard  # noqa: E402
+import ge_sparkline  # noqa: E402
+from benchmark import measure  # noqa: E402
+
+
+class RectTrend:
+    # The trend as one Rect per sample; a new sample drops the oldest and moves the rest left
+    def __init__(self, width, height, low, high, x=0, y=0):
+        self.group = displayio.Group(x=x, y=y)
+        self.columns, self.rows, self.low, self.high = width, height, low, high
+        self._last = None
+
+    def _row(self, value):
+        value = min(max(value, self.low), self.high)
+        return self.rows - 1 - int((value - self.low) * (self.rows - 1) / (self.high - self.low) + 0.5)
+
+    def push(self, value):
+        row = self._row(value)
+        top, bottom = (row, row) if self._last is None else (min(row, self._last), max(row, self._last))
+        self._last = row
+        if len(self.group) == self.columns:
+            self.group.pop(0)
+            for rect in self.group:
+                rect.x -= 1
+        self.group.append(Rect(len(self.group), top, 1, bottom - top + 1, fill=0x000000))
+
+    def extend(self, values):
+        for value in values:
+            self.push(value)
+
+
+def samples(n, offset=0):
+    return [int(2500 + 2400 * math.sin((i + offset) / 9)) for i in range(n)]
+
+
+def cases(width, height):
+    values = samples(width)
+    more   = samples(width, width)
+    out = []
+    for name, make in (
+        ("bitmap", lambda: ge_sparkline.Sparkline(width, height, 0, 5000)),
+        ("bitmap-px", lambda: ge_sparkline.Sparkline(width, height, 0, 5000)),
+        ("rects", lambda: RectTrend(width, height, 0, 5000)),
+    ):
+        def build(make=make):
+            trend = make()
+            trend.extend(values)
+            return trend
+
+        trend = build()
+        step  = [0]
+
+        def push(trend=trend):
+            step[0] = (step[0] + 1) % width
+            trend.push(more[step[0]])
+
+        item   = trend.group if isinstance(trend, RectTrend) else trend
+        layers = len(trend.group) if isinstance(trend, RectTrend) else 1
+        out.append((name, "build", layers, build))
+        out.append((name, "push", layers, push))
+        out.append((name, "compose", layers, lambda item=item: displayio.compose(item, width, height)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sparkline in a Bitmap against Rects")
+    parser.add_argument("--width", type=int, default=ge_dashboard.TREND_WIDTH, help="samples in the trend")
+    parser.add_argument("--height", type=int, default=ge_dashboard.TREND_HEIGHT)
+    args = parser.parse_args()
+
+    print("%-10s %-8s %10s %9s %9s %7s" % ("trend", "step", "us/run", "peak B", "held B", "layers"))
+    for name, step, layers, fn in cases(args.width, args.height):
+        ge_sparkline.bitmaptools = None if name == "bitmap-px" else bitmaptools
+        us, peak, held = measure(fn)
+        print("%-10s %-8s %10.1f %9d %9d %7d" % (name, step, us, peak, held, layers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Connect latency of each WiFi path, against the shim's radio.
+#
+#   plain      wifi.radio.connect(ssid, password), as the scripts did
+#   cold       ge_wifi.Rejoin with nothing stored: scan, DHCP, then store
+#   cached     ge_wifi.Rejoin the wake after: channel, BSSID and static address
+#   moved      the access point has changed channel since: the cached rejoin
+#              fails and falls back to a full connect
+#
+# Each path is timed from a radio fresh out of reset with the simulated costs
+# in host/shim/_hardware.py (scan, association, DHCP).
+#
+#   python3 host/bench_wifi.py
+#   python3 host/bench_wifi.py --cost-scale 0.1 --cycles 10
+
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.append(os.path.join(HERE, "shim"))
+
+import _hardware  # noqa: E402
+import wifi  # noqa: E402
+
+import ge_wifi  # noqa: E402
+
+
+def timed(connect):
+    # -> (ms, what connect() returned, simulated hardware spent)
+    wifi._power_on()
+    _hardware.spent.clear()
+    start = time.perf_counter()
+    result = connect(wifi.radio)
+    return (time.perf_counter() - start) * 1000, result, dict(_hardware.spent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WiFi connect latency per path")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--cost-scale", type=float, default=1.0)
+    args = parser.parse_args()
+    _hardware.scale = args.cost_scale
+
+    ssid, password = wifi.ACCESS_POINT["ssid"], wifi.ACCESS_POINT["password"]
+    totals = {}
+
+    def add(name, measured):
+        ms, path, spent = measured
+        entry = totals.setdefault(name, [0.0, path, {}])
+        entry[0] += ms
+        for k, v in spent.items():
+            entry[2][k] = entry[2].get(k, 0) + v
+
+    for _ in range(args.cycles):
+        add("plain", timed(lambda radio: radio.connect(ssid, password)))
+        memory = bytearray(1024)
+        rejoin = ge_wifi.Rejoin(memory)
+        add("cold", timed(lambda radio: rejoin.connect(radio, ssid, password)))
+        add("cached", timed(lambda radio: rejoin.connect(radio, ssid, password)))
+        channel = wifi.ACCESS_POINT["channel"]
+        wifi.ACCESS_POINT["channel"] = channel % 11 + 1
+        add("moved", timed(lambda radio: rejoin.connect(radio, ssid, password)))
+        wifi.ACCESS_POINT["channel"] = channel
+
+    print("%-8s %-8s %9s  %s" % ("path", "took", "ms", "simulated hardware"))
+    plain = totals["plain"][0] / args.cycles
+    for name, (ms, path, spent) in totals.items():
+        ms /= args.cycles
+        detail = ", ".join("%s %.0f" % (k, v / args.cycles * 1000) for k, v in spent.items())
+        print("%-8s %-8s %9.1f  %s" % (name, path or "-", ms, detail))
+    cached = totals["cached"][0] / args.cycles
+    print("\nCached rejoin saves %.0f ms a wake over a plain connect (%.0f%%)"
+          % (plain - cached, (plain - cached) * 100 / plain if plain else 0))
+
+
+if __name__ == "__main__":
+    main()
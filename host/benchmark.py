@@ -0,0 +1,271 @@
+# Benchmark suite for each stage of a wake, run under CPython.
+#
+# Uses the recorded payloads in host/fixtures and the displayio fakes in
+# host/shim, and reports the time per run (median) and the traced
+# allocations (tracemalloc's peak, and what the result still holds) of each
+# stage. Counting every allocation CPython makes was tried and dropped: most
+# of them are int objects (an index past 256) that the board never
+# allocates; use gc.mem_alloc() on the board (ge_heap) for its figures.
+# The stages:
+#
+#   read      ge_fetch.Connection reading a recorded HTTP response off a fake
+#             socket into the extractor (or the whole body, for decode's cases)
+#   decode    json.loads of a whole response
+#   extract   ge_extract.Extractor fed the response in socket-sized blocks
+#   record    ge_record.decode of the same sample as a binary record
+#   format    ge_dashboard.label_texts, the metrics pulled out and "{:.1f}" formatted
+#   build     ge_dashboard.Dashboard(), the display tree
+#   update    Dashboard.update() with the other sample, labels redrawn
+#   compose   the tree drawn into a 296x128 frame (the shim's EPaperDisplay)
+#   hash      ge_frame.fingerprint of the tree
+#
+# Synthetic cases scale the payload: system-data with many solar.arrays
+# entries, and one wake's worth of responses (system-data and meter-data
+# each) for several inverters.
+#
+#   python3 host/benchmark.py
+#   python3 host/benchmark.py --save base.json             record a baseline
+#   python3 host/benchmark.py --compare base.json          exit 1 on a regression
+#
+# Times from build on depend on the shim's fakes, so compare them with each
+# other rather than with the board.
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.append(os.path.join(HERE, "shim"))  # only for the modules CPython doesn't have
+
+import displayio  # noqa: E402
+
+import ge_dashboard  # noqa: E402
+import ge_extract  # noqa: E402
+import ge_fetch  # noqa: E402
+import ge_frame  # noqa: E402
+import ge_record  # noqa: E402
+from bench_extract import with_arrays  # noqa: E402
+from ge_standin import load_fixture  # noqa: E402
+
+TIME_BUDGET = 0.2  # seconds of repeats per measurement
+
+
+def _blocks(raw):
+    for i in range(0, len(raw), ge_fetch.RX_SIZE):
+        yield raw[i:i + ge_fetch.RX_SIZE]
+
+
+HEADERS = ("HTTP/1.1 200 OK\r\nDate: Sun, 28 May 2023 10:16:40 GMT\r\nContent-Type: application/json\r\n"
+           "Connection: keep-alive\r\nCache-Control: no-cache, private\r\nX-RateLimit-Limit: 300\r\n"
+           "X-RateLimit-Remaining: 299\r\nAccess-Control-Allow-Origin: *\r\n")
+
+
+def http_response(raw, chunked=False):
+    # A recorded body as the cloud sends it, whole or in 256 byte chunks
+    if not chunked:
+        return (HEADERS + "Content-Length: %d\r\n\r\n" % len(raw)).encode() + raw
+    chunks = b"".join(b"%x\r\n%s\r\n" % (len(raw[i:i + 256]), raw[i:i + 256]) for i in range(0, len(raw), 256))
+    return (HEADERS + "Transfer-Encoding: chunked\r\n\r\n").encode() + chunks + b"0\r\n\r\n"
+
+
+class FakeSocket:
+    # Replays a response into recv_into()
+    def __init__(self, data):
+        self._data = memoryview(data)
+        self._pos  = 0
+
+    def recv_into(self, buf):
+        size = min(len(buf), len(self._data) - self._pos)
+        buf[:size] = self._data[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def settimeout(self, timeout):
+        pass
+
+    def connect(self, address):
+        pass
+
+    def setblocking(self, flag):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    SOCK_STREAM = 1
+
+    def __init__(self):
+        self.data = b""
+
+    def getaddrinfo(self, host, port, *args):
+        return [(2, 1, 0, "", (host, port))]
+
+    def socket(self, *args):
+        return FakeSocket(self.data)
+
+
+def _run(coroutine):
+    # The fake socket never blocks, so the coroutine finishes on its first step
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("read blocked")
+
+
+def read(conn, pool, responses):
+    # One kept Connection (as in ge_fetch.Session) reading each response
+    results = []
+    for raw, fields in responses:
+        pool.data = raw
+        conn.close()
+        conn.connect()
+        result = ge_fetch.FetchResult("", fields)
+        results.append(result.finish(_run(conn.read_response(result.sink()))))
+    return results
+
+
+def decode(responses):
+    return [json.loads(raw) for raw, _ in responses]
+
+
+def extract(responses):
+    results = []
+    for raw, fields in responses:
+        ex = ge_extract.Extractor(fields)
+        for block in _blocks(raw):
+            ex.feed(block)
+        results.append(ex.close())
+    return results
+
+
+def measure(fn):
+    # -> (median us per run, peak traced bytes, bytes held by the result)
+    fn()  # warm up caches
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    times = []
+    deadline = time.perf_counter() + TIME_BUDGET
+    while len(times) < 5 or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e6, peak, held
+
+
+def cases():
+    # -> [(stage, case, payload bytes, fn)]
+    system = [load_fixture("system-data-2023-05-28"), load_fixture("system-data-2023-05-26")]
+    meter  = [load_fixture("meter-data-2023-05-28"), load_fixture("meter-data-2023-05-26")]
+    sample = [(system[0], ge_extract.SYSTEM_DATA_FIELDS), (meter[0], ge_extract.METER_DATA_FIELDS)]
+    payloads = [
+        ("system-data", sample[:1]),
+        ("meter-data", sample[1:]),
+        ("system+meter", sample),
+        ("worldtimeapi", [(load_fixture("worldtimeapi-2023-05-29"), None)]),
+        ("system x32 arrays", [(with_arrays(system[0], 32), ge_extract.SYSTEM_DATA_FIELDS)]),
+        ("system x256 arrays", [(with_arrays(system[0], 256), ge_extract.SYSTEM_DATA_FIELDS)]),
+        ("4 inverters", sample * 4),
+        ("16 inverters", sample * 16),
+    ]
+    out = []
+    pool = FakePool()
+    conn = ge_fetch.Connection(pool, None, "api.givenergy.cloud", tls=False)
+    for name, chunked, pairs in (("system-data", False, sample[:1]), ("system+meter", False, sample),
+                                 ("system+meter chunked", True, sample),
+                                 ("system x256 arrays", False, [(with_arrays(system[0], 256), sample[0][1])])):
+        for fields in (True, False):
+            responses = [(http_response(json.dumps(obj).encode(), chunked), f if fields else None) for obj, f in pairs]
+            out.append(("read", name + ("" if fields else " body"), sum(len(raw) for raw, _ in responses),
+                        lambda responses=responses: read(conn, pool, responses)))
+
+    for name, pairs in payloads:
+        responses = [(json.dumps(obj).encode(), fields) for obj, fields in pairs]
+        size = sum(len(raw) for raw, _ in responses)
+        out.append(("decode", name, size, lambda responses=responses: decode(responses)))
+        if all(fields is not None for _, fields in responses):
+            out.append(("extract", name, size, lambda responses=responses: extract(responses)))
+
+    for day in (0, 1):
+        record = ge_record.encode(system[day], meter[day])
+        out.append(("record", "system+meter " + ("28/05", "26/05")[day], len(record),
+                    lambda record=record: ge_record.decode(record)))
+
+    time_str = "28/05/2023 11:16"
+    dashboard = ge_dashboard.Dashboard(8.0)
+    dashboard.update(system[0], meter[0], time_str)
+    flip = [0]
+
+    def update():
+        flip[0] ^= 1
+        return dashboard.update(system[flip[0]], meter[flip[0]], time_str)
+
+    out += [
+        ("format", "recorded sample", 0, lambda: ge_dashboard.label_texts(system[0], meter[0], time_str, 8.0)),
+        ("build", "dashboard", 0, lambda: ge_dashboard.Dashboard(8.0)),
+        ("update", "dashboard", 0, update),
+        ("compose", "296x128 grey", 0, lambda: displayio.compose(dashboard.group, ge_dashboard.WIDTH, ge_dashboard.HEIGHT)),
+        ("hash", "dashboard", 0, lambda: ge_frame.fingerprint(dashboard.group, skip=(dashboard.time_group,))),
+    ]
+    return out
+
+
+def compare(results, baseline, tolerance):
+    # -> rows that got slower or allocate more than tolerance allows
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        us, peak = result[:2]
+        base_us, base_peak = baseline[key][:2]
+        if us > base_us * (1 + tolerance) or peak > base_peak * (1 + tolerance):
+            regressions.append((key, base_us, us, base_peak, peak))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and allocations for each stage of a wake")
+    parser.add_argument("--stage", action="append", help="only these stages (repeatable)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown or extra peak, as a fraction")
+    args = parser.parse_args()
+
+    results = {}
+    print("%-8s %-26s %7s %10s %9s %9s" % ("stage", "case", "bytes", "us/run", "peak B", "held B"))
+    for stage, name, size, fn in cases():
+        if args.stage and stage not in args.stage:
+            continue
+        us, peak, held = measure(fn)
+        results[stage + "/" + name] = (us, peak, held)
+        print("%-8s %-26s %7s %10.1f %9d %9d" % (stage, name, size or "", us, peak, held))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for key, base_us, us, base_peak, peak in regressions:
+            print("REGRESSION %-30s %10.1f -> %.1f us, peak %d -> %d B" % (key, base_us, us, base_peak, peak))
+        print("\n%d of %d compared rows outside %.0f%%"
+              % (len(regressions), len(set(results) & set(baseline)), args.tolerance * 100))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
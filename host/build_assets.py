@@ -0,0 +1,167 @@
+# Builds the asset pack (ge_assets) the dashboard loads at boot.
+#
+# The BDF font is cut down to the characters the dashboard's labels can
+# print (their fixed words, the digits, '.' and '-'), and the battery
+# outline is drawn as the Rects drew it. Both are written 1 bit a pixel in
+# the layout ge_assets.py describes. Copy the pack to the board next to
+# the scripts:
+#
+#   python3 host/build_assets.py --bdf fonts/Verdana-Bold-18.bdf
+#   cp ge_assets.bin /media/CIRCUITPY/
+#
+# It then times parsing the whole BDF against loading the pack, both in
+# CPython with the shim's displayio, as a guide to the saving at boot.
+
+import argparse
+import os
+import struct
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.append(os.path.join(HERE, "shim"))
+
+import displayio  # noqa: E402
+
+import ge_assets  # noqa: E402
+import ge_dashboard  # noqa: E402
+from ge_standin import METER_DATA, SYSTEM_DATA  # noqa: E402
+
+EXTRA = "0123456789.-"
+
+
+def charset():
+    # Every character a label can show: the texts for a recorded sample, plus all the digits
+    _, texts = ge_dashboard.label_texts(SYSTEM_DATA, METER_DATA, "28/05/2023 11:16")
+    return sorted(set("".join(text for _, text in texts) + EXTRA))
+
+
+def parse_bdf(path, keep=None):
+    # -> ((w, h, x offset, y offset), {codepoint: (w, h, dx, dy, shift_x, rows)}), rows packed MSB first
+    box, glyphs = None, {}
+    with open(path) as f:
+        lines = iter(f)
+        for line in lines:
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == "FONTBOUNDINGBOX":
+                box = tuple(int(v) for v in words[1:5])
+            elif words[0] == "STARTCHAR":
+                codepoint, shift_x, bbx = -1, 0, (0, 0, 0, 0)
+                for line in lines:
+                    words = line.split()
+                    if words[0] == "ENCODING":
+                        codepoint = int(words[1])
+                    elif words[0] == "DWIDTH":
+                        shift_x = int(words[1])
+                    elif words[0] == "BBX":
+                        bbx = tuple(int(v) for v in words[1:5])
+                    elif words[0] == "BITMAP":
+                        break
+                w, h, dx, dy = bbx
+                stride = (w + 7) // 8
+                rows = b"".join(bytes.fromhex(next(lines).strip())[:stride].ljust(stride, b"\0") for _ in range(h))
+                if keep is None or codepoint in keep:
+                    glyphs[codepoint] = (w, h, dx, dy, shift_x, rows)
+    if box is None:
+        raise ValueError("%s has no FONTBOUNDINGBOX" % path)
+    return box, glyphs
+
+
+def _pack_rows(pixels, width, height):
+    # pixels[y][x] truthy -> rows packed MSB first
+    stride = (width + 7) // 8
+    out = bytearray(stride * height)
+    for y in range(height):
+        for x in range(width):
+            if pixels[y][x]:
+                out[y * stride + (x >> 3)] |= 0x80 >> (x & 7)
+    return bytes(out)
+
+
+def render_battery():
+    # The outline and cap as the two Rects draw them, in one image from the cap's top
+    x, y, w, h = ge_dashboard.BATTERY
+    cx, cy, cw, ch = ge_dashboard.BATTERY_CAP
+    stroke = ge_dashboard.BATTERY_STROKE
+    height = y + h - cy
+    pixels = [[0] * w for _ in range(height)]
+    for py in range(ch):
+        for px in range(cw):
+            pixels[py][cx - x + px] = 1
+    for py in range(h):
+        for px in range(w):
+            if px < stroke or py < stroke or px >= w - stroke or py >= h - stroke:
+                pixels[y - cy + py][px] = 1
+    return w, height, _pack_rows(pixels, w, height)
+
+
+def _section(kind, name, body):
+    return struct.pack(ge_assets.SECTION, kind, name.encode(), len(body)) + body
+
+
+def build(fonts, images):
+    # fonts: {name: (box, glyphs)}, images: {name: (w, h, rows)} -> the pack's bytes
+    sections = []
+    for name, (box, glyphs) in fonts.items():
+        body = [struct.pack(ge_assets.FONT, box[0], box[1], box[2], box[3], len(glyphs))]
+        for codepoint in sorted(glyphs):
+            w, h, dx, dy, shift_x, rows = glyphs[codepoint]
+            body.append(struct.pack(ge_assets.GLYPH, codepoint, w, h, dx, dy, shift_x) + rows)
+        sections.append(_section(b"FONT", name, b"".join(body)))
+    for name, (w, h, rows) in images.items():
+        sections.append(_section(b"IMG ", name, struct.pack(ge_assets.IMAGE, w, h) + rows))
+    return struct.pack(ge_assets.HEADER, ge_assets.MAGIC, ge_assets.VERSION, len(sections)) + b"".join(sections)
+
+
+def _bdf_load(path):
+    # What loading the whole BDF costs: parse it and make a Bitmap per glyph
+    _, glyphs = parse_bdf(path)
+    bitmaps = []
+    for w, h, dx, dy, shift_x, rows in glyphs.values():
+        bitmap = displayio.Bitmap(max(w, 1), max(h, 1), 2)
+        stride = (w + 7) // 8
+        for y in range(h):
+            for x in range(w):
+                if rows[y * stride + (x >> 3)] & (0x80 >> (x & 7)):
+                    bitmap[x, y] = 1
+        bitmaps.append(bitmap)
+    return bitmaps
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the dashboard's asset pack")
+    parser.add_argument("--bdf", help="BDF font for the large labels, e.g. the one at VERDANA_BOLD")
+    parser.add_argument("--out", default=os.path.join(HERE, "..", "ge_assets.bin"))
+    args = parser.parse_args()
+
+    fonts = {}
+    chars = charset()
+    if args.bdf:
+        box, glyphs = parse_bdf(args.bdf, keep={ord(c) for c in chars})
+        missing = "".join(c for c in chars if ord(c) not in glyphs)
+        if missing:
+            print("Not in %s: %r" % (args.bdf, missing))
+        fonts["large"] = (box, glyphs)
+    images = {"battery": render_battery()}
+    data = build(fonts, images)
+    with open(args.out, "wb") as f:
+        f.write(data)
+    print("%s: %d bytes, %d glyphs, %d images"
+          % (args.out, len(data), sum(len(g) for _, g in fonts.values()), len(images)))
+
+    if args.bdf:
+        print("whole BDF %.1f ms, pack %.1f ms (CPython with the shim)"
+              % (_timed(_bdf_load, args.bdf), _timed(ge_assets.load, args.out)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# LAN caching aggregator between the displays and the GivEnergy cloud.
+#
+# Every display polling api.givenergy.cloud for the same inverter costs a
+# TLS handshake and a cloud request each. This service fetches
+# system-data and meter-data from the cloud once per inverter update and
+# serves them to the displays over plain HTTP on the LAN, on the cloud's
+# own paths, so a display only needs its base URL changed (AGGREGATOR in
+# the display scripts).
+#
+# A response is cached until the inverter's next sample is due: its
+# data.time plus the update interval and a margin for the cloud to catch
+# up. If the cloud still returns the old sample after that, it is asked
+# again every retry seconds rather than on every display request. When the
+# cloud can't be reached the last response is served with X-Cache: STALE;
+# with nothing cached the display gets a 502.
+#
+# /v1/inverter/<serial>/record answers with both endpoints in one ge_record
+# (32 bytes in place of the two JSON bodies), from the same cache.
+#
+# Requests for the same entry wait on one cloud fetch. The cloud is asked
+# with --api-key (required); the displays send no key to the aggregator, so
+# the account's key never crosses the LAN in plain HTTP.
+#
+#   python3 host/ge_aggregator.py --api-key KEY                 serve on 0.0.0.0:8081
+#   python3 host/ge_aggregator.py --standin --api-key any       offline, against host/ge_standin.py
+#   python3 host/run_device.py Circuitpython_GE_display_v5.py --aggregator --wakes 3
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import ge_record  # noqa: E402
+import ge_time  # noqa: E402
+from ge_standin import ROUTE, StandIn  # noqa: E402
+
+CLOUD    = "https://api.givenergy.cloud"
+INTERVAL = 300  # seconds between inverter samples
+MARGIN   = 30   # seconds for the cloud to have the next sample
+RETRY    = 30   # seconds between asks once a sample is overdue
+
+RECORD_ROUTE = re.compile(r"^/v1/inverter/([^/]+)/record$")
+
+
+class Entry:
+    def __init__(self):
+        self.lock    = threading.Lock()  # held while fetching from the cloud
+        self.state   = "HIT"  # or "STALE" while the cloud is failing
+        self.status  = None
+        self.body    = None
+        self.expires = 0
+
+
+class Aggregator(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, upstream, api_key, interval=INTERVAL,
+                 margin=MARGIN, retry=RETRY, timeout=10, clock=time.time):
+        self.upstream = upstream.rstrip("/")
+        self.api_key  = api_key
+        self.interval = interval
+        self.margin   = margin
+        self.retry    = retry
+        self.timeout  = timeout
+        self.clock    = clock
+        self._entries = {}  # path -> Entry
+        self._lock    = threading.Lock()
+        self.hits     = 0
+        self.fetches  = 0
+        self.stale    = 0
+        super().__init__(address, Handler)
+
+    @property
+    def base_url(self):
+        return "http://%s:%d" % self.server_address[:2]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def _entry(self, path):
+        with self._lock:
+            return self._entries.setdefault(path, Entry())
+
+    def expiry(self, body, now):
+        # When the next sample should be in the cloud, at least retry seconds from now
+        try:
+            sampled = ge_time.iso_to_epoch(json.loads(body)["data"]["time"])
+        except (ValueError, KeyError, TypeError, IndexError):
+            return now + self.retry
+        return max(sampled + self.interval + self.margin, now + self.retry)
+
+    def fetch(self, path, body):
+        # -> (status, body) from the cloud
+        headers = {"Accept": "application/json", "Content-Type": "application/json",
+                   "Authorization": "Bearer " + self.api_key}
+        request = urllib.request.Request(self.upstream + path, data=body or None, headers=headers, method="GET")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def get(self, path, body=None):
+        # -> (status, body, "HIT", "MISS" or "STALE", seconds it stays fresh)
+        entry = self._entry(path)
+        with entry.lock:
+            now = self.clock()
+            if entry.body is not None and now < entry.expires:
+                self.hits += 1
+                return entry.status, entry.body, entry.state, entry.expires - now
+            self.fetches += 1
+            try:
+                status, data = self.fetch(path, body)
+            except OSError as e:
+                status, data = None, json.dumps({"message": "Upstream error: %s" % e}).encode()
+            if status == 200:
+                entry.status, entry.body, entry.expires = status, data, self.expiry(data, now)
+                entry.state = "HIT"
+                return status, data, "MISS", entry.expires - now
+            if entry.body is not None:
+                self.stale += 1
+                entry.state   = "STALE"
+                entry.expires = now + self.retry  # don't ask again on every request
+                return entry.status, entry.body, "STALE", self.retry
+            return (status or 502), data, "MISS", 0
+
+    def get_record(self, serial, body=None):
+        # -> as get(), for the serial's ge_record
+        answers = [self.get("/v1/inverter/%s/%s/latest" % (serial, endpoint), body)
+                   for endpoint in ("system-data", "meter-data")]
+        for status, data, cache, fresh in answers:
+            if status != 200:
+                return status, data, cache, fresh
+        (_, system, system_cache, system_fresh), (_, meter, meter_cache, meter_fresh) = answers
+        try:
+            record = ge_record.encode(json.loads(system), json.loads(meter))
+        except (ValueError, KeyError, TypeError) as e:
+            return 502, json.dumps({"message": "Can't make a record: %s" % e}).encode(), "MISS", 0
+        cache = system_cache if system_cache == meter_cache else "MISS"
+        return 200, record, cache, min(system_fresh, meter_fresh)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else None
+        record = RECORD_ROUTE.match(self.path)
+        if record:
+            status, data, cache, fresh = self.server.get_record(record.group(1), body)
+            self._reply(status, data, cache, fresh, ge_record.CONTENT_TYPE if status == 200 else None)
+            return
+        if not ROUTE.match(self.path):
+            self._reply(404, json.dumps({"message": "Not Found"}).encode(), "MISS", 0)
+            return
+        status, data, cache, fresh = self.server.get(self.path, body)
+        self._reply(status, data, cache, fresh)
+
+    def _reply(self, status, body, cache, fresh, content_type=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type or "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=%d" % max(fresh, 0))
+        self.send_header("X-Cache", cache)
+        if self.headers.get("Connection", "").lower() == "close":
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache GivEnergy responses for the displays on the LAN")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--upstream", default=CLOUD, help="the cloud API's base URL")
+    parser.add_argument("--api-key", default=os.environ.get("GE_API_KEY"),
+                        help="the cloud API key, required (default $GE_API_KEY)")
+    parser.add_argument("--interval", type=int, default=INTERVAL, help="seconds between inverter samples")
+    parser.add_argument("--standin", action="store_true", help="use a local host/ge_standin.py as the cloud")
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("--api-key (or $GE_API_KEY) is required")
+
+    upstream = args.upstream
+    if args.standin:
+        upstream = StandIn().start().base_url
+    server = Aggregator((args.host, args.port), upstream, args.api_key, args.interval)
+    print("Aggregator on %s for %s" % (server.base_url, upstream))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print("%d cached answers, %d cloud fetches, %d stale" % (server.hits, server.fetches, server.stale))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# Local stand-in for the GivEnergy cloud API, for running off-device.
+#
+# Serves recorded system-data and meter-data payloads (host/fixtures) over
+# plain HTTP with a configurable per-request delay standing in for cloud
+# processing time. fail and flaky make it answer 503 Service Unavailable,
+# always for the endpoints in fail, at random at the rate flaky for the rest.
+#
+#   python3 host/ge_standin.py                 serve on 127.0.0.1:8080
+#   python3 host/ge_standin.py --bench         compare back-to-back, concurrent and keep-alive fetches
+#
+# The bench serves plain HTTP on loopback, so a connection costs next to
+# nothing here: it shows the latency of each way of fetching and how many
+# connections (on the device, TLS handshakes) each opens, not their cost.
+
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name):
+    # A recorded response from host/fixtures, e.g. "system-data-2023-05-28"
+    with open(os.path.join(FIXTURES, name + ".json")) as f:
+        return json.load(f)
+
+
+SYSTEM_DATA = load_fixture("system-data-2023-05-28")
+METER_DATA  = load_fixture("meter-data-2023-05-28")
+
+ROUTE = re.compile(r"^/v1/inverter/([^/]+)/(system-data|meter-data)/latest$")
+
+
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), delay=0.0):
+        self.delay    = delay
+        self.payloads = {"system-data": SYSTEM_DATA, "meter-data": METER_DATA}
+        self.fail     = set()  # endpoints answering 503, e.g. {"meter-data"}
+        self.flaky    = 0.0  # chance of a 503 for any other request
+        self.failed      = 0  # 503s answered
+        self.requests    = 0
+        self.connections = 0
+        self.open        = 0  # connections open now
+        self.peak        = 0  # most connections open at once
+        self._lock       = threading.Lock()
+        super().__init__(address, Handler)
+
+    @property
+    def base_url(self):
+        return "http://%s:%d" % self.server_address[:2]
+
+    def url(self, serial, endpoint):
+        return "%s/v1/inverter/%s/%s/latest" % (self.base_url, serial, endpoint)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        server = self.server
+        with server._lock:
+            server.connections += 1
+            server.open += 1
+            server.peak = max(server.peak, server.open)
+        super().setup()
+
+    def finish(self):
+        super().finish()
+        with self.server._lock:
+            self.server.open -= 1
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+        match = ROUTE.match(self.path)
+        if server.delay:
+            time.sleep(server.delay)
+        if not match:
+            self._reply(404, {"message": "Not Found"})
+        elif match.group(2) in server.fail or random.random() < server.flaky:
+            server.failed += 1
+            self._reply(503, {"message": "Service Unavailable"})
+        else:
+            self._reply(200, server.payloads[match.group(2)])
+
+    def _reply(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.headers.get("Connection", "").lower() == "close":
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def bench(delay, cycles):
+    import ge_fetch
+
+    server = StandIn(delay=delay).start()
+    urls = [server.url("CE0000X000", "system-data"), server.url("CE0000X000", "meter-data")]
+    headers = {"Accept": "application/json", "Connection": "close"}
+
+    session = ge_fetch.Session(socket, None)  # one socket, the requests pipelined on it
+    lanes   = ge_fetch.Session(socket, None, max_connections=2)  # a socket for each, as v5 does
+
+    serial = concurrent = keep_alive = two_lanes = 0
+    for _ in range(cycles):
+        start = time.monotonic()
+        for url in urls:
+            ge_fetch.fetch_all(socket, None, [url], headers)
+        serial += time.monotonic() - start
+        start = time.monotonic()
+        ge_fetch.fetch_all(socket, None, urls, headers)
+        concurrent += time.monotonic() - start
+        start = time.monotonic()
+        session.fetch_all(urls, {"Accept": "application/json"})
+        keep_alive += time.monotonic() - start
+        start = time.monotonic()
+        lanes.fetch_all(urls, {"Accept": "application/json"})
+        two_lanes += time.monotonic() - start
+    session.close()
+    lanes.close()
+    server.shutdown()
+    requests = cycles * len(urls)
+    print("\n%d cycles, %.0f ms server delay per request" % (cycles, delay * 1000))
+    for name, total, handshakes in (("back to back ", serial, requests), ("concurrent   ", concurrent, requests),
+                                    ("keep-alive   ", keep_alive, session.handshakes),
+                                    ("keep-alive x2", two_lanes, lanes.handshakes)):
+        print("%s: %6.1f ms per cycle, saved %6.1f ms, %d connections for %d requests, %d handshakes avoided"
+              % (name, total / cycles * 1000, (serial - total) / cycles * 1000, handshakes, requests, requests - handshakes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--delay", type=float, default=0.3, help="seconds added to every response")
+    parser.add_argument("--bench", action="store_true", help="time back-to-back against concurrent fetches")
+    parser.add_argument("--cycles", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.delay, args.cycles)
+        return
+    server = StandIn((args.host, args.port), args.delay)
+    print("GivEnergy stand-in on %s (delay %.2fs)" % (server.base_url, args.delay))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
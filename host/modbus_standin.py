@@ -0,0 +1,125 @@
+# Local stand-in for the inverter's Modbus TCP interface, for running off-device.
+#
+# Answers function 4 (read input registers) from a bank built out of the
+# recorded payloads in host/fixtures (ge_modbus.registers), with a
+# configurable delay per request standing in for the inverter's reply time.
+# Anything else gets Modbus exception 1 (illegal function).
+#
+#   python3 host/modbus_standin.py                 serve on 127.0.0.1:5020
+#   python3 host/modbus_standin.py --bench         local read against the cloud fetch, by latency
+
+import argparse
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import ge_modbus  # noqa: E402
+from ge_standin import METER_DATA, SYSTEM_DATA, StandIn  # noqa: E402
+
+
+class ModbusStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads      = True
+    allow_reuse_address = True
+
+    def __init__(self, address=("127.0.0.1", 0), delay=0.0, unit=ge_modbus.UNIT):
+        self.delay       = delay
+        self.unit        = unit
+        self.registers   = ge_modbus.registers(SYSTEM_DATA, METER_DATA)
+        self.requests    = 0
+        self.connections = 0
+        super().__init__(address, Handler)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class Handler(socketserver.BaseRequestHandler):
+    def _read(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        while True:
+            header = self._read(7)
+            if header is None:
+                return
+            transaction, protocol, length, unit = struct.unpack(">HHHB", header)
+            pdu = self._read(length - 1)
+            if pdu is None:
+                return
+            server.requests += 1
+            if server.delay:
+                time.sleep(server.delay)
+            function = pdu[0]
+            if function == ge_modbus.READ_INPUT_REGISTERS and unit == server.unit and len(pdu) == 5:
+                address, count = struct.unpack(">HH", pdu[1:])
+                values = [server.registers[a] if a < len(server.registers) else 0
+                          for a in range(address, address + count)]
+                reply = struct.pack(">BB%dH" % count, function, 2 * count, *values)
+            else:
+                reply = struct.pack(">BB", function | 0x80, 1)
+            self.request.sendall(struct.pack(">HHHB", transaction, protocol, len(reply) + 1, unit) + reply)
+
+
+def bench(delay, cloud_delay, cycles):
+    import ge_fetch
+    import ge_site
+
+    modbus = ModbusStandIn(delay=delay).start()
+    cloud  = StandIn(delay=cloud_delay).start()
+    inverter = ge_modbus.LocalInverter(socket, *modbus.server_address)
+    site = ge_site.Site(["CE0000X000"], api=cloud.base_url + "/v1/inverter/")
+
+    local = fetched = 0.0
+    for _ in range(cycles):
+        start = time.perf_counter()
+        inverter.read()
+        local += time.perf_counter() - start
+        session = ge_fetch.Session(socket, None, max_connections=2)
+        start = time.perf_counter()
+        site.fetch(session)
+        fetched += time.perf_counter() - start
+        session.close()
+    modbus.shutdown()
+    cloud.shutdown()
+    print("\n%d cycles; inverter replies in %.0f ms, the cloud stand-in in %.0f ms"
+          % (cycles, delay * 1000, cloud_delay * 1000))
+    print("Modbus TCP read   : %6.1f ms per cycle, 1 request" % (local / cycles * 1000))
+    print("cloud stand-in    : %6.1f ms per cycle, 2 requests (no TLS or internet round trip here)"
+          % (fetched / cycles * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modbus TCP stand-in for the inverter")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds the inverter takes to reply")
+    parser.add_argument("--bench", action="store_true", help="time a local read against the cloud fetch")
+    parser.add_argument("--cloud-delay", type=float, default=0.3, help="seconds the cloud stand-in adds, for --bench")
+    parser.add_argument("--cycles", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.delay, args.cloud_delay, args.cycles)
+        return
+    server = ModbusStandIn((args.host, args.port), args.delay)
+    print("Modbus stand-in on %s:%d (delay %.2fs)" % (server.server_address[0], server.server_address[1], args.delay))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# Replay a day-long inverter trace against the adaptive wake scheduler.
+#
+# Each policy wakes, shows the latest sample the cloud has (posted every
+# 5 minutes) and sleeps. Every minute of the day the value on screen is
+# compared with the true one: SoC in percent, and the worst of the day's kWh
+# counters. Fixed intervals are swept to find the longest one that is at
+# least as fresh as the adaptive schedule, and the wakes saved are reported.
+#
+#   python3 host/replay_schedule.py                   synthetic summer day
+#   python3 host/replay_schedule.py --trace day.csv   recorded trace
+#   python3 host/replay_schedule.py --write-trace day.csv
+#
+# A trace is CSV with a header: time (UTC epoch), soc, battery_power,
+# solar_power, consumption, grid_power, then any kWh counters.
+
+import argparse
+import csv
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import ge_schedule
+import ge_time
+
+POST_EVERY = 300  # seconds between inverter samples reaching the cloud
+FIELDS     = ("time", "soc", "battery_power", "solar_power", "consumption", "grid_power")
+COUNTERS   = ("solar_today", "consumption_today", "import_today", "export_today", "charge_today", "discharge_today")
+
+
+def synthetic_day(start=ge_time.iso_to_epoch("2023-06-21T00:00:00Z"), capacity=8.0, seed=1):
+    # A sunny-with-cloud June day, cheap-rate overnight charge, evening discharge
+    rng = random.Random(seed)
+    soc = 35.0
+    cloud = 1.0
+    counters = dict.fromkeys(COUNTERS, 0.0)
+    rows = []
+    for minute in range(24 * 60):
+        epoch = start + minute * 60
+        t = ge_time.local_time(epoch)
+        hour = t.tm_hour + t.tm_min / 60
+        cloud = min(1.0, max(0.4, cloud + rng.uniform(-0.08, 0.08)))
+        solar = 4000 * math.sin(math.pi * (hour - 5) / 16) * cloud if 5 < hour < 21 else 0
+        consumption = 300 + (1500 if 7 <= hour < 8 else 0) + (2000 if 18 <= hour < 19 else 0)
+        if rng.random() < 0.03:
+            consumption += rng.choice((800, 1200, 2500))
+        if 0.5 <= hour < 4.5 and soc < 100:
+            battery = 2600  # charging from the grid on the cheap rate
+        elif solar > consumption and soc < 100:
+            battery = min(solar - consumption, 2600)
+        elif solar < consumption and soc > 4 and not 0.5 <= hour < 4.5:
+            battery = -min(consumption - solar, 2600)
+        else:
+            battery = 0
+        grid = consumption + battery - solar  # + import, - export
+        soc = min(100.0, max(0.0, soc + battery * 60 / (capacity * 36000)))
+        counters["solar_today"]       += solar / 60000
+        counters["consumption_today"] += consumption / 60000
+        counters["import_today"]      += max(grid, 0) / 60000
+        counters["export_today"]      += max(-grid, 0) / 60000
+        counters["charge_today"]      += max(battery, 0) / 60000
+        counters["discharge_today"]   += max(-battery, 0) / 60000
+        row = {"time": epoch, "soc": soc, "battery_power": battery, "solar_power": solar,
+               "consumption": consumption, "grid_power": grid}
+        row.update(counters)
+        rows.append(row)
+    return rows
+
+
+def load_trace(path):
+    with open(path) as f:
+        return [{k: float(v) for k, v in row.items()} for row in csv.DictReader(f)]
+
+
+def write_trace(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def as_system_data(row):
+    return {"data": {
+        "time": int(row["time"]),
+        "battery": {"percent": int(round(row["soc"])), "power": int(row["battery_power"])},
+        "solar": {"power": int(row["solar_power"])},
+        "grid": {"power": int(row["grid_power"])},
+        "consumption": int(row["consumption"]),
+    }}
+
+
+def replay(rows, next_sleep):
+    # -> (wakes, [soc error per minute], [kWh error per minute])
+    start = rows[0]["time"]
+    step  = rows[1]["time"] - start
+    end   = rows[-1]["time"]
+    counters = [c for c in COUNTERS if c in rows[0]]
+
+    def posted(t):
+        return rows[int((t - start) // POST_EVERY * POST_EVERY // step)]
+
+    wakes = []
+    t = start
+    previous = None
+    while t <= end:
+        sample = posted(t)
+        wakes.append((t, sample))
+        t += next_sleep(sample, previous, t)
+        previous = sample
+
+    soc_err, kwh_err = [], []
+    shown = None
+    w = 0
+    for row in rows:
+        while w < len(wakes) and wakes[w][0] <= row["time"]:
+            shown = wakes[w][1]
+            w += 1
+        soc_err.append(abs(round(row["soc"]) - round(shown["soc"])))
+        kwh_err.append(max([abs(row[c] - shown[c]) for c in counters] or [0]))
+    return len(wakes), soc_err, kwh_err
+
+
+def p95(values):
+    ordered = sorted(values)
+    return ordered[int(len(ordered) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a day against the wake scheduler")
+    parser.add_argument("--trace", help="CSV trace to replay instead of the synthetic day")
+    parser.add_argument("--write-trace", help="write the synthetic day to this CSV and exit")
+    parser.add_argument("--min-sleep", type=int, default=300)
+    parser.add_argument("--max-sleep", type=int, default=3600)
+    parser.add_argument("--day-max", type=int, default=1200)
+    parser.add_argument("--soc-step", type=float, default=2)
+    parser.add_argument("--energy-step", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rows = load_trace(args.trace) if args.trace else synthetic_day()
+    if args.write_trace:
+        write_trace(rows, args.write_trace)
+        return
+
+    scheduler = ge_schedule.Scheduler(args.min_sleep, args.max_sleep, args.day_max, args.soc_step, args.energy_step)
+
+    def adaptive(sample, previous, t):
+        return scheduler.next_sleep(as_system_data(sample), previous and as_system_data(previous),
+                                    ge_time.local_time(int(t)))
+
+    wakes, soc_err, kwh_err = replay(rows, adaptive)
+    print("%-14s %6s %12s %12s %12s %12s" % ("policy", "wakes", "SoC err avg", "SoC err p95", "kWh err avg", "kWh err p95"))
+    line = "%-14s %6d %12.2f %12.2f %12.3f %12.3f"
+    print(line % ("adaptive", wakes, sum(soc_err) / len(soc_err), p95(soc_err), sum(kwh_err) / len(kwh_err), p95(kwh_err)))
+
+    match = None
+    for interval in range(300, 3601, 300):
+        f_wakes, f_soc, f_kwh = replay(rows, lambda sample, previous, t: interval)
+        print(line % ("fixed %ds" % interval, f_wakes, sum(f_soc) / len(f_soc), p95(f_soc),
+                      sum(f_kwh) / len(f_kwh), p95(f_kwh)))
+        if p95(f_soc) <= p95(soc_err) and p95(f_kwh) <= p95(kwh_err):
+            match = (interval, f_wakes)
+
+    if match is None:
+        print("\nNo fixed interval tried is as fresh as the adaptive schedule")
+    else:
+        print("\nLongest fixed interval as fresh as adaptive: %ds, %d wakes; adaptive saves %d wakes (%.0f%%)"
+              % (match[0], match[1], match[1] - wakes, (match[1] - wakes) * 100 / match[1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+# Run a device script on the host, against the fake CircuitPython modules in
+# host/shim and the local GivEnergy stand-in, with no hardware.
+#
+#   python3 host/run_device.py Circuitpython_GE_display_v5.py --wakes 3
+#   python3 host/run_device.py Circuitpython_GE_display_v5.py --fast --profile
+#   python3 host/run_device.py Circuitpython_GE_display.py      continuous, Ctrl-C stops it
+#
+# Each wake is a reset: the scripts' own modules are imported afresh, the
+# radio is down, time.monotonic() counts from 0 and sleep memory holds what
+# the last wake left in the file (--power-on clears it, as a power cycle
+# would). A deep sleep ends the wake and the next one starts straight away;
+# the host clock carries on, the sleep is not waited out. The slow hardware
+# (WiFi scan, DHCP, TLS, e-ink refresh) costs what host/shim/_hardware.py
+# says, --fast makes it free. With --heap, gc.mem_free() is worked out from
+# tracemalloc, so it counts CPython's object sizes, not the board's; tracing
+# slows the run down a lot, so leave it off when timing.
+#
+# --flaky and --outage make the stand-in answer 503s, to see the retries
+# and circuit breaker (ge_retry) at work; each wake's charge is worked out
+# from its awake time and the sleep after it (_hardware.AWAKE_MA, SLEEP_UA),
+# and wakes that met a failure are totted up apart from the rest.
+#
+# --imports times every module's first load (less the modules it loads in
+# turn) and lists what each wake imports. The board loads a wake's modules
+# afresh every time, so a module the host already has counts what its first
+# load took. They are the host's times, the shim's fakes are cheap to load,
+# so compare which modules a wake pulls in rather than the milliseconds
+# with the board.
+#
+# Each wake that talks to the panel reports the bytes sent over the display
+# bus (and what they take at its baudrate) and the refreshes, full or
+# partial (ge_epd). --advance moves the stand-in's sample on each wake, so
+# every wake has something new to draw; a partial window's refresh is the
+# script's own wait, it is not made free by --fast.
+#
+# v2 and v3 also need adafruit_requests (pip install adafruit-circuitpython-requests).
+
+import argparse
+import asyncio  # noqa: F401, binds the real ssl before the shim's takes its name
+import builtins
+import cProfile
+import copy
+import datetime
+import importlib
+import importlib.util
+import os
+import pstats
+import runpy
+import sys
+import time
+import traceback
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+SHIM = os.path.join(HERE, "shim")
+sys.path.insert(0, ROOT)
+
+import ge_modbus  # noqa: E402
+from ge_aggregator import Aggregator  # noqa: E402
+from ge_standin import METER_DATA, SYSTEM_DATA, StandIn  # noqa: E402
+from modbus_standin import ModbusStandIn  # noqa: E402
+
+SHIMMED = ("_hardware", "adafruit_il0373", "adafruit_ntp", "alarm", "bitmaptools", "board", "busio", "displayio",
+           "rtc", "secrets", "socketpool", "ssl", "supervisor", "terminalio", "wifi")
+
+
+class ImportTimer:
+    # Stands in for builtins.__import__ while installed
+    def __init__(self):
+        self.first  = {}  # module -> ms its first load took, less the loads it made
+        self.wake   = None  # module -> ms, the modules asked for this wake (None before the first)
+        self.wakes  = {}  # module -> wakes that asked for it
+        self._real  = builtins.__import__
+        self._inner = []  # ms spent in the loads made by each import under way
+
+    def install(self):
+        builtins.__import__ = self
+
+    def uninstall(self):
+        builtins.__import__ = self._real
+
+    def new_wake(self):
+        self.wake = {}
+
+    def load(self, name):
+        # importlib.import_module(name), timed (it doesn't go through __import__)
+        return self._timed(name, (), lambda: importlib.import_module(name))
+
+    def __call__(self, name, globals=None, locals=None, fromlist=(), level=0):
+        full = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__")) if level else name
+        return self._timed(full, fromlist or (), lambda: self._real(name, globals, locals, fromlist, level))
+
+    def _timed(self, full, fromlist, do):
+        parts  = full.split(".")
+        wanted = [".".join(parts[:i + 1]) for i in range(len(parts))]
+        wanted += [full + "." + item for item in fromlist if item != "*"]
+        module = sys.modules.get(full)
+        if module is not None and all(hasattr(module, item) for item in fromlist if item != "*"):
+            try:
+                return do()  # loaded already
+            finally:
+                self._asked(wanted)
+        before = set(sys.modules)
+        self._inner.append(0.0)
+        start = time.perf_counter()
+        try:
+            return do()
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            inner = self._inner.pop()
+            if self._inner:
+                self._inner[-1] += ms
+            loaded = [name for name in wanted if name in sys.modules and name not in before]
+            for name in loaded:
+                self.first[name] = 0.0
+            if loaded:
+                self.first[loaded[-1]] = ms - inner
+            self._asked(wanted)
+
+    def _asked(self, wanted):
+        if self.wake is None:
+            return
+        for name in wanted:
+            if name in sys.modules and name not in self.wake:
+                self.wake[name] = self.first.get(name, 0.0)
+                self.wakes[name] = self.wakes.get(name, 0) + 1
+
+    def summary(self, top=6):
+        ms = sum(self.wake.values())
+        slowest = sorted(self.wake.items(), key=lambda item: -item[1])[:top]
+        return "%d modules, %.1f ms (%s)" % (len(self.wake), ms, ", ".join("%s %.1f" % item for item in slowest))
+
+    def dump(self, top):
+        print("\nModule loads (ms, the first one on the host), slowest first")
+        print("%-40s%8s%7s" % ("module", "ms", "wakes"))
+        for name, ms in sorted(self.first.items(), key=lambda item: -item[1])[:top]:
+            print("%-40s%8.2f%7d" % (name, ms, self.wakes.get(name, 0)))
+
+
+def install(api, sleep_memory_file, load=importlib.import_module):
+    # Put the shim in front of the real modules of the same names
+    sys.path.insert(0, SHIM)
+    for name in SHIMMED:
+        sys.modules.pop(name, None)
+    hardware = load("_hardware")
+    hardware.API = api
+    if sleep_memory_file:
+        hardware.SLEEP_MEMORY_FILE = sleep_memory_file
+    hardware.install()
+    return {name: load(name) for name in SHIMMED}
+
+
+def advanced(steps, minutes):
+    # The recorded sample moved on steps * minutes: later, a little more solar and use, a little less battery
+    system, meter = copy.deepcopy(SYSTEM_DATA), copy.deepcopy(METER_DATA)
+    later = datetime.timedelta(minutes=steps * minutes)
+    for data in (system["data"], meter["data"]):
+        when = datetime.datetime.strptime(data["time"], "%Y-%m-%dT%H:%M:%SZ") + later
+        data["time"] = when.strftime("%Y-%m-%dT%H:%M:%SZ")
+    system["data"]["battery"]["percent"] = max(system["data"]["battery"]["percent"] - steps, 0)
+    system["data"]["solar"]["power"] += 25 * steps
+    today = meter["data"]["today"]
+    today["solar"]          = round(today["solar"] + 0.1 * steps, 1)
+    today["consumption"]    = round(today["consumption"] + 0.1 * steps, 1)
+    today["grid"]["export"] = round(today["grid"]["export"] + 0.1 * (steps // 3), 1)
+    return {"system-data": system, "meter-data": meter}
+
+
+def reset(shim, wake_alarm):
+    shim["_hardware"].power_on()
+    shim["wifi"]._power_on()
+    shim["displayio"]._power_on()
+    shim["alarm"].wake_alarm = wake_alarm
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if path and os.path.dirname(os.path.abspath(path)) == ROOT:
+            del sys.modules[name]
+
+
+def run_wake(script, shim):
+    # -> the DeepSleep that ended the wake, or None if the script ended otherwise
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except shim["alarm"].DeepSleep as sleep:
+        return sleep
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a device script against the host shim")
+    parser.add_argument("script", help="e.g. Circuitpython_GE_display_v5.py")
+    parser.add_argument("--wakes", type=int, default=1, help="wakes to run, for scripts that deep sleep")
+    parser.add_argument("--power-on", action="store_true", help="clear sleep memory before the first wake")
+    parser.add_argument("--sleep-memory", help="file holding sleep memory (default in the temp directory)")
+    parser.add_argument("--delay", type=float, default=0.3, help="seconds the stand-in adds to each response")
+    parser.add_argument("--cost-scale", type=float, default=1.0, help="multiplier on every hardware cost")
+    parser.add_argument("--cost", action="append", default=[], metavar="NAME=SECONDS",
+                        help="override one hardware cost, e.g. refresh=15")
+    parser.add_argument("--fast", action="store_true", help="no hardware costs and no stand-in delay")
+    parser.add_argument("--profile", action="store_true", help="cProfile the wakes")
+    parser.add_argument("--top", type=int, default=25, help="profile (or --imports) lines to print")
+    parser.add_argument("--imports", action="store_true", help="time each module's load and list each wake's")
+    parser.add_argument("--heap", action="store_true", help="trace allocations for gc.mem_free()")
+    parser.add_argument("--aggregator", action="store_true",
+                        help="fetch through host/ge_aggregator.py, with the stand-in as the cloud")
+    parser.add_argument("--local", action="store_true",
+                        help="read the inverter over Modbus TCP (host/modbus_standin.py) in place of the cloud")
+    parser.add_argument("--inverters", type=int, help="give the script this many inverter serials")
+    parser.add_argument("--flaky", type=float, default=0.0, metavar="P",
+                        help="chance of the stand-in answering any request with a 503")
+    parser.add_argument("--outage", type=int, default=0, metavar="WAKES",
+                        help="the stand-in answers every request with a 503 for the first WAKES wakes")
+    parser.add_argument("--advance", type=float, default=0.0, metavar="MINUTES",
+                        help="the stand-in's sample moves on this many minutes each wake, so each has news")
+    parser.add_argument("--frame", help="write the panel image to this PGM file at the end")
+    args = parser.parse_args()
+
+    script = os.path.abspath(args.script if os.path.exists(args.script) else os.path.join(ROOT, args.script))
+    server = StandIn(delay=0.0 if args.fast else args.delay).start()
+    server.flaky = args.flaky
+    aggregator = Aggregator(("127.0.0.1", 0), server.base_url, "standin").start() if args.aggregator else None
+    imports = ImportTimer() if args.imports else None
+    if imports:
+        imports.install()
+    shim = install((aggregator or server).server_address[:2], args.sleep_memory,
+                   imports.load if imports else importlib.import_module)
+    if aggregator:
+        shim["secrets"].secrets["Aggregator"] = "http://aggregator.lan:%d" % aggregator.server_address[1]
+    modbus = ModbusStandIn(delay=0.0 if args.fast else 0.05).start() if args.local else None
+    if modbus:
+        shim["_hardware"].HOSTS["inverter.lan"] = modbus.server_address[:2]
+        shim["secrets"].secrets["InverterHost"] = "inverter.lan"
+    hardware = shim["_hardware"]
+    hardware.scale = 0.0 if args.fast else args.cost_scale
+    for item in args.cost:
+        name, seconds = item.split("=")
+        if name not in hardware.COSTS:
+            parser.error("unknown cost %r, one of %s" % (name, ", ".join(hardware.COSTS)))
+        hardware.COSTS[name] = float(seconds)
+    if args.power_on:
+        shim["alarm"].sleep_memory.clear()
+    if args.inverters:
+        serial = shim["secrets"].secrets["InverterSerial"]
+        shim["secrets"].secrets["InverterSerials"] = [serial[:-3] + "%03d" % i for i in range(args.inverters)]
+
+    os.chdir(ROOT)
+    if args.heap:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if args.profile else None
+    wake_alarm = None
+    walls = []
+    sleeps = []
+    failing = []  # (awake seconds, mAh) of the wakes that met a 503
+    for wake in range(1, args.wakes + 1):
+        reset(shim, wake_alarm)
+        if imports:
+            imports.new_wake()
+        requests, connections, failed = server.requests, server.connections, server.failed
+        server.fail = {"system-data", "meter-data"} if wake <= args.outage else set()
+        if args.advance:
+            server.payloads = advanced(wake - 1, args.advance)
+            if modbus:
+                modbus.registers = ge_modbus.registers(server.payloads["system-data"], server.payloads["meter-data"])
+        modbus_requests = modbus.requests if modbus else 0
+        server.peak = 0
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            sleep = run_wake(script, shim)
+        except KeyboardInterrupt:
+            print("\nStopped")
+            break
+        except Exception:
+            traceback.print_exc()
+            print("\nThe board would halt here")
+            break
+        finally:
+            if profiler:
+                profiler.disable()
+        walls.append(time.perf_counter() - start)
+        spent = ", ".join("%s %.0f ms" % (k, v * 1000) for k, v in sorted(hardware.spent.items()) if v)
+        print("\n--- wake %d: %.0f ms awake (simulated hardware: %s), %d requests, %d connections (%d at once)"
+              % (wake, walls[-1] * 1000, spent or "none", server.requests - requests, server.connections - connections,
+                 server.peak))
+        charge = walls[-1] * hardware.AWAKE_MA / 3600
+        if server.failed > failed:
+            failing.append((walls[-1], charge))
+            print("--- %d requests failed; %.3f mAh awake" % (server.failed - failed, charge))
+        else:
+            print("--- %.3f mAh awake" % charge)
+        display_bus = shim["displayio"].bus
+        if display_bus["commands"]:
+            refreshes = ", ".join("%s %.0f ms" % (kind, seconds * 1000) for kind, seconds in display_bus["refreshes"])
+            print("--- display bus: %d bytes in %d commands, %.0f ms at the baudrate; refreshes: %s"
+                  % (display_bus["bytes"], display_bus["commands"], display_bus["seconds"] * 1000, refreshes or "none"))
+        if imports:
+            print("--- imports: %s" % imports.summary())
+        if modbus:
+            print("--- inverter: %d Modbus requests" % (modbus.requests - modbus_requests))
+        if aggregator:
+            print("--- aggregator: %d cached answers, %d cloud fetches in all" % (aggregator.hits, aggregator.fetches))
+        if sleep is None:
+            print("--- the script ended without a deep sleep")
+            break
+        print("--- deep sleep for %.0f s" % sleep.seconds)
+        sleeps.append(sleep.seconds)
+        wake_alarm = sleep.alarms[0] if sleep.alarms else None
+
+    panel = shim["adafruit_il0373"].panel
+    if walls:
+        print("\n%d wakes, %.0f ms awake on average, %d panel refreshes and %d partial windows"
+              % (len(walls), sum(walls) / len(walls) * 1000, panel["refreshes"], panel["partials"]))
+        awake_mah = sum(walls) * hardware.AWAKE_MA / 3600
+        sleep_mah = sum(sleeps) * hardware.SLEEP_UA / 1000 / 3600
+        hours = (sum(walls) + sum(sleeps)) / 3600
+        print("%.3f mAh awake and %.3f mAh asleep over %.1f hours, %.2f mA on average"
+              % (awake_mah, sleep_mah, hours, (awake_mah + sleep_mah) / hours if hours else 0))
+        if failing:
+            print("%d wakes met a failure: %.0f ms and %.3f mAh awake each on average"
+                  % (len(failing), sum(w for w, _ in failing) / len(failing) * 1000,
+                     sum(c for _, c in failing) / len(failing)))
+    if args.frame and panel["frame"] is not None:
+        shim["adafruit_il0373"].write_pgm(args.frame)
+        print("Panel image written to", args.frame)
+    if imports:
+        imports.uninstall()
+        imports.dump(args.top)
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+    server.shutdown()
+    if aggregator:
+        aggregator.shutdown()
+    if modbus:
+        modbus.shutdown()
+
+
+if __name__ == "__main__":
+    main()
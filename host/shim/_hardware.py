@@ -0,0 +1,84 @@
+# Shared state of the simulated board, for the fake CircuitPython modules.
+#
+# Where the API lives, the sleep memory file, and how long the slow bits of
+# hardware take. Each cost is slept for real (times scale) when the fake
+# module gets to it, and added up in spent so a run can say how much of a wake
+# went on simulated hardware. The figures are rough ones for an ESP32-S2 on
+# home WiFi and the 2.9" grayscale IL0373; host/run_device.py can change them.
+#
+# gc.mem_free() and gc.mem_alloc() are CircuitPython additions to gc, which
+# can't be shadowed; install() adds them, counting what tracemalloc sees
+# (when it is tracing) against a heap of HEAP_SIZE.
+#
+# AWAKE_MA and SLEEP_UA turn awake and sleep time into charge drawn from the
+# battery, for comparing wakes.
+
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+API               = ("127.0.0.1", 8080)  # every getaddrinfo() resolves here (the stand-in)
+HOSTS             = {}  # ... except these host names, e.g. the Modbus stand-in's
+SLEEP_MEMORY_FILE = os.path.join(tempfile.gettempdir(), "ge_sleep_memory.bin")
+
+COSTS = {
+    "scan":         1.2,   # seconds, full scan of all 13 channels
+    "scan_channel": 0.1,   # seconds, scan of the one channel given to connect()
+    "associate":    0.15,  # seconds, auth and association with the AP
+    "dhcp":         0.6,   # seconds, DHCP lease when no static address is set
+    "dns":          0.05,  # seconds per getaddrinfo()
+    "tls":          0.5,   # seconds per TLS handshake
+    "ntp":          0.1,   # seconds per NTP round trip
+    "refresh":      3.0,   # seconds per e-ink refresh
+}
+scale = 1.0
+spent = {}
+
+HEAP_SIZE = 2 * 1024 * 1024  # bytes, about what CircuitPython gets on a 2 MB PSRAM ESP32-S2
+
+AWAKE_MA = 80   # mA, average while awake with the radio up
+SLEEP_UA = 156  # uA in deep sleep (Adafruit's figure for the Huzzah)
+
+_real_monotonic_ns = time.monotonic_ns
+_boot_ns = _real_monotonic_ns()
+
+
+def spend(what, seconds=None):
+    # seconds, when given, in place of COSTS[what] (e.g. a transfer worked out from its size)
+    seconds = (COSTS[what] if seconds is None else seconds) * scale
+    spent[what] = spent.get(what, 0) + seconds
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def _monotonic_ns():
+    return _real_monotonic_ns() - _boot_ns
+
+
+def _monotonic():
+    return _monotonic_ns() / 1e9
+
+
+def _mem_alloc():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def _mem_free():
+    return max(HEAP_SIZE - _mem_alloc(), 0)
+
+
+def install():
+    # time.monotonic() on the board counts from reset, see power_on()
+    time.monotonic_ns = _monotonic_ns
+    time.monotonic    = _monotonic
+    gc.mem_alloc      = _mem_alloc
+    gc.mem_free       = _mem_free
+
+
+def power_on():
+    # A reset, or a wake from deep sleep
+    global _boot_ns
+    _boot_ns = _real_monotonic_ns()
+    spent.clear()
@@ -0,0 +1,43 @@
+# Fake adafruit_display_shapes.rect: a TileGrid over a two-colour bitmap,
+# outline pixels 1, the rest 0, as the real Rect is built.
+
+import displayio
+
+
+class Rect(displayio.TileGrid):
+    def __init__(self, x, y, width, height, *, fill=None, outline=None, stroke=1):
+        bitmap = displayio.Bitmap(width, height, 2)
+        for w in range(stroke):
+            for i in range(width):
+                bitmap[i, w] = 1
+                bitmap[i, height - 1 - w] = 1
+            for i in range(height):
+                bitmap[w, i] = 1
+                bitmap[width - 1 - w, i] = 1
+        palette = displayio.Palette(2)
+        super().__init__(bitmap, pixel_shader=palette, x=x, y=y)
+        self.fill    = fill
+        self.outline = outline
+
+    @property
+    def fill(self):
+        return None if self.pixel_shader.is_transparent(0) else self.pixel_shader[0]
+
+    @fill.setter
+    def fill(self, color):
+        self._set(0, color)
+
+    @property
+    def outline(self):
+        return None if self.pixel_shader.is_transparent(1) else self.pixel_shader[1]
+
+    @outline.setter
+    def outline(self, color):
+        self._set(1, color)
+
+    def _set(self, index, color):
+        if color is None:
+            self.pixel_shader.make_transparent(index)
+        else:
+            self.pixel_shader[index] = color
+            self.pixel_shader.make_opaque(index)
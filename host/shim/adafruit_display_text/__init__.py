@@ -0,0 +1 @@
+# Fake adafruit_display_text, see label.py.
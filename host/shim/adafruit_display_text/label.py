@@ -0,0 +1,73 @@
+# Fake adafruit_display_text.label.
+#
+# A Label is a Group holding one TileGrid over a bitmap of its text, drawn
+# from the font's glyphs (each shift_x along, dx and dy from the baseline),
+# with (x, y) at the left of the text and half way down it, as the real
+# Label places it.
+
+import displayio
+
+
+class Label(displayio.Group):
+    def __init__(self, font, *, text="", color=0xFFFFFF, background_color=None, scale=1, x=0, y=0, **kwargs):
+        super().__init__(scale=scale, x=x, y=y)
+        self.font     = font
+        self._palette = displayio.Palette(2)
+        self._palette.make_transparent(0)
+        self._text    = None
+        self.color    = color
+        self.background_color = background_color
+        self.text = text
+
+    @property
+    def color(self):
+        return self._palette[1]
+
+    @color.setter
+    def color(self, value):
+        self._palette[1] = value
+
+    @property
+    def background_color(self):
+        return None if self._palette.is_transparent(0) else self._palette[0]
+
+    @background_color.setter
+    def background_color(self, value):
+        if value is None:
+            self._palette.make_transparent(0)
+        else:
+            self._palette[0] = value
+            self._palette.make_opaque(0)
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        if value == self._text:
+            return
+        self._text = value
+        while len(self):
+            self.pop()
+        box = self.font.get_bounding_box()
+        height   = box[1]
+        baseline = height + (box[3] if len(box) > 3 else 0)
+        glyphs = [g for g in (self.font.get_glyph(ord(char)) for char in value) if g is not None]
+        self._width = sum(g.shift_x for g in glyphs)
+        bitmap = displayio.Bitmap(max(self._width, 1), height, 2)
+        x = 0
+        for glyph in glyphs:
+            top = baseline - glyph.dy - glyph.height
+            for gy in range(glyph.height):
+                for gx in range(glyph.width):
+                    px, py = x + glyph.dx + gx, top + gy
+                    if glyph.bitmap[gx, gy] and 0 <= px < bitmap.width and 0 <= py < height:
+                        bitmap[px, py] = 1
+            x += glyph.shift_x
+        self.append(displayio.TileGrid(bitmap, pixel_shader=self._palette, y=-(height // 2)))
+
+    @property
+    def bounding_box(self):
+        height = self.font.get_bounding_box()[1]
+        return 0, -(height // 2), self._width, height
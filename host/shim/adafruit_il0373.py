@@ -0,0 +1,105 @@
+# Fake adafruit_il0373 driver.
+#
+# The panel keeps its image with the power off, so the last refreshed frame
+# is kept at module level (panel) across wakes, with the number of refreshes
+# and the simulated time they took. Each refresh costs
+# _hardware.COSTS["refresh"] seconds, and sends both grey planes over the
+# bus as the driver does.
+#
+# The partial window commands (PTIN, PTL, DTM2, DRF, PTOUT) that ge_epd sends
+# straight over the bus are carried out: the window's black and white data
+# is written into the frame, through the display's rotation. A partial
+# refresh lasts from its DRF to the next command, the script's own wait, so
+# it takes real time even with --fast.
+
+import time
+
+import displayio
+
+import _hardware
+
+panel = {"frame": None, "width": 0, "height": 0, "levels": 4, "refreshes": 0, "seconds": 0.0, "partials": 0}
+
+DTM1, DRF, DTM2, PTL, PTIN, PTOUT = 0x10, 0x12, 0x13, 0x90, 0x91, 0x92
+
+
+def _pack(bits):
+    out = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            out[i >> 3] |= 0x80 >> (i & 7)
+    return out
+
+
+class IL0373(displayio.EPaperDisplay):
+    def __init__(self, bus, *, width, height, grayscale=False, black_bits_inverted=False,
+                 color_bits_inverted=True, highlight_color=0x000000, swap_rams=False, **kwargs):
+        super().__init__(bus, width=width, height=height, grayscale=grayscale, **kwargs)
+        if panel["frame"] is not None and (panel["width"], panel["height"]) == (width, height):
+            self.framebuffer = panel["frame"]
+        self._partial = False
+        self._window  = None  # native x0, y0, x1, y1 of the partial window
+        self._drf_at  = None
+
+    def refresh(self):
+        super().refresh()
+        frame = self.framebuffer
+        self.bus.send(DTM1, _pack([v >> 1 & 1 for v in frame]))
+        self.bus.send(DTM2, _pack([v & 1 for v in frame]))
+        self.bus.send(DRF, b"")
+        self.busy = True
+        _hardware.spend("refresh")
+        self.busy = False
+        self._store()
+        panel["refreshes"] += 1
+        panel["seconds"]   += _hardware.COSTS["refresh"] * _hardware.scale
+        displayio.bus["refreshes"].append(("full", _hardware.COSTS["refresh"] * _hardware.scale))
+
+    def _store(self):
+        panel.update(frame=self.framebuffer, width=self.width, height=self.height, levels=self.levels)
+
+    def _to_display(self, nx, ny):
+        if self.rotation == 90:
+            return ny, self.height - 1 - nx
+        if self.rotation == 180:
+            return self.width - 1 - nx, self.height - 1 - ny
+        if self.rotation == 270:
+            return self.width - 1 - ny, nx
+        return nx, ny
+
+    def _command(self, command, data):
+        if self._drf_at is not None:
+            # The partial refresh ran until now
+            displayio.bus["refreshes"].append(("partial", time.monotonic() - self._drf_at))
+            self._drf_at = None
+        if command == PTIN:
+            self._partial = True
+        elif command == PTOUT:
+            self._partial = False
+        elif self._partial and command == PTL:
+            self._window = (data[0], (data[2] << 8) | data[3], data[1] + 1, ((data[4] << 8) | data[5]) + 1)
+        elif self._partial and command == DTM2 and self._window:
+            self._write(data)
+        elif self._partial and command == DRF:
+            self._drf_at = time.monotonic()
+            self._store()
+            panel["partials"] += 1
+
+    def _write(self, data):
+        nx0, ny0, nx1, ny1 = self._window
+        white = self.levels - 1
+        i = 0
+        for ny in range(ny0, ny1):
+            for nx in range(nx0, nx1):
+                x, y = self._to_display(nx, ny)
+                if 0 <= x < self.width and 0 <= y < self.height:
+                    self.framebuffer[y * self.width + x] = white if data[i >> 3] & (0x80 >> (i & 7)) else 0
+                i += 1
+
+
+def write_pgm(path):
+    # The panel image as a greyscale PGM
+    levels = panel["levels"]
+    with open(path, "wb") as f:
+        f.write(b"P5 %d %d 255\n" % (panel["width"], panel["height"]))
+        f.write(bytes(v * 255 // (levels - 1) for v in panel["frame"]))
@@ -0,0 +1,25 @@
+# Fake adafruit_ntp. The host clock stands in for the NTP server; a round
+# trip costs _hardware.COSTS["ntp"] seconds.
+
+import time
+
+import _hardware
+
+
+class NTP:
+    def __init__(self, socketpool, *, server="0.adafruit.pool.ntp.org", port=123, tz_offset=0,
+                 socket_timeout=10, cache_seconds=0):
+        self._pool      = socketpool
+        self._server    = server
+        self._port      = port
+        self._tz_offset = tz_offset
+
+    @property
+    def utc_ns(self):
+        self._pool.getaddrinfo(self._server, self._port)
+        _hardware.spend("ntp")
+        return time.time_ns()
+
+    @property
+    def datetime(self):
+        return time.gmtime(self.utc_ns // 1000000000 + int(self._tz_offset * 3600))
@@ -0,0 +1,66 @@
+# Fake CircuitPython alarm module.
+#
+# sleep_memory is 8 KB (as on the ESP32-S2) kept in a file, written through
+# on every store, so it survives from one wake (one process, even) to the
+# next. exit_and_deep_sleep_until_alarms() ends the wake by raising DeepSleep;
+# host/run_device.py catches it and starts the next wake, with wake_alarm set
+# to the alarm that "fired".
+
+import os
+
+import _hardware
+from . import time
+
+SLEEP_MEMORY_SIZE = 8192
+
+
+class SleepMemory:
+    def __init__(self, path, size=SLEEP_MEMORY_SIZE):
+        self._path = path
+        self._data = bytearray(size)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                stored = f.read(size)
+            self._data[:len(stored)] = stored
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, index):
+        return self._data[index]
+
+    def __setitem__(self, index, value):
+        self._data[index] = value
+        with open(self._path, "wb") as f:
+            f.write(self._data)
+
+    def clear(self):
+        # A power cycle
+        self[:] = bytes(len(self._data))
+
+
+class DeepSleep(SystemExit):
+    def __init__(self, alarms):
+        super().__init__()
+        self.alarms = alarms
+
+    @property
+    def seconds(self):
+        # Until the earliest TimeAlarm, None if there isn't one
+        waits = [a.seconds() for a in self.alarms if isinstance(a, time.TimeAlarm)]
+        return min(waits) if waits else None
+
+
+sleep_memory = SleepMemory(_hardware.SLEEP_MEMORY_FILE)
+wake_alarm   = None
+
+
+def light_sleep_until_alarms(*alarms):
+    waits = [a.seconds() for a in alarms if isinstance(a, time.TimeAlarm)]
+    if waits:
+        time._sleep(max(0, min(waits)))
+    return alarms[0] if alarms else None
+
+
+def exit_and_deep_sleep_until_alarms(*alarms, preserve_dios=()):
+    raise DeepSleep(alarms)
@@ -0,0 +1,19 @@
+# Fake alarm.time module.
+
+import time as _time
+
+_sleep = _time.sleep
+
+
+class TimeAlarm:
+    def __init__(self, *, monotonic_time=None, epoch_time=None):
+        if (monotonic_time is None) == (epoch_time is None):
+            raise ValueError("Provide monotonic_time or epoch_time")
+        self.monotonic_time = monotonic_time
+        self.epoch_time     = epoch_time
+
+    def seconds(self):
+        # From now until the alarm
+        if self.monotonic_time is not None:
+            return self.monotonic_time - _time.monotonic()
+        return self.epoch_time - _time.time()
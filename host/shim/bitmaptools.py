@@ -0,0 +1,51 @@
+# Fake CircuitPython bitmaptools: the region fill and line drawing the
+# device code uses, working on the shim Bitmap's bytes a row at a time.
+
+
+def fill_region(dest_bitmap, x1, y1, x2, y2, value):
+    # x2 and y2 are exclusive, as on the board
+    x1, x2 = max(min(x1, x2), 0), min(max(x1, x2), dest_bitmap.width)
+    y1, y2 = max(min(y1, y2), 0), min(max(y1, y2), dest_bitmap.height)
+    if x1 >= x2:
+        return
+    row = bytes([value]) * (x2 - x1)
+    data, width = dest_bitmap._data, dest_bitmap.width
+    for y in range(y1, y2):
+        data[y * width + x1:y * width + x2] = row
+
+
+def draw_line(dest_bitmap, x1, y1, x2, y2, value):
+    # Bresenham, both ends included, clipped to the bitmap
+    data, width, height = dest_bitmap._data, dest_bitmap.width, dest_bitmap.height
+    dx, dy = abs(x2 - x1), -abs(y2 - y1)
+    sx, sy = (1 if x1 < x2 else -1), (1 if y1 < y2 else -1)
+    err = dx + dy
+    while True:
+        if 0 <= x1 < width and 0 <= y1 < height:
+            data[y1 * width + x1] = value
+        if x1 == x2 and y1 == y2:
+            return
+        e2 = 2 * err
+        if e2 >= dy:
+            err += dy
+            x1 += sx
+        if e2 <= dx:
+            err += dx
+            y1 += sy
+
+
+def readinto(bitmap, file, bits_per_pixel, element_size=1, reverse_pixels_in_element=False, swap_bytes=False,
+             reverse_rows=False):
+    # Packed pixels from file, each row padded to whole elements; 1 byte elements only in the shim
+    if element_size != 1 or swap_bytes:
+        raise NotImplementedError("1 byte elements only in the shim")
+    per_byte = 8 // bits_per_pixel
+    mask     = (1 << bits_per_pixel) - 1
+    stride   = (bitmap.width + per_byte - 1) // per_byte
+    for row in range(bitmap.height):
+        data = file.read(stride)
+        y = bitmap.height - 1 - row if reverse_rows else row
+        for x in range(bitmap.width):
+            slot  = x % per_byte if reverse_pixels_in_element else per_byte - 1 - x % per_byte
+            value = data[x // per_byte] >> (slot * bits_per_pixel) & mask
+            bitmap._data[y * bitmap.width + x] = value
@@ -0,0 +1,18 @@
+# Fake CircuitPython board module: any pin name is a Pin.
+
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "board." + self.name
+
+
+_pins = {}
+
+
+def __getattr__(name):
+    if name.startswith("__"):
+        raise AttributeError(name)
+    return _pins.setdefault(name, Pin(name))
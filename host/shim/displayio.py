@@ -0,0 +1,255 @@
+# Fake CircuitPython displayio module.
+#
+# Group, Bitmap, Palette and TileGrid hold what the real ones hold, so code
+# that builds or walks a display tree behaves the same. EPaperDisplay
+# composes the tree into an in-memory framebuffer on refresh(): one byte per
+# pixel, the grey level (0 black .. levels-1 white) the panel would show.
+#
+# FourWire.send() counts what goes over the bus in bus, for the wake, and
+# takes the time it would at the bus's baudrate (_hardware.spend("spi")),
+# then hands the command to the display on that bus; bus["refreshes"] has
+# ("full" or "partial", seconds) for each refresh the panel ran.
+
+import array
+import time
+
+import _hardware
+
+_displays = []
+bus = {"bytes": 0, "commands": 0, "seconds": 0.0, "refreshes": []}
+
+
+def release_displays():
+    _displays.clear()
+
+
+def _power_on():
+    release_displays()
+    bus.update(bytes=0, commands=0, seconds=0.0, refreshes=[])
+
+
+class FourWire:
+    def __init__(self, spi_bus, *, command, chip_select, reset=None, baudrate=24000000, polarity=0, phase=0):
+        self.spi_bus     = spi_bus
+        self.command     = command
+        self.chip_select = chip_select
+        self.reset       = reset
+        self.baudrate    = baudrate
+
+    def send(self, command, data):
+        data    = bytes(data)
+        seconds = (1 + len(data)) * 8 / self.baudrate
+        bus["bytes"]    += 1 + len(data)
+        bus["commands"] += 1
+        bus["seconds"]  += seconds
+        _hardware.spend("spi", seconds)
+        for display in _displays:
+            if display.bus is self:
+                display._command(command, data)
+
+
+class Bitmap:
+    def __init__(self, width, height, value_count):
+        if value_count > 256:
+            raise ValueError("value_count must be <= 256 in the shim")
+        self.width       = width
+        self.height      = height
+        self.value_count = value_count
+        self._data       = bytearray(width * height)
+
+    def _index(self, index):
+        if isinstance(index, tuple):
+            x, y = index
+            if not (0 <= x < self.width and 0 <= y < self.height):
+                raise IndexError("pixel coordinates out of bounds")
+            return y * self.width + x
+        return index
+
+    def __getitem__(self, index):
+        return self._data[self._index(index)]
+
+    def __setitem__(self, index, value):
+        if value >= self.value_count:
+            raise ValueError("value out of range")
+        self._data[self._index(index)] = value
+
+    def fill(self, value):
+        self._data[:] = bytes([value]) * len(self._data)
+
+    def dirty(self, x1=0, y1=0, x2=-1, y2=-1):
+        pass
+
+
+class Palette:
+    def __init__(self, color_count, *, dither=False):
+        self._colors = [0] * color_count
+        self._transparent = set()
+
+    def __len__(self):
+        return len(self._colors)
+
+    def __getitem__(self, index):
+        return self._colors[index]
+
+    def __setitem__(self, index, color):
+        self._colors[index] = color
+
+    def make_transparent(self, index):
+        self._transparent.add(index)
+
+    def make_opaque(self, index):
+        self._transparent.discard(index)
+
+    def is_transparent(self, index):
+        return index in self._transparent
+
+
+class ColorConverter:
+    def __init__(self, *, input_colorspace=None, dither=False):
+        pass
+
+
+class TileGrid:
+    def __init__(self, bitmap, *, pixel_shader, width=1, height=1, tile_width=None, tile_height=None,
+                 default_tile=0, x=0, y=0):
+        self.bitmap       = bitmap
+        self.pixel_shader = pixel_shader
+        self.width        = width
+        self.height       = height
+        self.tile_width   = tile_width or bitmap.width
+        self.tile_height  = tile_height or bitmap.height
+        self.x            = x
+        self.y            = y
+        self.hidden       = False
+        self.flip_x       = False
+        self.flip_y       = False
+        self.transpose_xy = False
+        self._tiles       = array.array("H", [default_tile]) * (width * height)
+
+    def _index(self, index):
+        if isinstance(index, tuple):
+            x, y = index
+            return y * self.width + x
+        return index
+
+    def __getitem__(self, index):
+        return self._tiles[self._index(index)]
+
+    def __setitem__(self, index, value):
+        self._tiles[self._index(index)] = value
+
+
+class Group:
+    def __init__(self, *, scale=1, x=0, y=0):
+        self.scale   = scale
+        self.x       = x
+        self.y       = y
+        self.hidden  = False
+        self._layers = []
+
+    def append(self, layer):
+        self._layers.append(layer)
+
+    def insert(self, index, layer):
+        self._layers.insert(index, layer)
+
+    def index(self, layer):
+        return self._layers.index(layer)
+
+    def pop(self, index=-1):
+        return self._layers.pop(index)
+
+    def remove(self, layer):
+        self._layers.remove(layer)
+
+    def __len__(self):
+        return len(self._layers)
+
+    def __getitem__(self, index):
+        return self._layers[index]
+
+    def __setitem__(self, index, layer):
+        self._layers[index] = layer
+
+    def __delitem__(self, index):
+        del self._layers[index]
+
+
+def _grey(color, levels):
+    r, g, b = color >> 16 & 0xFF, color >> 8 & 0xFF, color & 0xFF
+    return ((r * 299 + g * 587 + b * 114) * (levels - 1) + 127500) // 255000
+
+
+def _draw(item, frame, width, height, levels, ox, oy, scale):
+    if item.hidden:
+        return
+    if isinstance(item, Group):
+        for layer in item:
+            _draw(layer, frame, width, height, levels, ox + item.x * scale, oy + item.y * scale, scale * item.scale)
+        return
+    bitmap, palette = item.bitmap, item.pixel_shader
+    tw, th = item.tile_width, item.tile_height
+    per_row = bitmap.width // tw
+    left = ox + item.x * scale
+    top  = oy + item.y * scale
+    greys = [_grey(palette[i], levels) if not palette.is_transparent(i) else None for i in range(len(palette))]
+    for ty in range(item.height):
+        for tx in range(item.width):
+            tile = item[tx, ty]
+            sx, sy = tile % per_row * tw, tile // per_row * th
+            for py in range(th):
+                y0 = top + (ty * th + py) * scale
+                if y0 + scale <= 0 or y0 >= height:
+                    continue
+                for px in range(tw):
+                    grey = greys[bitmap[sx + px, sy + py]]
+                    if grey is None:
+                        continue
+                    x0 = left + (tx * tw + px) * scale
+                    for y in range(max(y0, 0), min(y0 + scale, height)):
+                        row = y * width
+                        for x in range(max(x0, 0), min(x0 + scale, width)):
+                            frame[row + x] = grey
+
+
+def compose(group, width, height, levels=4):
+    # The frame the panel would show for group, white where nothing is drawn
+    frame = bytearray([levels - 1]) * (width * height)
+    if group is not None:
+        _draw(group, frame, width, height, levels, 0, 0, 1)
+    return frame
+
+
+class EPaperDisplay:
+    def __init__(self, display_bus, *, width, height, rotation=0, grayscale=False, seconds_per_frame=180,
+                 refresh_time=40, **kwargs):
+        self.bus               = display_bus
+        self.width             = width
+        self.height            = height
+        self.rotation          = rotation
+        self.levels            = 4 if grayscale else 2
+        self.seconds_per_frame = seconds_per_frame
+        self.refresh_time      = refresh_time
+        self.root_group        = None
+        self.framebuffer       = compose(None, width, height, self.levels)
+        self.busy              = False
+        self._refreshed_at     = None
+        _displays.append(self)
+
+    def show(self, group):
+        self.root_group = group
+
+    def _command(self, command, data):
+        pass
+
+    @property
+    def time_to_refresh(self):
+        if self._refreshed_at is None:
+            return 0
+        return max(0, self.seconds_per_frame - (time.monotonic() - self._refreshed_at))
+
+    def refresh(self):
+        if self.time_to_refresh > 0:
+            raise RuntimeError("Refresh too soon")
+        self.framebuffer = compose(self.root_group, self.width, self.height, self.levels)
+        self._refreshed_at = time.monotonic()
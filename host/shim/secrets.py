@@ -0,0 +1,8 @@
+# secrets.py for the shim board; matches wifi.ACCESS_POINT.
+
+secrets = {
+    "ssid":           "shim-network",
+    "password":       "shim-password",
+    "InverterSerial": "CE0000X000",
+    "API_Key":        "shim-api-key",
+}
@@ -0,0 +1,36 @@
+# Fake CircuitPython socketpool module.
+#
+# Sockets are CPython's, so send/recv_into/setblocking behave as on the
+# board; every getaddrinfo() (one DNS lookup's cost each) resolves to the
+# local stand-in at _hardware.API whatever the host name, unless
+# _hardware.HOSTS names another address for it.
+
+import socket as _socket
+
+import _hardware
+
+lookups = []  # host names asked for, in order
+
+
+class SocketPool:
+    AF_INET     = _socket.AF_INET
+    SOCK_STREAM = _socket.SOCK_STREAM
+    SOCK_DGRAM  = _socket.SOCK_DGRAM
+    IPPROTO_TCP = _socket.IPPROTO_TCP
+    IPPROTO_UDP = _socket.IPPROTO_UDP
+    EAI_NONAME  = -2
+
+    gaierror = OSError
+
+    def __init__(self, radio):
+        self._radio = radio
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        if not self._radio.connected:
+            raise OSError(self.EAI_NONAME, "Name or service not known")
+        _hardware.spend("dns")
+        lookups.append(host)
+        return [(self.AF_INET, type or self.SOCK_STREAM, proto, "", _hardware.HOSTS.get(host, _hardware.API))]
+
+    def socket(self, family=_socket.AF_INET, type=_socket.SOCK_STREAM, proto=0):
+        return _socket.socket(family, type, proto)
@@ -0,0 +1,50 @@
+# Fake CircuitPython ssl module.
+#
+# The stand-in speaks plain HTTP, so a wrapped socket is the plain one with
+# a TLS handshake's cost added when it connects. The server_hostname of every
+# handshake is kept in handshakes, to check what SNI would have been sent.
+
+import _hardware
+
+handshakes = []
+
+
+class SSLSocket:
+    def __init__(self, sock, server_hostname):
+        self._sock = sock
+        self.server_hostname = server_hostname
+
+    def connect(self, address):
+        self._sock.connect(address)
+        _hardware.spend("tls")
+        handshakes.append(self.server_hostname)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._sock.close()
+
+
+class SSLContext:
+    def __init__(self):
+        self.check_hostname = True
+
+    def load_verify_locations(self, cafile=None, cadata=None):
+        pass
+
+    def load_cert_chain(self, certfile, keyfile):
+        pass
+
+    def set_default_verify_paths(self):
+        pass
+
+    def wrap_socket(self, sock, server_side=False, server_hostname=None):
+        return SSLSocket(sock, server_hostname)
+
+
+def create_default_context():
+    return SSLContext()
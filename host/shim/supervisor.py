@@ -0,0 +1,20 @@
+# Fake CircuitPython supervisor module.
+
+import time
+
+
+class Runtime:
+    serial_connected       = True
+    serial_bytes_available = False
+    usb_connected          = True
+
+
+runtime = Runtime()
+
+
+def ticks_ms():
+    return time.monotonic_ns() // 1000000 & 0x3FFFFFFF
+
+
+def reload():
+    raise SystemExit("supervisor.reload()")
@@ -0,0 +1,46 @@
+# Fake CircuitPython terminalio module.
+#
+# FONT has the built-in font's 6x12 cell, but its glyphs are a stand-in:
+# a pattern made from the character code, so different text draws
+# different pixels without shipping the real font.
+
+import displayio
+
+_WIDTH  = 6
+_HEIGHT = 12
+
+
+class Glyph:
+    def __init__(self, bitmap, tile_index, width, height, dx, dy, shift_x, shift_y):
+        self.bitmap     = bitmap
+        self.tile_index = tile_index
+        self.width      = width
+        self.height     = height
+        self.dx         = dx
+        self.dy         = dy
+        self.shift_x    = shift_x
+        self.shift_y    = shift_y
+
+
+class BuiltinFont:
+    def __init__(self):
+        self._glyphs = {}
+
+    def get_bounding_box(self):
+        return _WIDTH, _HEIGHT
+
+    def get_glyph(self, codepoint):
+        glyph = self._glyphs.get(codepoint)
+        if glyph is None:
+            bitmap = displayio.Bitmap(_WIDTH, _HEIGHT, 2)
+            if codepoint > 32:
+                bits = (codepoint * 2654435761) & 0xFFFFFFFF
+                for i in range(32):
+                    if bits >> i & 1:
+                        bitmap[1 + i % 4, 2 + i // 4] = 1
+            glyph = Glyph(bitmap, 0, _WIDTH, _HEIGHT, 0, 0, _WIDTH, 0)
+            self._glyphs[codepoint] = glyph
+        return glyph
+
+
+FONT = BuiltinFont()
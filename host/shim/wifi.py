@@ -0,0 +1,136 @@
+# Fake CircuitPython wifi module.
+#
+# One access point (ACCESS_POINT, the runner fills in the ssid and password
+# from secrets). connect() costs a full scan, or a scan of one channel when
+# channel= is given, then association, then DHCP unless set_ipv4_address()
+# was called first (start_dhcp() turns it back on). A wrong channel or bssid fails like the real radio does,
+# with ConnectionError after the scan.
+
+import ipaddress
+
+import _hardware
+
+ACCESS_POINT = {
+    "ssid":     "shim-network",
+    "password": "shim-password",
+    "bssid":    b"\x02\x00\x5e\x10\x00\x01",
+    "channel":  6,
+    "rssi":     -58,
+}
+
+DHCP_LEASE = {
+    "ipv4":     "192.168.1.60",
+    "netmask":  "255.255.255.0",
+    "gateway":  "192.168.1.1",
+    "ipv4_dns": "192.168.1.1",
+}
+
+
+class AuthMode:
+    OPEN = 0
+    WPA2 = 3
+    PSK  = 5
+
+
+class Network:
+    def __init__(self, info):
+        self.ssid     = info["ssid"]
+        self.bssid    = info["bssid"]
+        self.channel  = info["channel"]
+        self.rssi     = info["rssi"]
+        self.country  = "GB"
+        self.authmode = [AuthMode.WPA2, AuthMode.PSK]
+
+
+class Radio:
+    def __init__(self):
+        self.enabled     = True
+        self.hostname    = "cpy-shim"
+        self.mac_address = b"\x02\x00\x5e\x00\x00\x42"
+        self.ap_info     = None
+        self._static     = None
+        self._lease      = None
+
+    @property
+    def connected(self):
+        return self.ap_info is not None
+
+    @property
+    def ipv4_address(self):
+        return self._address("ipv4")
+
+    @property
+    def ipv4_subnet(self):
+        return self._address("netmask")
+
+    @property
+    def ipv4_gateway(self):
+        return self._address("gateway")
+
+    @property
+    def ipv4_dns(self):
+        return self._address("ipv4_dns")
+
+    def _address(self, key):
+        lease = self._lease
+        if lease is None or lease.get(key) is None:
+            return None
+        return ipaddress.IPv4Address(lease[key])
+
+    def set_ipv4_address(self, *, ipv4, netmask, gateway, ipv4_dns=None):
+        self._static = {"ipv4": str(ipv4), "netmask": str(netmask), "gateway": str(gateway),
+                        "ipv4_dns": str(ipv4_dns) if ipv4_dns is not None else None}
+        if self.connected:
+            self._lease = self._static
+
+    def set_ipv4_address_ap(self, *args, **kwargs):
+        pass
+
+    def start_dhcp(self):
+        self._static = None
+
+    def stop_dhcp(self):
+        pass
+
+    def start_scanning_networks(self, *, start_channel=1, stop_channel=11):
+        _hardware.spend("scan")
+        return iter([Network(ACCESS_POINT)])
+
+    def stop_scanning_networks(self):
+        pass
+
+    def connect(self, ssid, password=b"", *, channel=0, bssid=None, timeout=None):
+        if not self.enabled:
+            raise RuntimeError("Wifi is not enabled")
+        if isinstance(ssid, bytes):
+            ssid = ssid.decode()
+        if isinstance(password, bytes):
+            password = password.decode()
+        ap = ACCESS_POINT
+        _hardware.spend("scan_channel" if channel else "scan")
+        if ssid != ap["ssid"] or (channel and channel != ap["channel"]) or (bssid and bytes(bssid) != ap["bssid"]):
+            raise ConnectionError("No network with that ssid")
+        _hardware.spend("associate")
+        if password != ap["password"]:
+            raise ConnectionError("Authentication failure")
+        self.ap_info = Network(ap)
+        if self._static is not None:
+            self._lease = self._static
+        else:
+            _hardware.spend("dhcp")
+            self._lease = dict(DHCP_LEASE)
+
+    def stop_station(self):
+        self.ap_info = None
+        self._lease  = None
+
+    def ping(self, ip, *, timeout=0.5):
+        return 0.005 if self.connected else None
+
+
+radio = Radio()
+
+
+def _power_on():
+    global radio
+    radio = Radio()